@@ -0,0 +1,375 @@
+import argparse
+import csv
+import glob
+import importlib.util
+import inspect
+import json
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+from postal_resolution import load_gazetteer_json
+from thai_text import canonical_thai
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ORDER_FILES = os.path.join(HERE, 'orders-raw_*.csv')
+GOLDEN_FILE = os.path.join(HERE, 'address_golden.csv')
+# Hand-labeled orders-raw rows the exact labeler cannot pin down (file:line -> gazetteer id)
+MISSES_FILE = os.path.join(HERE, 'address_misses.csv')
+SQL_FILE = os.path.join(HERE, 'primacom_mini_erp.sql')
+SEED = 20260110
+
+# orders-raw_* address columns
+COL_STREET = 'ที่อยู่'
+COL_SUBDISTRICT = 'ตำบล'
+COL_DISTRICT = 'อำเภอ'
+COL_PROVINCE = 'จังหวัด'
+COL_POSTAL_CODE = 'รหัสไปรษณีย์'
+
+GOLDEN_COLUMNS = ['case_id', 'variant', 'source', 'street', 'subdistrict', 'district', 'province', 'postal_code',
+                  'sub_district_id', 'expected_subdistrict', 'expected_district', 'expected_province',
+                  'expected_zip']
+
+
+# --- Golden set ------------------------------------------------------------------
+
+def _prefixed(e, street, rng):
+    return street, 'ต.' + e['subdistrict'], 'อ.' + e['district'], 'จ.' + e['province'], e['zip_code']
+
+
+def _long_prefixed(e, street, rng):
+    bangkok = e['province'] == 'กรุงเทพมหานคร'
+    return (street, ('แขวง' if bangkok else 'ตำบล') + e['subdistrict'],
+            ('เขต' if bangkok else 'อำเภอ') + e['district'], 'จังหวัด' + e['province'], e['zip_code'])
+
+
+def _no_zip(e, street, rng):
+    return street, e['subdistrict'], e['district'], e['province'], ''
+
+
+def _zip_only(e, street, rng):
+    return street, '', '', '', e['zip_code']
+
+
+def _no_subdistrict(e, street, rng):
+    return street, '', e['district'], e['province'], e['zip_code']
+
+
+def _subdistrict_in_street(e, street, rng):
+    return f"{street} ต.{e['subdistrict']}", '', e['district'], e['province'], e['zip_code']
+
+
+def _invisible(e, street, rng):
+    # Zero-width space, NBSP and trailing dots as pasted from chat apps
+    sub = e['subdistrict']
+    cut = rng.randint(1, max(1, len(sub) - 1))
+    return (street, sub[:cut] + '​' + sub[cut:] + '.', e['district'] + ' ', e['province'] + '..',
+            e['zip_code'])
+
+
+def _thai_spelling(e, street, rng):
+    def respell(s):
+        # Decomposed sara am and a doubled vowel mark
+        s = s.replace('ำ', 'ํา')
+        for mark in 'ุิีั':
+            if mark in s:
+                return s.replace(mark, mark * 2, 1)
+        return s
+    return street, respell(e['subdistrict']), respell(e['district']), e['province'], e['zip_code']
+
+
+def _zip_float(e, street, rng):
+    # Spreadsheet exports turn the zip column into floats
+    return street, e['subdistrict'], e['district'], e['province'], e['zip_code'] + '.0'
+
+
+VARIANTS = {
+    'prefixed': _prefixed,
+    'long_prefixed': _long_prefixed,
+    'no_zip': _no_zip,
+    'zip_only': _zip_only,
+    'no_subdistrict': _no_subdistrict,
+    'subdistrict_in_street': _subdistrict_in_street,
+    'invisible': _invisible,
+    'thai_spelling': _thai_spelling,
+    'zip_float': _zip_float,
+}
+
+
+def read_source_row(order_dir, source):
+    """Address fields of the orders-raw row at ``source`` (file name:line)."""
+    name, _, line = source.rpartition(':')
+    with open(os.path.join(order_dir, name), 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.DictReader(f)
+        for rec in reader:
+            if reader.line_num == int(line):
+                return tuple((rec.get(c) or '').strip() for c in
+                             (COL_STREET, COL_SUBDISTRICT, COL_DISTRICT, COL_PROVINCE, COL_POSTAL_CODE))
+    raise ValueError(f"{source}: no such row")
+
+
+def load_misses(path, order_dir, by_id, by_names):
+    """Real misses as (source, fields, gazetteer entry or None), labels checked against the gazetteer.
+
+    An empty sub_district_id marks a row that should not match at all.
+    """
+    misses = []
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        for rec in csv.DictReader(f):
+            fields = read_source_row(order_dir, rec['source'])
+            entry = None
+            if rec['sub_district_id']:
+                entry = by_id.get(int(rec['sub_district_id']))
+                if entry is None:
+                    raise ValueError(f"{path}: {rec['source']} is labeled with unknown sub_district id "
+                                     f"{rec['sub_district_id']}")
+            if len(by_names.get(tuple(canonical_thai(v) for v in fields[1:]), [])) == 1:
+                print(f"  {rec['source']} now matches exactly; drop it from {os.path.basename(path)}")
+            misses.append((rec['source'], fields, entry))
+    return misses
+
+
+def build_golden(order_files=ORDER_FILES, output=GOLDEN_FILE, variants_per_address=2, seed=SEED,
+                 misses_file=MISSES_FILE):
+    """Labels distinct orders-raw addresses with their gazetteer sub_district id.
+
+    An address is labeled only when its four fields, canonicalized, name
+    exactly one gazetteer subdistrict; addresses the labeler cannot pin down
+    are left out rather than guessed. Each labeled address is written as
+    found plus ``variants_per_address`` messy variants carrying the same label.
+    Rows listed in ``misses_file`` are the real addresses the labeler misses,
+    labeled by hand; they are written as found with variant ``real_miss`` so
+    the fallback paths are measured on actual exports, not only on variants.
+    """
+    by_names, by_id = {}, {}
+    for e in load_gazetteer_json():
+        by_names.setdefault((e['subdistrict'], e['district'], e['province'], e['zip_code']), []).append(e)
+        by_id[e['id']] = e
+
+    rng = random.Random(seed)
+    seen = set()
+    counts = Counter()
+    with open(output, 'w', encoding='utf-8-sig', newline='') as out:
+        writer = csv.writer(out)
+        writer.writerow(GOLDEN_COLUMNS)
+        case_id = 0
+        for path in sorted(glob.glob(order_files)):
+            with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+                reader = csv.DictReader(f)
+                for rec in reader:
+                    fields = tuple((rec.get(c) or '').strip() for c in
+                                   (COL_STREET, COL_SUBDISTRICT, COL_DISTRICT, COL_PROVINCE, COL_POSTAL_CODE))
+                    if fields in seen:
+                        continue
+                    seen.add(fields)
+                    entries = by_names.get(tuple(canonical_thai(v) for v in fields[1:]), [])
+                    if len(entries) != 1:
+                        counts['unlabeled'] += 1
+                        continue
+                    e = entries[0]
+                    label = [e['id'], e['subdistrict'], e['district'], e['province'], e['zip_code']]
+                    source = f"{os.path.basename(path)}:{reader.line_num}"
+                    cases = [('as_found', fields)]
+                    for name in rng.sample(sorted(VARIANTS), variants_per_address):
+                        cases.append((name, VARIANTS[name](e, fields[0], rng)))
+                    for name, values in cases:
+                        case_id += 1
+                        counts[name] += 1
+                        writer.writerow([case_id, name, source, *values, *label])
+        if misses_file:
+            for source, fields, e in load_misses(misses_file, os.path.dirname(order_files), by_id, by_names):
+                label = [e['id'], e['subdistrict'], e['district'], e['province'], e['zip_code']] if e else [''] * 5
+                case_id += 1
+                counts['real_miss'] += 1
+                writer.writerow([case_id, 'real_miss', source, *fields, *label])
+    print(f"Wrote {case_id} golden cases from {len(seen)} distinct addresses to {output}")
+    for name, n in sorted(counts.items()):
+        print(f"  {name}: {n}")
+
+
+def load_golden(path=GOLDEN_FILE):
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        return list(csv.DictReader(f))
+
+
+# --- Matchers under test -----------------------------------------------------------
+
+def load_module(name, path=None):
+    """Imports ``name``, or the copy of it at ``path`` (e.g. a previous git revision)."""
+    if not path:
+        __import__(name)
+        return sys.modules[name]
+    spec = importlib.util.spec_from_file_location(f"{name}_{abs(hash(path))}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def validate_addresses_matcher(module, sql_file):
+    """Adapter: case -> ((subdistrict, district, province, zip) or None, strategy)."""
+    master = module.load_master_data(sql_file)
+    kwargs = {}
+    if 'resolution' in inspect.signature(module.find_best_match_with_strategy).parameters:
+        from postal_resolution import classify_postal_codes
+        kwargs['resolution'] = classify_postal_codes(master)
+    find = module.find_best_match_with_strategy
+
+    def match(case):
+        row = {'street': case['street'], 'subdistrict': case['subdistrict'], 'district': case['district'],
+               'province': case['province'], 'postal_code': case['postal_code']}
+        m, strategy = find(row, master, **kwargs)
+        if not m:
+            return None, strategy
+        return (m['subdistrict'], m['district'], m['province'], m['zip_code']), strategy
+    return match
+
+
+def migrate_and_validate_matcher(module, sql_file):
+    master = module.load_master_data(sql_file)
+    find = module.find_best_match_with_strategy
+
+    def match(case):
+        result, strategy = find(case['postal_code'], case['subdistrict'], case['district'], case['province'], master)
+        # no_match echoes the input back instead of a gazetteer entry
+        return (None if strategy == 'no_match' else result), strategy
+    return match
+
+
+MATCHERS = {
+    'validate_addresses': validate_addresses_matcher,
+    'migrate_and_validate': migrate_and_validate_matcher,
+}
+
+
+def is_correct(predicted, case):
+    """Whether ``predicted`` is the labeled entry; a case without a label must not match."""
+    if not case['sub_district_id']:
+        return predicted is None
+    if predicted is None:
+        return False
+    expected = (case['expected_subdistrict'], case['expected_district'], case['expected_province'],
+                case['expected_zip'])
+    return all(canonical_thai(str(p)) == canonical_thai(e) for p, e in zip(predicted, expected))
+
+
+def evaluate(label, match, cases, repeat=3):
+    """Precision/recall overall, per strategy and per variant, plus lookups per second (best of ``repeat``).
+
+    Throughput is timed per variant too, so the real misses, which run the
+    slow fallback paths, get their own figure.
+    """
+    results = [match(case) for case in cases]
+    by_variant = {}
+    for case in cases:
+        by_variant.setdefault(case['variant'], []).append(case)
+    best = {}
+    for _ in range(repeat):
+        for name, group in by_variant.items():
+            started = time.perf_counter()
+            for case in group:
+                match(case)
+            elapsed = time.perf_counter() - started
+            best[name] = min(best.get(name, elapsed), elapsed)
+    total = sum(best.values())
+
+    strategies, variants = {}, {}
+    predicted = correct = 0
+    labeled = sum(1 for case in cases if case['sub_district_id'])
+    for case, (result, strategy) in zip(cases, results):
+        ok = is_correct(result, case)
+        predicted += result is not None
+        # Precision and recall count labeled matches; a match on an unlabeled case is a false positive
+        correct += ok and result is not None
+        s = strategies.setdefault(strategy, [0, 0])
+        s[0] += 1
+        s[1] += ok
+        v = variants.setdefault(case['variant'], [0, 0])
+        v[0] += 1
+        v[1] += ok
+    return {
+        'matcher': label,
+        'cases': len(cases),
+        'predicted': predicted,
+        'correct': correct,
+        'precision': correct / predicted if predicted else 0.0,
+        'recall': correct / labeled if labeled else 0.0,
+        'lookups_per_second': len(cases) / total if total else 0.0,
+        'strategies': {k: {'hits': n, 'share': n / len(cases), 'precision': ok / n}
+                       for k, (n, ok) in sorted(strategies.items(), key=lambda x: -x[1][0])},
+        'variants': {k: {'cases': n, 'recall': ok / n,
+                         'lookups_per_second': n / best[k] if best[k] else 0.0}
+                     for k, (n, ok) in sorted(variants.items())},
+    }
+
+
+def print_report(reports):
+    print(f"\n{'matcher':<36} {'precision':>9} {'recall':>7} {'lookups/s':>10}")
+    for r in reports:
+        print(f"{r['matcher']:<36} {r['precision']:>9.2%} {r['recall']:>7.2%} {r['lookups_per_second']:>10,.0f}")
+    for r in reports:
+        print(f"\n{r['matcher']} by strategy:")
+        for name, s in r['strategies'].items():
+            print(f"  {name:<28} {s['hits']:>6} ({s['share']:>6.1%})  precision {s['precision']:.2%}")
+        print(f"{r['matcher']} recall and lookups/s by input variant:")
+        for name, v in r['variants'].items():
+            print(f"  {name:<28} {v['cases']:>6}  {v['recall']:>7.2%} {v['lookups_per_second']:>10,.0f}")
+
+
+def run(matcher_specs, golden=GOLDEN_FILE, sql_file=SQL_FILE, repeat=3, output=None):
+    """Benchmarks each ``name[=path]`` matcher; the first one is the reference.
+
+    Returns False when a later matcher has lower precision or recall than the
+    reference, so a faster implementation cannot silently lose accuracy.
+    """
+    cases = load_golden(golden)
+    print(f"Loaded {len(cases)} golden cases from {golden}")
+    reports = []
+    for spec in matcher_specs:
+        name, _, path = spec.partition('=')
+        if name not in MATCHERS:
+            raise SystemExit(f"Unknown matcher {name!r}; choose from {', '.join(MATCHERS)}")
+        match = MATCHERS[name](load_module(name, path or None), sql_file)
+        reports.append(evaluate(spec, match, cases, repeat))
+    print_report(reports)
+
+    ok = True
+    reference = reports[0]
+    for r in reports[1:]:
+        for metric in ('precision', 'recall'):
+            if r[metric] < reference[metric]:
+                print(f"REGRESSION: {r['matcher']} {metric} {r[metric]:.2%} < {reference[metric]:.2%} "
+                      f"({reference['matcher']})")
+                ok = False
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, ensure_ascii=False, indent=2)
+        print(f"\nWrote {output}")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Address-matching accuracy and throughput on a labeled golden set.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('build-golden', help="Label orders-raw addresses with gazetteer ids")
+    p.add_argument('--orders', default=ORDER_FILES, help="orders-raw export glob")
+    p.add_argument('--output', default=GOLDEN_FILE)
+    p.add_argument('--variants', type=int, default=2, help="Messy variants per labeled address")
+    p.add_argument('--seed', type=int, default=SEED)
+    p.add_argument('--misses', default=MISSES_FILE, help="Hand-labeled real misses to append ('' for none)")
+
+    p = sub.add_parser('run', help="Benchmark matchers side by side (the first is the reference)")
+    p.add_argument('matchers', nargs='*', default=['validate_addresses'],
+                   help="name or name=path/to/other/version.py; names: " + ', '.join(MATCHERS))
+    p.add_argument('--golden', default=GOLDEN_FILE)
+    p.add_argument('--master', default=SQL_FILE, help="Dump with the address_* tables")
+    p.add_argument('--repeat', type=int, default=3, help="Timing passes (best one is reported)")
+    p.add_argument('--json', help="Write the full report here")
+    args = parser.parse_args()
+
+    if args.command == 'build-golden':
+        build_golden(args.orders, args.output, args.variants, args.seed, args.misses)
+    else:
+        sys.exit(0 if run(args.matchers, args.golden, args.master, args.repeat, args.json) else 1)
@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+import sqlite3
+
+from thai_text import canonical_thai
+
+MISS = object()
+
+# Bump when normalize_key (or canonical_thai under it) changes how inputs are keyed
+KEY_VERSION = 1
+
+
+def gazetteer_version(path):
+    """Content hash of the master data file; any gazetteer change invalidates the cache."""
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def cache_fingerprint(master_file, matcher_version):
+    """Gazetteer hash plus key and matcher versions; a change in any of them invalidates the cache."""
+    return f"{gazetteer_version(master_file)}:{KEY_VERSION}:{matcher_version}"
+
+
+def normalize_key(*fields):
+    parts = []
+    for field in fields:
+        if field is None:
+            parts.append('')
+        else:
+            parts.append(' '.join(canonical_thai(str(field), strip_dots=False).split()))
+    return '\x1f'.join(parts)
+
+
+class AddressCache:
+    """Persistent memo of resolved addresses, shared across runs.
+
+    Entries are keyed by (namespace, normalized input tuple) and hold the
+    chosen gazetteer entry plus the match strategy that produced it. A
+    namespace's entries are dropped when its fingerprint (gazetteer, key
+    normalization and matcher versions) changes.
+    """
+
+    def __init__(self, path, version, namespace, flush_every=5000):
+        self.path = path
+        self.namespace = namespace
+        self.flush_every = flush_every
+        self.hits = 0
+        self.misses = 0
+        self._pending = []
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS resolved ("
+            "namespace TEXT NOT NULL, input_key TEXT NOT NULL, result TEXT, strategy TEXT, "
+            "PRIMARY KEY (namespace, input_key)) WITHOUT ROWID"
+        )
+        meta_key = f"version:{namespace}"
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (meta_key,)).fetchone()
+        if row is None or row[0] != version:
+            if row is not None:
+                print(f"Gazetteer or matcher changed, clearing {namespace} address cache entries.")
+            self._conn.execute("DELETE FROM resolved WHERE namespace = ?", (namespace,))
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (meta_key, version))
+            self._conn.commit()
+
+        # Warm the in-memory index once; lookups after this are dict hits.
+        self._memo = {}
+        for input_key, result, strategy in self._conn.execute(
+                "SELECT input_key, result, strategy FROM resolved WHERE namespace = ?", (namespace,)):
+            self._memo[input_key] = (json.loads(result), strategy)
+
+    def get(self, key):
+        entry = self._memo.get(key, MISS)
+        if entry is MISS:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def put(self, key, result, strategy):
+        self._memo[key] = (result, strategy)
+        self._pending.append((self.namespace, key, json.dumps(result, ensure_ascii=False), strategy))
+        if len(self._pending) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO resolved (namespace, input_key, result, strategy) VALUES (?, ?, ?, ?)",
+                self._pending)
+            self._conn.commit()
+            self._pending = []
+
+    def close(self):
+        self.flush()
+        self._conn.close()
+        total = self.hits + self.misses
+        if total:
+            print(f"Address cache: {self.hits}/{total} hits ({self.hits * 100.0 / total:.1f}%), "
+                  f"{len(self._memo)} entries in {os.path.basename(self.path)}")
+
+
+def open_cache(cache_path, master_file, namespace, matcher_version):
+    if not cache_path:
+        return None
+    return AddressCache(cache_path, cache_fingerprint(master_file, matcher_version), namespace)
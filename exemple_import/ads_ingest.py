@@ -0,0 +1,358 @@
+import argparse
+import os
+import re
+
+from compressed_io import open_file
+from convert_csv_to_sql_v4 import SqlShard, escape_sql
+from csv_reader import ProjectedReader
+from import_sales_template import load_users
+from order_aggregates import parse_order_date
+from quarantine import Quarantine, quarantine_path
+from sql_dump import iter_table_dicts
+
+INPUT_CSV = r'c:\AppServ\www\CRM_ERP_V4\exemple_import\ads_export.csv'
+OUTPUT_SQL = r'c:\AppServ\www\CRM_ERP_V4\exemple_import\ads_log_upsert.sql'
+SQL_FILE = r'c:\AppServ\www\CRM_ERP_V4\exemple_import\primacom_mini_erp.sql'
+
+COMPANY_ID = 1
+BATCH_SIZE = 1000
+
+# Header names per field, compared case-insensitively: ads_log_export_csv.php, Meta Ads Manager and
+# TikTok Ads exports, and the API field names.
+FIELD_ALIASES = {
+    'date': ['date', 'day', 'วันที่', 'reporting starts', 'stat_time_day', 'วันที่เริ่มต้นการรายงาน'],
+    'page': ['page_id', 'page id', 'page', 'page name', 'ชื่อเพจ', 'เพจ'],
+    'user': ['user_id', 'username', 'ชื่อผู้ใช้', 'ผู้ใช้'],
+    'ads_group': ['ads_group', 'ads group', 'กลุ่มโฆษณา', 'กลุ่มสินค้า'],
+    'product': ['product_id', 'sku', 'product sku', 'รหัสสินค้า'],
+    'ads_cost': ['ads_cost', 'ค่าโฆษณา (บาท)', 'ค่าโฆษณา', 'amount spent (thb)', 'amount spent', 'spend', 'cost'],
+    'impressions': ['impressions', 'การแสดงผล (impressions)', 'การแสดงผล'],
+    'reach': ['reach', 'การเข้าถึง (reach)', 'การเข้าถึง'],
+    'clicks': ['clicks', 'การคลิก (clicks)', 'การคลิก', 'link clicks', 'clicks (all)'],
+}
+METRICS = ['ads_cost', 'impressions', 'reach', 'clicks']
+DATE_RE = re.compile(r'\d{4}-\d{2}-\d{2}$')
+
+# Same statements as ads_log_upsert.php / product_ads_log_upsert.php, many rows per statement.
+# Unique keys: marketing_ads_log (page_id, date); marketing_product_ads_log (ads_group, page_id, date),
+# legacy rows without ads_group (product_id, date).
+PAGE_INSERT = ("INSERT INTO `marketing_ads_log` (`page_id`, `user_id`, `date`, `ads_cost`, `impressions`, "
+               "`reach`, `clicks`) VALUES\n")
+PAGE_UPDATE = ("\nON DUPLICATE KEY UPDATE `ads_cost` = VALUES(`ads_cost`), `impressions` = VALUES(`impressions`), "
+               "`reach` = VALUES(`reach`), `clicks` = VALUES(`clicks`), `edited_by` = VALUES(`user_id`), "
+               "`edited_at` = CURRENT_TIMESTAMP, `updated_at` = CURRENT_TIMESTAMP")
+GROUP_INSERT = ("INSERT INTO `marketing_product_ads_log` (`ads_group`, `page_id`, `product_id`, `user_id`, `date`, "
+                "`ads_cost`, `impressions`, `reach`, `clicks`) VALUES\n")
+PRODUCT_INSERT = ("INSERT INTO `marketing_product_ads_log` (`product_id`, `user_id`, `date`, `ads_cost`, "
+                  "`impressions`, `reach`, `clicks`) VALUES\n")
+PRODUCT_UPDATE = ("\nON DUPLICATE KEY UPDATE `user_id` = VALUES(`user_id`), `ads_cost` = VALUES(`ads_cost`), "
+                  "`impressions` = VALUES(`impressions`), `reach` = VALUES(`reach`), `clicks` = VALUES(`clicks`), "
+                  "`updated_at` = CURRENT_TIMESTAMP")
+
+
+def normalize_name(name):
+    return re.sub(r'\s+', ' ', (name or '').strip()).lower()
+
+
+def parse_metric(val, integer=False):
+    """Number from an export cell (฿, thousands separators); None when empty, like the PHP upserts."""
+    val = (val or '').replace('฿', '').replace(',', '').strip()
+    if not val or val.lower() in ('null', '-', '--'):
+        return None
+    try:
+        num = float(val)
+    except ValueError:
+        return None
+    return int(num) if integer else num
+
+
+class PageIndex:
+    """Resolves a page cell (pages.id, the platform page id or the page name) to pages.id."""
+
+    def __init__(self, pages):
+        self.ids = set()
+        self.external = {}
+        self.names = {}
+        for p in pages:
+            self.ids.add(str(p['id']))
+            if p.get('page_id'):
+                self.external[p['page_id'].strip()] = int(p['id'])
+            name = normalize_name(p.get('name'))
+            # Two pages with the same name cannot be told apart by name
+            self.names[name] = None if name in self.names else int(p['id'])
+
+    def __len__(self):
+        return len(self.ids)
+
+    def resolve(self, val):
+        val = (val or '').strip()
+        if not val:
+            return None, 'missing_page'
+        if val in self.external:
+            return self.external[val], None
+        if val in self.ids:
+            return int(val), None
+        name = normalize_name(val)
+        if name in self.names:
+            return (self.names[name], None) if self.names[name] else (None, 'ambiguous_page')
+        return None, 'unknown_page'
+
+
+def load_pages(dump_path, company_id):
+    return PageIndex(p for p in iter_table_dicts(dump_path, 'pages') if str(p.get('company_id')) == str(company_id))
+
+
+def load_products(dump_path, company_id):
+    """SKU (lowercase) and id -> (product id, ads_group) for the company's products."""
+    products = {}
+    for p in iter_table_dicts(dump_path, 'products'):
+        if str(p.get('company_id')) != str(company_id):
+            continue
+        entry = (int(p['id']), (p.get('ads_group') or '').strip() or None)
+        products[str(p['id'])] = entry
+        if p.get('sku'):
+            products[p['sku'].strip().lower()] = entry
+    return products
+
+
+def load_existing(dump_path):
+    """Current log rows by unique key -> (id, ads_cost, impressions, reach, clicks)."""
+    existing = {}
+    for table in ('marketing_ads_log', 'marketing_product_ads_log'):
+        for r in iter_table_dicts(dump_path, table):
+            if not r.get('date'):
+                continue
+            values = (int(r['id']), parse_metric(r.get('ads_cost')), parse_metric(r.get('impressions'), True),
+                      parse_metric(r.get('reach'), True), parse_metric(r.get('clicks'), True))
+            page_id = int(r['page_id']) if r.get('page_id') else None
+            if table == 'marketing_ads_log':
+                key = ('page', page_id, r['date'][:10])
+            elif r.get('ads_group'):
+                key = ('group', r['ads_group'], page_id, r['date'][:10])
+            elif r.get('product_id'):
+                key = ('product', int(r['product_id']), r['date'][:10])
+            else:
+                continue
+            # Keep the newest row of a key, as migrate_unique_key_v2.sql does
+            if key not in existing or existing[key][0] < values[0]:
+                existing[key] = values
+    return existing
+
+
+def map_columns(header):
+    """Field -> header name of an export, by FIELD_ALIASES."""
+    lowered = {h.strip().lower(): h for h in header}
+    columns = {}
+    for field, aliases in FIELD_ALIASES.items():
+        for alias in aliases:
+            if alias in lowered:
+                columns[field] = lowered[alias]
+                break
+    return columns
+
+
+class AdsLogIngester:
+    """Collects ad-spend rows in memory, one record per unique key, then writes batched upserts.
+
+    Pages, products and users are resolved through indexes loaded once from
+    dumps. A key seen twice keeps the last row (what repeated API upserts
+    end with) or, with ``combine='sum'``, adds the metrics up, for exports
+    broken down by campaign or ad set.
+    """
+
+    def __init__(self, pages, products=None, users=None, existing=None, default_user=None, combine='last',
+                 quarantine=None):
+        self.pages = pages
+        self.products = products
+        self.users = users
+        self.existing = existing
+        self.default_user = default_user
+        self.combine = combine
+        self.quarantine = quarantine
+        # key -> [user_id, ads_cost, impressions, reach, clicks]
+        self.records = {}
+        self.counts = {'rows': 0, 'skipped_empty': 0, 'rejected': 0, 'duplicates': 0}
+
+    def _reject(self, line_num, reason, row, detail=''):
+        self.counts['rejected'] += 1
+        if self.quarantine:
+            self.quarantine.reject(line_num, reason, row, detail)
+
+    def resolve_user(self, val):
+        val = (val or '').strip()
+        if not val:
+            return self.default_user
+        if self.users is None:
+            return int(val) if val.isdigit() else None
+        entry = self.users.get(val)
+        return entry[0] if entry else None
+
+    def key_for(self, line_num, row, fields):
+        """Unique key of a row, or None after quarantining it."""
+        date = (parse_order_date(fields.get('date')) or '')[:10]
+        if not DATE_RE.match(date):
+            self._reject(line_num, 'bad_date', row, fields.get('date') or '')
+            return None
+        page_id = None
+        if fields.get('page') or ('ads_group' not in fields and 'product' not in fields):
+            page_id, problem = self.pages.resolve(fields.get('page'))
+            if problem:
+                self._reject(line_num, problem, row, fields.get('page') or '')
+                return None
+        if 'ads_group' not in fields and 'product' not in fields:
+            return ('page', page_id, date)
+        group = (fields.get('ads_group') or '').strip() or None
+        product = None
+        sku = (fields.get('product') or '').strip()
+        if sku:
+            entry = self.products.get(sku.lower()) if self.products is not None else None
+            if entry is None and self.products is not None:
+                self._reject(line_num, 'unknown_product', row, sku)
+                return None
+            product, product_group = entry if entry else (int(sku) if sku.isdigit() else None, None)
+            group = group or product_group
+        if group:
+            return ('group', group, page_id, date)
+        if product:
+            return ('product', product, date)
+        self._reject(line_num, 'missing_product', row)
+        return None
+
+    def add(self, line_num, row, fields):
+        self.counts['rows'] += 1
+        metrics = [parse_metric(fields.get('ads_cost'))] + [parse_metric(fields.get(m), True) for m in METRICS[1:]]
+        if all(m is None for m in metrics):
+            self.counts['skipped_empty'] += 1
+            return
+        key = self.key_for(line_num, row, fields)
+        if key is None:
+            return
+        user_id = self.resolve_user(fields.get('user'))
+        if not user_id:
+            self._reject(line_num, 'unknown_user', row, fields.get('user') or '')
+            return
+        record = self.records.get(key)
+        if record is None:
+            self.records[key] = [user_id] + metrics
+            return
+        self.counts['duplicates'] += 1
+        if self.combine == 'sum':
+            for i, m in enumerate(metrics, 1):
+                if m is not None:
+                    record[i] = m if record[i] is None else record[i] + m
+        else:
+            self.records[key] = [user_id] + metrics
+
+    def add_csv(self, path):
+        with open_file(path, 'r', encoding='utf-8-sig', newline='') as f:
+            reader = ProjectedReader(f)
+            if self.quarantine:
+                self.quarantine.set_header(reader.header_text)
+            columns = map_columns(reader.header)
+            missing = [c for c in ('date',) if c not in columns]
+            if 'page' not in columns and 'ads_group' not in columns and 'product' not in columns:
+                missing.append('page or ads_group/product')
+            if missing or not any(m in columns for m in METRICS):
+                raise ValueError(f"{os.path.basename(path)} is not an ads export, missing: "
+                                 f"{', '.join(missing) or 'metrics'}")
+            fields = list(columns)
+            lines = 0
+            for row in reader.select([columns[c] for c in fields]):
+                lines += 1
+                self.add(reader.line_num, row, dict(zip(fields, row)))
+        return lines
+
+    def write_sql(self, shard, batch_size=BATCH_SIZE):
+        """Emits upserts for new and changed keys; returns (inserted, updated, unchanged)."""
+        inserted = updated = unchanged = 0
+        updates_by_id = []
+        # NULL page_id never collides in the unique key, so a re-run would insert the
+        # row again; clear such keys first unless --existing gave the row id to update
+        for key in sorted(self.records, key=str):
+            if key[0] == 'group' and key[2] is None and (self.existing is None or key not in self.existing):
+                shard.out.write(f"DELETE FROM `marketing_product_ads_log` WHERE `ads_group` = {escape_sql(key[1])} "
+                                f"AND `page_id` IS NULL AND `date` = {escape_sql(key[3])};\n")
+        for key, (user_id, cost, impressions, reach, clicks) in sorted(self.records.items(), key=str):
+            metrics = [f"{cost:.2f}" if cost is not None else 'NULL'] + \
+                      [str(m) if m is not None else 'NULL' for m in (impressions, reach, clicks)]
+            current = self.existing.get(key) if self.existing is not None else None
+            if current is not None:
+                if current[1:] == (cost, impressions, reach, clicks):
+                    unchanged += 1
+                    continue
+                updated += 1
+            else:
+                inserted += 1
+            kind = key[0]
+            if kind == 'page':
+                values = [str(key[1]), str(user_id), escape_sql(key[2])] + metrics
+                shard.add(f"({', '.join(values)})", PAGE_INSERT, batch_size, PAGE_UPDATE)
+            elif kind == 'group' and key[2] is None and current is not None:
+                # NULL page_id never collides in the unique key: update the row itself
+                updates_by_id.append((current[0], user_id, metrics))
+            elif kind == 'group':
+                values = [escape_sql(key[1]), str(key[2]) if key[2] else 'NULL', 'NULL', str(user_id),
+                          escape_sql(key[3])] + metrics
+                shard.add(f"({', '.join(values)})", GROUP_INSERT, batch_size, PRODUCT_UPDATE)
+            else:
+                values = [str(key[1]), str(user_id), escape_sql(key[2])] + metrics
+                shard.add(f"({', '.join(values)})", PRODUCT_INSERT, batch_size, PRODUCT_UPDATE)
+        shard.flush()
+        for row_id, user_id, (cost, impressions, reach, clicks) in updates_by_id:
+            shard.out.write(f"UPDATE `marketing_product_ads_log` SET `user_id` = {user_id}, `ads_cost` = {cost}, "
+                            f"`impressions` = {impressions}, `reach` = {reach}, `clicks` = {clicks}, "
+                            f"`updated_at` = CURRENT_TIMESTAMP WHERE `id` = {row_id};\n")
+        return inserted, updated, unchanged
+
+
+def ingest_ads(sources, output=OUTPUT_SQL, sql_file=SQL_FILE, products_dump=None, users_dump=None,
+               existing_dump=None, company_id=COMPANY_ID, default_user=None, combine='last', batch_size=BATCH_SIZE):
+    pages = load_pages(sql_file, company_id)
+    products = load_products(products_dump, company_id) if products_dump else None
+    users = load_users(users_dump, company_id) if users_dump else None
+    existing = load_existing(existing_dump) if existing_dump else None
+    print(f"Indexed {len(pages)} pages"
+          + (f", {len(products)} product codes" if products is not None else "")
+          + (f", {len(users)} user codes" if users is not None else "")
+          + (f", {len(existing)} existing log rows" if existing is not None else ""))
+
+    quarantine = Quarantine(quarantine_path(output), 'ads_log')
+    ingester = AdsLogIngester(pages, products, users, existing, default_user, combine, quarantine)
+    try:
+        for path in sources:
+            lines = ingester.add_csv(path)
+            print(f"Read {lines} lines from {os.path.basename(path)}")
+        shard = SqlShard(output, None)
+        shard.write_header(scoped=False)
+        try:
+            inserted, updated, unchanged = ingester.write_sql(shard, batch_size)
+        finally:
+            shard.close()
+    finally:
+        quarantine.close()
+    c = ingester.counts
+    print(f"Wrote {len(ingester.records) - unchanged} upserts to {output} from {c['rows']} rows: "
+          f"{c['duplicates']} duplicate keys {'summed' if combine == 'sum' else 'collapsed'}, "
+          f"{c['skipped_empty']} empty, {c['rejected']} rejected"
+          + (f"; {inserted} new, {updated} changed, {unchanged} unchanged" if existing is not None else ""))
+    return c
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Convert ad-platform spend exports to batched marketing_ads_log / marketing_product_ads_log "
+                    "upserts.")
+    parser.add_argument('sources', nargs='*', default=[INPUT_CSV], help="Ads export CSV files")
+    parser.add_argument('--output', default=OUTPUT_SQL)
+    parser.add_argument('--pages', default=SQL_FILE, help="Dump with the `pages` table")
+    parser.add_argument('--products', help="Dump with the `products` table (SKU and ads_group lookup)")
+    parser.add_argument('--users', help="Dump with the `users` table (username lookup)")
+    parser.add_argument('--existing', help="Dump with the current ads log tables; unchanged rows are skipped")
+    parser.add_argument('--company-id', type=int, default=COMPANY_ID)
+    parser.add_argument('--user-id', type=int, help="Recorder for rows without a user column")
+    parser.add_argument('--combine', choices=['last', 'sum'], default='last',
+                        help="Rows sharing a key: keep the last (default) or sum per-campaign breakdowns")
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+    ingest_ads(args.sources, args.output, args.pages, args.products, args.users, args.existing, args.company_id,
+               args.user_id, args.combine, args.batch_size)
@@ -0,0 +1,525 @@
+"""Local SQLite snapshot of the reporting tables, with daily rollups.
+
+``build`` streams customers, orders, order_items, call_history (plus users,
+call_import_logs and basket_transition_log when present) out of a SQL dump
+and/or per-table CSV exports in one pass, keeping only the columns the
+reports use. It then pre-aggregates them per day by company, user and
+product. The monitoring metrics can then be recomputed offline:
+
+    python analytics_snapshot.py build --dump prod.sql.gz --output snapshot.sqlite
+    python analytics_snapshot.py daily-monitoring snapshot.sqlite --company 1 --date 2026-01-10
+    python analytics_snapshot.py lead-performance snapshot.sqlite --company 1 --month 2026-01
+    python analytics_snapshot.py sales snapshot.sqlite --company 1 --start 2026-01-01 --end 2026-02-01 --by product
+    python analytics_snapshot.py bench snapshot.sqlite
+
+Metric definitions follow api/Monitor/daily_monitoring.php and
+lead_performance.php: a dialer call is "talked" at status 1 and 30+ seconds,
+a call_history call when status is รับสาย or duration >= 30, and sales skip
+Cancelled/BadDebt orders, freebies and promotion child items.
+"""
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import time
+from datetime import date, timedelta
+
+from compressed_io import open_file
+from sql_dump import iter_insert_rows
+
+SNAPSHOT_FILE = r'c:\AppServ\www\CRM_ERP_V4\exemple_import\analytics_snapshot.sqlite'
+BATCH_SIZE = 10000
+TALK_SECONDS = 30  # เกณฑ์ "ได้คุย" = 30 วินาที
+TELESALE_ROLE_IDS = (6, 7)
+EXCLUDED_ORDER_STATUSES = ('Cancelled', 'BadDebt')
+
+# table -> [(column, SQLite type)], only what the reports read
+TABLES = {
+    'users': [('id', 'INTEGER PRIMARY KEY'), ('first_name', 'TEXT'), ('last_name', 'TEXT'), ('role', 'TEXT'),
+              ('role_id', 'INTEGER'), ('company_id', 'INTEGER'), ('supervisor_id', 'INTEGER'),
+              ('status', 'TEXT')],
+    'customers': [('customer_id', 'INTEGER PRIMARY KEY'), ('company_id', 'INTEGER'), ('assigned_to', 'INTEGER'),
+                  ('date_registered', 'TEXT'), ('date_assigned', 'TEXT'), ('lifecycle_status', 'TEXT'),
+                  ('grade', 'TEXT'), ('province', 'TEXT')],
+    'orders': [('id', 'TEXT PRIMARY KEY'), ('customer_id', 'INTEGER'), ('company_id', 'INTEGER'),
+               ('creator_id', 'INTEGER'), ('order_date', 'TEXT'), ('order_status', 'TEXT'),
+               ('payment_status', 'TEXT'), ('payment_method', 'TEXT'), ('total_amount', 'REAL'),
+               ('sales_channel', 'TEXT')],
+    'order_items': [('id', 'INTEGER PRIMARY KEY'), ('order_id', 'TEXT'), ('parent_order_id', 'TEXT'),
+                    ('creator_id', 'INTEGER'), ('product_id', 'INTEGER'), ('quantity', 'INTEGER'),
+                    ('price_per_unit', 'REAL'), ('net_total', 'REAL'), ('is_freebie', 'INTEGER'),
+                    ('parent_item_id', 'INTEGER')],
+    'call_history': [('id', 'INTEGER PRIMARY KEY'), ('customer_id', 'INTEGER'), ('date', 'TEXT'),
+                     ('caller', 'TEXT'), ('status', 'TEXT'), ('duration', 'REAL')],
+    'call_import_logs': [('id', 'INTEGER PRIMARY KEY'), ('call_date', 'TEXT'), ('start_time', 'TEXT'),
+                         ('status', 'INTEGER'), ('duration', 'TEXT'), ('matched_user_id', 'INTEGER')],
+    'basket_transition_log': [('id', 'INTEGER PRIMARY KEY'), ('customer_id', 'INTEGER'),
+                              ('assigned_to_new', 'INTEGER'), ('transition_type', 'TEXT'),
+                              ('created_at', 'TEXT')],
+}
+
+# Derived columns computed while loading: table -> [(column, type, source column, function)]
+DERIVED = {
+    'call_import_logs': [('duration_sec', 'INTEGER', 'duration', lambda v: time_to_sec(v))],
+}
+
+INDEXES = [
+    "CREATE INDEX idx_orders_date ON orders (order_date)",
+    "CREATE INDEX idx_items_parent ON order_items (parent_order_id)",
+    "CREATE INDEX idx_items_creator ON order_items (creator_id)",
+    "CREATE INDEX idx_calls_caller_date ON call_history (caller, date)",
+    "CREATE INDEX idx_dialer_date_user ON call_import_logs (call_date, matched_user_id)",
+    "CREATE INDEX idx_transitions_user_date ON basket_transition_log (assigned_to_new, created_at)",
+]
+
+_EXCLUDED = ', '.join(f"'{s}'" for s in EXCLUDED_ORDER_STATUSES)
+
+# Rollup tables; all keyed by day plus company/user/product where they apply
+ROLLUPS = {
+    'daily_sales': f"""
+        SELECT substr(o.order_date, 1, 10) AS day, o.company_id, oi.creator_id AS user_id, oi.product_id,
+               SUM(oi.quantity) AS quantity,
+               SUM(COALESCE(oi.net_total, oi.quantity * oi.price_per_unit)) AS sales
+        FROM orders o
+        JOIN order_items oi ON oi.parent_order_id = o.id
+        WHERE o.order_status NOT IN ({_EXCLUDED})
+          AND (oi.is_freebie = 0 OR oi.is_freebie IS NULL)
+          AND oi.parent_item_id IS NULL
+        GROUP BY day, o.company_id, oi.creator_id, oi.product_id""",
+    'daily_orders': f"""
+        SELECT substr(order_date, 1, 10) AS day, company_id, creator_id AS user_id, order_status,
+               COUNT(*) AS orders, SUM(total_amount) AS total_amount
+        FROM orders
+        GROUP BY day, company_id, creator_id, order_status""",
+    'daily_calls': f"""
+        SELECT substr(ch.date, 1, 10) AS day, u.company_id, u.id AS user_id, ch.caller,
+               COUNT(*) AS calls,
+               SUM(CASE WHEN ch.status = 'รับสาย' OR ch.duration >= {TALK_SECONDS} THEN 1 ELSE 0 END) AS talked,
+               COUNT(DISTINCT CASE WHEN ch.status = 'รับสาย' OR ch.duration >= {TALK_SECONDS}
+                                   THEN ch.customer_id END) AS customers_talked,
+               COALESCE(SUM(ch.duration), 0) / 60.0 AS minutes
+        FROM call_history ch
+        LEFT JOIN users u ON ch.caller = u.first_name || ' ' || COALESCE(u.last_name, '')
+        GROUP BY day, ch.caller""",
+    'daily_dialer': f"""
+        SELECT call_date AS day, matched_user_id AS user_id,
+               CAST(substr(start_time, 1, 2) AS INTEGER) AS hour,
+               COUNT(*) AS calls,
+               SUM(CASE WHEN status = 1 THEN 1 ELSE 0 END) AS connected,
+               SUM(CASE WHEN status = 1 AND duration_sec >= {TALK_SECONDS} THEN 1 ELSE 0 END) AS talked,
+               COALESCE(SUM(duration_sec), 0) AS seconds
+        FROM call_import_logs
+        WHERE matched_user_id IS NOT NULL
+        GROUP BY day, matched_user_id, hour""",
+    'daily_distribution': """
+        SELECT substr(created_at, 1, 10) AS day, assigned_to_new AS user_id, transition_type,
+               COUNT(*) AS transitions, COUNT(DISTINCT customer_id) AS customers
+        FROM basket_transition_log
+        WHERE assigned_to_new IS NOT NULL
+        GROUP BY day, assigned_to_new, transition_type""",
+    'daily_customers': """
+        SELECT substr(COALESCE(date_registered, date_assigned), 1, 10) AS day, company_id,
+               assigned_to AS user_id, COUNT(*) AS customers
+        FROM customers
+        GROUP BY day, company_id, assigned_to""",
+}
+
+ROLLUP_INDEXES = [
+    "CREATE INDEX idx_daily_sales ON daily_sales (company_id, day)",
+    "CREATE INDEX idx_daily_orders ON daily_orders (company_id, day)",
+    "CREATE INDEX idx_daily_calls ON daily_calls (day, user_id)",
+    "CREATE INDEX idx_daily_dialer ON daily_dialer (day, user_id)",
+    "CREATE INDEX idx_daily_distribution ON daily_distribution (user_id, day)",
+]
+
+
+def time_to_sec(value):
+    """MySQL TIME_TO_SEC for 'HH:MM:SS' text; None when unparsable."""
+    if not value:
+        return None
+    parts = value.split(':')
+    try:
+        if len(parts) == 3:
+            return int(parts[0]) * 3600 + int(parts[1]) * 60 + int(float(parts[2]))
+        if len(parts) == 2:
+            return int(parts[0]) * 60 + int(float(parts[1]))
+        return int(float(value))
+    except ValueError:
+        return None
+
+
+# --- Build ------------------------------------------------------------------------
+
+class SnapshotLoader:
+    """Batches projected rows of each table into the snapshot."""
+
+    def __init__(self, conn, batch_size=BATCH_SIZE):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.pending = {table: [] for table in TABLES}
+        self.counts = {table: 0 for table in TABLES}
+        self.skipped = 0
+        self._projections = {}
+        for table, columns in TABLES.items():
+            names = [c for c, _ in columns] + [d[0] for d in DERIVED.get(table, [])]
+            types = [t for _, t in columns] + [d[1] for d in DERIVED.get(table, [])]
+            conn.execute(f"DROP TABLE IF EXISTS {table}")
+            conn.execute(f"CREATE TABLE {table} ({', '.join(f'{n} {t}' for n, t in zip(names, types))})")
+        # Dumps may be re-exported into one file: last row for a primary key wins
+        self._insert = {table: f"INSERT OR REPLACE INTO {table} VALUES "
+                               f"({', '.join('?' * (len(cols) + len(DERIVED.get(table, []))))})"
+                        for table, cols in TABLES.items()}
+
+    def projection(self, table, columns):
+        """Source column layout -> function building the snapshot row."""
+        key = (table, tuple(columns))
+        project = self._projections.get(key)
+        if project is None:
+            wanted = [c for c, _ in TABLES[table]]
+            indices = [columns.index(c) if c in columns else None for c in wanted]
+            derived = [(wanted.index(src), fn) for _, _, src, fn in DERIVED.get(table, [])]
+
+            def project(row, indices=indices, derived=derived):
+                # '' from CSV exports means NULL like it does in the dump converter
+                values = [None if i is None or i >= len(row) or row[i] == '' else row[i] for i in indices]
+                values.extend(fn(values[i]) for i, fn in derived)
+                return values
+            project = self._projections[key] = project
+        return project
+
+    def add(self, table, columns, row):
+        if not columns:
+            # INSERT without a column list: positions are unknown
+            self.skipped += 1
+            return
+        batch = self.pending[table]
+        batch.append(self.projection(table, columns)(row))
+        if len(batch) >= self.batch_size:
+            self.flush(table)
+
+    def flush(self, table=None):
+        for name in [table] if table else list(self.pending):
+            batch = self.pending[name]
+            if batch:
+                self.conn.executemany(self._insert[name], batch)
+                self.counts[name] += len(batch)
+                batch.clear()
+
+
+def load_csv(loader, table, path):
+    """Per-table CSV with a header of column names (e.g. `crm_import parse-dump --table`)."""
+    with open_file(path, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f)
+        header = [h.strip() for h in next(reader, [])]
+        for row in reader:
+            if row:
+                loader.add(table, header, row)
+
+
+def build_snapshot(dumps=(), csv_sources=(), output=SNAPSHOT_FILE, batch_size=BATCH_SIZE):
+    """Streams the sources into ``output`` and builds the rollup tables.
+
+    ``csv_sources`` are (table, path) pairs; a table given as CSV overrides
+    the same table in the dumps.
+    """
+    started = time.time()
+    tmp_output = output + '.tmp'
+    if os.path.exists(tmp_output):
+        os.remove(tmp_output)
+    conn = sqlite3.connect(tmp_output)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    loader = SnapshotLoader(conn, batch_size)
+    from_csv = {table for table, _ in csv_sources}
+    for table, _ in csv_sources:
+        if table not in TABLES:
+            raise ValueError(f"No snapshot table {table!r}; choose from {', '.join(TABLES)}")
+
+    dump_tables = [t for t in TABLES if t not in from_csv]
+    for dump in dumps:
+        print(f"Streaming {dump}...")
+        for table, columns, row in iter_insert_rows(dump, dump_tables):
+            loader.add(table, columns, row)
+    for table, path in csv_sources:
+        print(f"Reading {table} from {path}...")
+        load_csv(loader, table, path)
+    loader.flush()
+    for table, n in loader.counts.items():
+        print(f"  {table}: {n} rows")
+    if loader.skipped:
+        print(f"  {loader.skipped} rows from INSERTs without a column list were skipped")
+
+    print("Building rollups...")
+    for sql in INDEXES:
+        conn.execute(sql)
+    for name, select in ROLLUPS.items():
+        conn.execute(f"DROP TABLE IF EXISTS {name}")
+        conn.execute(f"CREATE TABLE {name} AS {select}")
+        n = conn.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0]
+        print(f"  {name}: {n} rows")
+    for sql in ROLLUP_INDEXES:
+        conn.execute(sql)
+    conn.execute("CREATE TABLE snapshot_meta (key TEXT PRIMARY KEY, value TEXT)")
+    conn.executemany("INSERT INTO snapshot_meta VALUES (?, ?)", [
+        ('sources', json.dumps([*dumps, *(p for _, p in csv_sources)], ensure_ascii=False)),
+        ('built_at', time.strftime('%Y-%m-%d %H:%M:%S')),
+        ('row_counts', json.dumps(loader.counts)),
+    ])
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+    os.replace(tmp_output, output)
+    print(f"Snapshot written to {output} in {time.time() - started:.1f}s")
+
+
+# --- Offline metrics --------------------------------------------------------------
+
+def telesale_members(conn, company_id):
+    """Active Telesale/Supervisor Telesale users of a company, as the Monitor pages list them."""
+    return conn.execute(f"""
+        SELECT id, first_name, last_name, role FROM users
+        WHERE company_id = ? AND status = 'active' AND role_id IN ({', '.join(map(str, TELESALE_ROLE_IDS))})
+        ORDER BY first_name, last_name""", (company_id,)).fetchall()
+
+
+def daily_monitoring(conn, company_id, day, target=40):
+    """Per-member dialer totals and the 08:00-18:00 hourly breakdown for one day."""
+    members = telesale_members(conn, company_id)
+    ids = [m[0] for m in members]
+    by_user = {}
+    hourly = {}
+    if ids:
+        rows = conn.execute(f"""
+            SELECT user_id, hour, calls, connected, talked, seconds FROM daily_dialer
+            WHERE day = ? AND user_id IN ({', '.join('?' * len(ids))})""", (day, *ids))
+        for uid, hour, calls, connected, talked, seconds in rows:
+            u = by_user.setdefault(uid, {'total_calls': 0, 'connected_calls': 0, 'talked_calls': 0, 'seconds': 0,
+                                         'morning_calls': 0, 'afternoon_calls': 0})
+            u['total_calls'] += calls
+            u['connected_calls'] += connected
+            u['talked_calls'] += talked
+            u['seconds'] += seconds
+            if hour is not None:
+                u['morning_calls' if hour <= 12 else 'afternoon_calls'] += calls
+                h = hourly.setdefault(hour, [0, 0])
+                h[0] += calls
+                h[1] += talked
+
+    totals = {'total_calls': 0, 'connected_calls': 0, 'talked_calls': 0, 'total_minutes': 0.0, 'active_users': 0}
+    out_members = []
+    for uid, first, last, role in members:
+        u = by_user.get(uid, {})
+        minutes = round(u.get('seconds', 0) / 60, 2)
+        for key in ('total_calls', 'connected_calls', 'talked_calls'):
+            totals[key] += u.get(key, 0)
+        totals['total_minutes'] += minutes
+        totals['active_users'] += 1 if u.get('total_calls') else 0
+        out_members.append({
+            'user_id': uid, 'name': f"{first or ''} {last or ''}".strip(), 'role': role,
+            'total_calls': u.get('total_calls', 0), 'connected_calls': u.get('connected_calls', 0),
+            'talked_calls': u.get('talked_calls', 0), 'total_minutes': round(minutes, 1),
+            'morning_calls': u.get('morning_calls', 0), 'afternoon_calls': u.get('afternoon_calls', 0),
+            'target_progress': round(u.get('talked_calls', 0) / target, 3) if target > 0 else 0,
+        })
+    calls = totals['total_calls']
+    totals['talk_rate'] = round(totals['talked_calls'] / calls, 3) if calls else 0
+    totals['answer_rate'] = round(totals['connected_calls'] / calls, 3) if calls else 0
+    totals['total_minutes'] = round(totals['total_minutes'], 1)
+    return {
+        'date': day,
+        'target_per_day': target,
+        'team_totals': totals,
+        'hourly': [{'hour': h, 'period': 'morning' if h <= 12 else 'afternoon',
+                    'total_calls': hourly.get(h, [0, 0])[0], 'talked_calls': hourly.get(h, [0, 0])[1]}
+                   for h in range(8, 19)],
+        'members': out_members,
+    }
+
+
+def month_range(month):
+    year, m = (int(x) for x in month.split('-'))
+    start = date(year, m, 1)
+    end = date(year + (m == 12), m % 12 + 1, 1)
+    return start.isoformat(), end.isoformat()
+
+
+def lead_performance(conn, company_id, month):
+    """Distributed -> called -> closed funnel per member for one month (YYYY-MM).
+
+    Distinct-customer counts do not add up across days, so they are counted
+    on the indexed base tables; sales come from the daily_sales rollup.
+    """
+    start, end = month_range(month)
+    members = telesale_members(conn, company_id)
+    ids = [m[0] for m in members]
+    marks = ', '.join('?' * len(ids))
+    dist, called, closed, sales = {}, {}, {}, {}
+    if ids:
+        dist = dict(conn.execute(f"""
+            SELECT assigned_to_new, COUNT(DISTINCT customer_id) FROM basket_transition_log
+            WHERE transition_type IN ('distribute', 'redistribute', 'manual')
+              AND assigned_to_new IN ({marks}) AND created_at >= ? AND created_at < ?
+            GROUP BY assigned_to_new""", (*ids, start, end)))
+        called = dict(conn.execute(f"""
+            SELECT u.id, COUNT(DISTINCT ch.customer_id) FROM users u
+            JOIN call_history ch ON ch.caller = u.first_name || ' ' || COALESCE(u.last_name, '')
+                                AND ch.date >= ? AND ch.date < ?
+                                AND (ch.status = 'รับสาย' OR ch.duration >= {TALK_SECONDS})
+            WHERE u.id IN ({marks})
+            GROUP BY u.id""", (start, end, *ids)))
+        closed = dict(conn.execute(f"""
+            SELECT oi.creator_id, COUNT(DISTINCT o.customer_id) FROM orders o
+            JOIN order_items oi ON oi.parent_order_id = o.id
+            WHERE oi.creator_id IN ({marks}) AND o.order_date >= ? AND o.order_date < ?
+              AND o.order_status NOT IN ({_EXCLUDED})
+              AND (oi.is_freebie = 0 OR oi.is_freebie IS NULL) AND oi.parent_item_id IS NULL
+            GROUP BY oi.creator_id""", (*ids, start, end)))
+        sales = dict(conn.execute(f"""
+            SELECT user_id, SUM(sales) FROM daily_sales
+            WHERE user_id IN ({marks}) AND day >= ? AND day < ?
+            GROUP BY user_id""", (*ids, start, end)))
+
+    def rates(d, c, cl):
+        return {'call_rate': round(c / d, 4) if d else 0, 'close_rate': round(cl / d, 4) if d else 0,
+                'call_close': round(cl / c, 4) if c else 0}
+
+    totals = {'distributed': 0, 'called': 0, 'closed': 0, 'sales': 0.0}
+    rows = []
+    for uid, first, last, role in members:
+        d, c, cl, sl = dist.get(uid, 0), called.get(uid, 0), closed.get(uid, 0), sales.get(uid) or 0.0
+        totals['distributed'] += d
+        totals['called'] += c
+        totals['closed'] += cl
+        totals['sales'] += sl
+        rows.append({'user_id': uid, 'name': f"{first or ''} {last or ''}".strip(), 'role': role,
+                     'distributed': d, 'called': c, 'closed': cl, 'sales': round(sl, 2), **rates(d, c, cl)})
+    totals['sales'] = round(totals['sales'], 2)
+    totals.update(rates(totals['distributed'], totals['called'], totals['closed']))
+    return {'period': {'month': month, 'start': start, 'end': end}, 'team_totals': totals, 'members': rows}
+
+
+SALES_GROUPS = {'day': 'day', 'user': 'user_id', 'product': 'product_id', 'company': 'company_id'}
+# Same groups on the base tables, for the distinct order counts
+ORDER_GROUPS = {'day': 'substr(o.order_date, 1, 10)', 'user': 'oi.creator_id', 'product': 'oi.product_id',
+                'company': 'o.company_id'}
+
+
+def sales_summary(conn, start, end, by='day', company_id=None):
+    """Orders, quantity and sales between ``start`` and ``end`` (exclusive).
+
+    Quantity and sales add up from daily_sales; an order with several
+    products or sellers would be counted once per rollup row, so orders are
+    counted distinct on the base tables.
+    """
+    key = SALES_GROUPS[by]
+    where = "day >= ? AND day < ?"
+    order_where = "o.order_date >= ? AND o.order_date < ?"
+    params = [start, end]
+    if company_id is not None:
+        where += " AND company_id = ?"
+        order_where += " AND o.company_id = ?"
+        params.append(company_id)
+    orders = dict(conn.execute(f"""
+        SELECT {ORDER_GROUPS[by]}, COUNT(DISTINCT o.id) FROM orders o
+        JOIN order_items oi ON oi.parent_order_id = o.id
+        WHERE {order_where} AND o.order_status NOT IN ({_EXCLUDED})
+          AND (oi.is_freebie = 0 OR oi.is_freebie IS NULL) AND oi.parent_item_id IS NULL
+        GROUP BY 1""", params))
+    rows = conn.execute(f"""
+        SELECT {key}, SUM(quantity), ROUND(SUM(sales), 2) FROM daily_sales
+        WHERE {where} GROUP BY {key} ORDER BY {'1' if by == 'day' else '3 DESC'}""", params)
+    return [{by: k, 'orders': orders.get(k, 0), 'quantity': q, 'sales': s} for k, q, s in rows]
+
+
+def bench(conn, repeat=3):
+    """Times every metric for each company/day and company/month present in the snapshot."""
+    companies = [r[0] for r in conn.execute("SELECT DISTINCT company_id FROM users WHERE company_id IS NOT NULL")]
+    days = [r[0] for r in conn.execute("SELECT DISTINCT day FROM daily_dialer ORDER BY day DESC LIMIT 31")]
+    months = [r[0] for r in conn.execute("SELECT DISTINCT substr(day, 1, 7) FROM daily_sales "
+                                         "WHERE day IS NOT NULL ORDER BY 1 DESC LIMIT 3")]
+    first, last = conn.execute("SELECT MIN(day), MAX(day) FROM daily_sales").fetchone()
+    cases = []
+    for c in companies:
+        cases += [('daily-monitoring', lambda c=c, d=d: daily_monitoring(conn, c, d)) for d in days]
+        cases += [('lead-performance', lambda c=c, m=m: lead_performance(conn, c, m)) for m in months]
+        if first:
+            end = (date.fromisoformat(last) + timedelta(days=1)).isoformat()
+            cases += [(f"sales by {by}", lambda c=c, by=by: sales_summary(conn, first, end, by, c))
+                      for by in SALES_GROUPS]
+    timings = {}
+    for name, fn in cases:
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        timings.setdefault(name, []).append(best)
+    print(f"{'metric':<20} {'runs':>5} {'avg ms':>9} {'max ms':>9}")
+    for name, values in timings.items():
+        print(f"{name:<20} {len(values):>5} {sum(values) / len(values) * 1000:>9.1f} {max(values) * 1000:>9.1f}")
+    return timings
+
+
+def parse_csv_sources(specs):
+    sources = []
+    for spec in specs:
+        table, sep, path = spec.partition('=')
+        if not sep:
+            raise SystemExit(f"--csv expects table=path, got {spec!r}")
+        sources.append((table, path))
+    return sources
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local SQLite snapshot of the reporting tables with daily rollups.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('build', help="Stream a dump and/or CSV exports into a snapshot")
+    p.add_argument('--dump', action='append', default=[], help="SQL dump (repeatable, .gz/.zst/.xz allowed)")
+    p.add_argument('--csv', action='append', default=[], help="table=path CSV export with a column header")
+    p.add_argument('--output', default=SNAPSHOT_FILE)
+    p.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    p = sub.add_parser('daily-monitoring', help="Monitor > daily calls for one company and day")
+    p.add_argument('snapshot')
+    p.add_argument('--company', type=int, required=True)
+    p.add_argument('--date', required=True, help="YYYY-MM-DD")
+    p.add_argument('--target', type=int, default=40, help="Daily talked-call target")
+
+    p = sub.add_parser('lead-performance', help="Monitor > lead funnel for one company and month")
+    p.add_argument('snapshot')
+    p.add_argument('--company', type=int, required=True)
+    p.add_argument('--month', required=True, help="YYYY-MM")
+
+    p = sub.add_parser('sales', help="Sales totals from the daily rollup, orders counted distinct")
+    p.add_argument('snapshot')
+    p.add_argument('--start', required=True)
+    p.add_argument('--end', required=True, help="Exclusive")
+    p.add_argument('--by', choices=list(SALES_GROUPS), default='day')
+    p.add_argument('--company', type=int)
+
+    p = sub.add_parser('bench', help="Time every metric over the snapshot")
+    p.add_argument('snapshot')
+    p.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        if not args.dump and not args.csv:
+            parser.error("give --dump and/or --csv")
+        build_snapshot(args.dump, parse_csv_sources(args.csv), args.output, args.batch_size)
+    else:
+        conn = sqlite3.connect(args.snapshot)
+        if args.command == 'daily-monitoring':
+            result = daily_monitoring(conn, args.company, args.date, args.target)
+        elif args.command == 'lead-performance':
+            result = lead_performance(conn, args.company, args.month)
+        elif args.command == 'sales':
+            result = sales_summary(conn, args.start, args.end, args.by, args.company)
+        else:
+            result = None
+            bench(conn, args.repeat)
+        if result is not None:
+            print(json.dumps(result, ensure_ascii=False, indent=2))
+        conn.close()
@@ -0,0 +1,483 @@
+"""Offline commission calculation and what-if simulation over a SQL dump.
+
+Mirrors api/Commission/calculate_commission.php (``calculate``) and
+simulate_retro.php (``retro``) without their per-order PHP loops. Order
+items are loaded once into parallel arrays. A period is aggregated once into
+sales per (user, basket key, report category). Each rule set is then applied
+to those groups, so comparing several settings costs one pass over the
+items plus a few thousand rule evaluations per scenario:
+
+    python commission_engine.py calculate prod.sql --company 1 --period 2026-02 \\
+        --scenario proposed=settings_proposed.json --output commission_records.csv
+    python commission_engine.py retro prod.sql --company 1 --month 2026-01 --scenario proposed=proposed.json
+
+The dump's own commission_settings form the ``current`` scenario. A scenario
+file is either ``{role_id: config_data}`` or the JSON returned by
+api/Commission/settings.php.
+"""
+import argparse
+import csv
+import json
+import os
+import time
+from array import array
+
+from compressed_io import open_file
+from sql_dump import iter_insert_rows
+
+DEFAULT_RATE = 5.0
+DEFAULT_DIGGING_KEYS = ["49", "50"]
+DEFAULT_CATEGORY = 'อื่นๆ'
+RULE_TYPES = ('fixed_per_qty', 'percent_of_item', 'tiered_percent')
+# simulate_retro.php metrics buckets
+METRIC_CATEGORIES = {'กระสอบใหญ่': 'large_bag', 'กระสอบเล็ก': 'small_bag', 'ชีวภัณฑ์': 'bio'}
+
+TABLES = ['users', 'products', 'orders', 'order_items', 'statement_reconcile_logs', 'commission_order_lines',
+          'commission_settings', 'commission_stamp_batches', 'commission_stamp_orders']
+
+RECORD_COLUMNS = ['scenario', 'period_year', 'period_month', 'user_id', 'total_sales', 'commission_rate',
+                  'commission_amount', 'order_count']
+LINE_COLUMNS = ['scenario', 'user_id', 'order_id', 'order_date', 'confirmed_at', 'order_amount',
+                'commission_amount']
+
+
+def php_int(value):
+    """PHP (int) cast of a string: leading digits, 0 when there are none."""
+    digits = ''
+    for ch in str(value or '').strip():
+        if not ch.isdigit():
+            break
+        digits += ch
+    return int(digits) if digits else 0
+
+
+def to_float(value):
+    try:
+        return float(value) if value not in (None, '') else 0.0
+    except ValueError:
+        return 0.0
+
+
+class CommissionData:
+    """One company's commission inputs, items held as parallel arrays."""
+
+    def __init__(self, company_id):
+        self.company_id = str(company_id)
+        self.users = {}        # id -> (role, role_id, first_name, last_name)
+        self.settings = {}     # role_id -> config_data
+        self.categories = {}   # product id -> report_category
+        self.orders = {}       # id -> (creator_id, order_date, basket_key_at_sale)
+        self.reconciled = []   # (order_id, confirmed_amount, confirmed_at), dump order
+        self.calculated = set()
+        self.batches = {}      # id -> (for_month, for_year, created_at)
+        self.stamps = []       # (batch_id, order_id, user_id, commission_amount)
+        self.item_order = []
+        self.item_creator = array('q')
+        self.item_net = array('d')
+        self.item_qty = array('d')
+        self.item_product = array('q')
+        self.item_freebie = bytearray()
+        self.item_child = bytearray()
+        self.items_by_order = {}
+
+    def add(self, table, rec):
+        company = rec.get('company_id')
+        if table == 'order_items':
+            self.item_order.append(rec.get('parent_order_id'))
+            self.item_creator.append(php_int(rec.get('creator_id')))
+            self.item_net.append(to_float(rec.get('net_total')))
+            self.item_qty.append(to_float(rec.get('quantity')))
+            self.item_product.append(php_int(rec.get('product_id')))
+            self.item_freebie.append(php_int(rec.get('is_freebie')) == 1)
+            self.item_child.append(rec.get('parent_item_id') not in (None, '', '0'))
+        elif table == 'orders':
+            if str(company) == self.company_id:
+                self.orders[rec['id']] = (php_int(rec.get('creator_id')), rec.get('order_date') or '',
+                                          rec.get('basket_key_at_sale'))
+        elif table == 'statement_reconcile_logs':
+            if rec.get('confirmed_action') == 'Confirmed' and rec.get('order_id'):
+                self.reconciled.append((rec['order_id'], to_float(rec.get('confirmed_amount')),
+                                        rec.get('confirmed_at')))
+        elif table == 'commission_order_lines':
+            if rec.get('order_id'):
+                self.calculated.add(rec['order_id'])
+        elif table == 'products':
+            self.categories[php_int(rec.get('id'))] = rec.get('report_category')
+        elif table == 'users':
+            if str(company) == self.company_id:
+                self.users[php_int(rec['id'])] = (rec.get('role'), rec.get('role_id'), rec.get('first_name'),
+                                                  rec.get('last_name'))
+        elif table == 'commission_settings':
+            if str(company) == self.company_id and rec.get('config_data'):
+                self.settings[str(rec['role_id'])] = json.loads(rec['config_data'])
+        elif table == 'commission_stamp_batches':
+            if str(company) == self.company_id:
+                self.batches[rec['id']] = (rec.get('for_month'), rec.get('for_year'), rec.get('created_at') or '')
+        elif table == 'commission_stamp_orders':
+            self.stamps.append((rec.get('batch_id'), rec.get('order_id'), php_int(rec.get('user_id')),
+                                to_float(rec.get('commission_amount'))))
+
+    def index_items(self):
+        """Groups item positions by order, keeping only this company's orders."""
+        by_order = {}
+        orders = self.orders
+        for i, oid in enumerate(self.item_order):
+            if oid in orders:
+                by_order.setdefault(oid, []).append(i)
+        self.items_by_order = by_order
+
+    def category(self, i):
+        return self.categories.get(self.item_product[i]) or DEFAULT_CATEGORY
+
+    def commissionable(self, order_id, order_creator):
+        """(item index, beneficiary) of the items commission is paid on.
+
+        Freebies never count; promotion children only when someone other
+        than the order creator added them (upsell).
+        """
+        for i in self.items_by_order.get(order_id, ()):
+            if self.item_freebie[i]:
+                continue
+            creator = self.item_creator[i]
+            if self.item_child[i] and not (creator and creator != order_creator):
+                continue
+            yield i, creator or order_creator
+
+
+def load_data(dumps, company_id):
+    data = CommissionData(company_id)
+    started = time.time()
+    for dump in dumps:
+        print(f"Loading {dump}...")
+        for table, columns, row in iter_insert_rows(dump, TABLES):
+            if columns:
+                data.add(table, dict(zip(columns, row)))
+    data.index_items()
+    print(f"  {len(data.orders)} orders, {sum(len(v) for v in data.items_by_order.values())} items, "
+          f"{len(data.users)} users, {len(data.settings)} role settings ({time.time() - started:.1f}s)")
+    return data
+
+
+def load_scenario(path):
+    """role_id -> config_data from a {role_id: config} file or a settings.php response."""
+    with open(path, 'r', encoding='utf-8') as f:
+        payload = json.load(f)
+    if isinstance(payload, dict) and 'data' in payload:
+        payload = payload['data']
+    if isinstance(payload, dict) and 'role_id' in payload:
+        payload = [payload]
+    if isinstance(payload, list):
+        return {str(r['role_id']): r['config_data'] if isinstance(r['config_data'], dict)
+                else json.loads(r['config_data']) for r in payload if r.get('config_data')}
+    return {str(k): v for k, v in payload.items()}
+
+
+# --- Rules -----------------------------------------------------------------------
+
+def tier_percent(rule, base):
+    """Percent of the last tier whose [min, max] holds ``base``; an empty max is open-ended."""
+    percent = 0.0
+    for tier in rule.get('tiers') or []:
+        low = to_float(tier.get('min'))
+        high = tier.get('max')
+        high = float('inf') if high in (None, '') else to_float(high)
+        if low <= base <= high:
+            percent = to_float(tier.get('percent'))
+    return percent
+
+
+def rule_commission(rule, amount, qty, total_sales):
+    if not rule:
+        return 0.0
+    kind = rule.get('type')
+    if kind == 'fixed_per_qty':
+        return qty * to_float(rule.get('value'))
+    if kind == 'percent_of_item':
+        return amount * to_float(rule.get('value')) / 100
+    if kind == 'tiered_percent':
+        base = total_sales if rule.get('tier_base') == 'total_sales_all_products' else amount
+        return amount * tier_percent(rule, base) / 100
+    return 0.0
+
+
+def digging_keys(config):
+    keys = (config or {}).get('general', {}).get('digging_basket_keys') or DEFAULT_DIGGING_KEYS
+    return {str(k) for k in keys}
+
+
+def user_config(data, user_id, configs, role_column):
+    user = data.users.get(user_id)
+    if not user:
+        return None
+    # calculate_commission.php looks settings up by (int)users.role, simulate_retro.php by role_id
+    key = php_int(user[0]) if role_column == 'role' else user[1]
+    return configs.get(str(key)) if key is not None else None
+
+
+def apply_rules(groups, total_sales, config):
+    """Commission per (basket type, category) of one user: {(type, category): (commission, amount, qty)}."""
+    keys = digging_keys(config)
+    merged = {}
+    for (basket, category), (amount, qty) in groups.items():
+        kind = 'digging' if str(basket if basket is not None else '') in keys else 'self'
+        m = merged.setdefault((kind, category), [0.0, 0.0])
+        m[0] += amount
+        m[1] += qty
+    rules = config.get('rules') or {}
+    out = {}
+    for (kind, category), (amount, qty) in merged.items():
+        rule = (rules.get(kind) or {}).get(category)
+        out[(kind, category)] = (rule_commission(rule, amount, qty, total_sales), amount, qty)
+    return out, keys
+
+
+# --- calculate_commission.php ------------------------------------------------------
+
+def period_bounds(period):
+    year, month = (int(x) for x in period.split('-'))
+    order_year, order_month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return year, month, f"{year:04d}-{month:02d}-01", order_year, order_month
+
+
+class PeriodSales:
+    """Commissionable sales of one period, aggregated once for every scenario."""
+
+    def __init__(self, data, period):
+        self.year, self.month, self.period_start, self.order_year, self.order_month = period_bounds(period)
+        self.groups = {}        # user -> {(basket, category): [amount, qty]}
+        self.line_groups = {}   # user -> {order_id: {(basket, category): [amount, qty]}}
+        self.lines = {}         # user -> {order_id: [amount, order_date, confirmed_at]}
+        self.total_sales = {}
+        self.orders_processed = 0
+        eligible = [(oid, amount, at) for oid, amount, at in data.reconciled
+                    if oid in data.orders and oid not in data.calculated
+                    and data.orders[oid][1] < self.period_start]
+        # ORDER BY o.order_date, stable like MySQL's row order for equal dates
+        eligible.sort(key=lambda e: data.orders[e[0]][1])
+        net, qty = data.item_net, data.item_qty
+        for oid, confirmed, confirmed_at in eligible:
+            creator, order_date, basket = data.orders[oid]
+            if oid not in data.items_by_order:
+                continue
+            items = list(data.commissionable(oid, creator))
+            value = sum(net[i] for i, _ in items)
+            ratio = confirmed / value if value > 0 else 0.0
+            any_item = False
+            for i, user in items:
+                amount = net[i] * ratio
+                q = qty[i] * ratio
+                if (amount <= 0 and q <= 0) or not user:
+                    continue
+                key = (basket, data.category(i))
+                g = self.groups.setdefault(user, {}).setdefault(key, [0.0, 0.0])
+                g[0] += amount
+                g[1] += q
+                lg = self.line_groups.setdefault(user, {}).setdefault(oid, {}).setdefault(key, [0.0, 0.0])
+                lg[0] += amount
+                lg[1] += q
+                line = self.lines.setdefault(user, {}).get(oid)
+                if line is None:
+                    line = self.lines[user][oid] = [0.0, order_date, confirmed_at or order_date]
+                line[0] += amount
+                self.total_sales[user] = self.total_sales.get(user, 0.0) + amount
+                any_item = True
+            if any_item:
+                self.orders_processed += 1
+
+    def commissions(self, data, configs, fallback_rate=DEFAULT_RATE, role_column='role'):
+        """user -> (commission, {order_id: line commission}) under one rule set."""
+        out = {}
+        for user, groups in self.groups.items():
+            total = self.total_sales[user]
+            config = user_config(data, user, configs, role_column)
+            line_commission = dict.fromkeys(self.lines[user], 0.0)
+            if not config:
+                rate = fallback_rate / 100
+                for oid, line in self.lines[user].items():
+                    line_commission[oid] = line[0] * rate
+                out[user] = (total * rate, line_commission)
+                continue
+            by_type, keys = apply_rules(groups, total, config)
+            commission = 0.0
+            # Spread each (type, category) commission over its orders by amount, else by quantity
+            shares = {}
+            for key, (value, amount, qty) in by_type.items():
+                commission += value
+                if amount > 0:
+                    shares[key] = (value / amount, 0)
+                elif value > 0 and qty > 0:
+                    shares[key] = (value / qty, 1)
+            for oid, order_groups in self.line_groups[user].items():
+                for (basket, category), (amount, qty) in order_groups.items():
+                    kind = 'digging' if str(basket if basket is not None else '') in keys else 'self'
+                    share = shares.get((kind, category))
+                    if share:
+                        line_commission[oid] += share[0] * (qty if share[1] else amount)
+            out[user] = (commission, line_commission)
+        return out
+
+
+def calculate(dumps, company_id, period, scenarios=(), output=None, lines_output=None,
+              commission_rate=DEFAULT_RATE, role_column='role'):
+    """commission_records (and commission_order_lines) for ``period`` under each scenario.
+
+    The first scenario is the dump's current commission_settings; the
+    summary shows how each other scenario moves every user's commission.
+    """
+    data = load_data(dumps, company_id)
+    started = time.time()
+    sales = PeriodSales(data, period)
+    print(f"Period {sales.year}-{sales.month:02d} (orders before {sales.period_start}): "
+          f"{sales.orders_processed} orders, {len(sales.groups)} salespeople, "
+          f"{sum(sales.total_sales.values()):,.2f} sales ({time.time() - started:.2f}s)")
+
+    results = {}
+    for name, configs in [('current', data.settings), *scenarios]:
+        started = time.time()
+        results[name] = sales.commissions(data, configs, commission_rate, role_column)
+        total = sum(c for c, _ in results[name].values())
+        print(f"  {name:<16} commission {total:>14,.2f}  ({(time.time() - started) * 1000:.1f} ms)")
+
+    if len(results) > 1:
+        base = results['current']
+        for name, result in list(results.items())[1:]:
+            changes = sorted(((result[u][0] - base[u][0], u) for u in result), reverse=True)
+            moved = [(d, u) for d, u in changes if abs(d) >= 0.005]
+            print(f"\n{name} vs current: {len(moved)} users change")
+            for d, u in moved[:5] + (moved[-5:] if len(moved) > 10 else moved[5:]):
+                print(f"    user {u}: {base[u][0]:,.2f} -> {result[u][0]:,.2f} ({d:+,.2f})")
+
+    if output:
+        with open_file(output, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(RECORD_COLUMNS)
+            for name, result in results.items():
+                for user in sorted(result):
+                    writer.writerow([name, sales.year, sales.month, user, round(sales.total_sales[user], 2),
+                                     commission_rate, round(result[user][0], 2), len(sales.lines[user])])
+        print(f"\nWrote commission_records to {output}")
+    if lines_output:
+        with open_file(lines_output, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(LINE_COLUMNS)
+            for name, result in results.items():
+                for user in sorted(result):
+                    for oid, (amount, order_date, confirmed_at) in sales.lines[user].items():
+                        writer.writerow([name, user, oid, order_date[:10], confirmed_at, round(amount, 2),
+                                         round(result[user][1][oid], 2)])
+        print(f"Wrote commission_order_lines to {lines_output}")
+    return sales, results
+
+
+# --- simulate_retro.php ------------------------------------------------------------
+
+def retro(dumps, company_id, month, scenarios=(), output=None, role_column='role_id'):
+    """Re-prices stamped orders of one month: stamped (old) vs engine (new) commission per scenario."""
+    year, mon = (int(x) for x in month.split('-'))
+    data = load_data(dumps, company_id)
+
+    def in_month(batch):
+        for_month, for_year, created_at = batch
+        month_ok = php_int(for_month) == mon if for_month not in (None, '') else created_at[5:7] == f"{mon:02d}"
+        year_ok = php_int(for_year) == year if for_year not in (None, '') else created_at[:4] == str(year)
+        return month_ok and year_ok
+
+    batch_ids = {b for b, batch in data.batches.items() if in_month(batch)}
+    groups, totals, old = {}, {}, {}
+    net, qty = data.item_net, data.item_qty
+    for batch_id, oid, stamped_user, old_commission in data.stamps:
+        if batch_id not in batch_ids or oid not in data.orders:
+            continue
+        creator, _, basket = data.orders[oid]
+        user = stamped_user or creator
+        if not user:
+            continue
+        old[user] = old.get(user, 0.0) + old_commission
+        groups.setdefault(user, {})
+        totals.setdefault(user, 0.0)
+        for i, beneficiary in data.commissionable(oid, creator):
+            if beneficiary != user or (net[i] <= 0 and qty[i] <= 0):
+                continue
+            g = groups[user].setdefault((basket, data.category(i)), [0.0, 0.0])
+            g[0] += net[i]
+            g[1] += qty[i]
+            totals[user] += net[i]
+    print(f"{len(batch_ids)} stamp batches for {year}-{mon:02d}, {len(groups)} users")
+
+    metric_names = [f"{k}_{x}" for k in ('large_bag', 'small_bag', 'bio', 'digging') for x in ('qty', 'sales')]
+    rows = []
+    for name, configs in [('current', data.settings), *scenarios]:
+        for user, user_groups in groups.items():
+            first, last, role_id = 'Unknown', '', None
+            if user in data.users:
+                _, role_id, first, last = data.users[user]
+            config = user_config(data, user, configs, role_column)
+            new = 0.0
+            if config:
+                by_type, _ = apply_rules(user_groups, totals[user], config)
+                new = sum(v for v, _, _ in by_type.values())
+            keys = digging_keys(config)
+            m = dict.fromkeys(metric_names, 0.0)
+            for (basket, category), (amount, q) in user_groups.items():
+                bucket = 'digging' if str(basket if basket is not None else '') in keys \
+                    else METRIC_CATEGORIES.get(category)
+                if bucket:
+                    m[f"{bucket}_qty"] += q
+                    m[f"{bucket}_sales"] += amount
+            rows.append([name, user, f"{first or ''} {last or ''}".strip(), role_id, round(old[user], 2),
+                         round(new, 2), round(new - old[user], 2), round(totals[user], 2),
+                         *(round(v, 2) for v in m.values())])
+    for name in ['current', *(s for s, _ in scenarios)]:
+        scenario_rows = [r for r in rows if r[0] == name]
+        print(f"  {name:<16} old {sum(r[4] for r in scenario_rows):>14,.2f}  "
+              f"new {sum(r[5] for r in scenario_rows):>14,.2f}")
+    if output:
+        with open_file(output, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['scenario', 'user_id', 'name', 'role_id', 'old_commission', 'new_commission',
+                             'difference', 'total_sales', *metric_names])
+            writer.writerows(rows)
+        print(f"Wrote {output}")
+    return rows
+
+
+def parse_scenarios(specs):
+    scenarios = []
+    for spec in specs:
+        name, sep, path = spec.partition('=')
+        if not sep:
+            name, path = os.path.splitext(os.path.basename(spec))[0], spec
+        scenarios.append((name, load_scenario(path)))
+    return scenarios
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline commission calculation and rule what-ifs.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('calculate', help="calculate_commission.php for one period, per scenario")
+    p.add_argument('dump', nargs='+', help="Dump(s) with orders, order_items, products, users, "
+                                           "statement_reconcile_logs, commission_* tables")
+    p.add_argument('--company', type=int, required=True)
+    p.add_argument('--period', required=True, help="YYYY-MM of the commission period (orders before it count)")
+    p.add_argument('--scenario', action='append', default=[], help="name=settings.json (repeatable)")
+    p.add_argument('--rate', type=float, default=DEFAULT_RATE, help="Fallback percent for users without settings")
+    p.add_argument('--role-column', choices=['role', 'role_id'], default='role',
+                   help="users column settings are matched on (calculate_commission.php reads role)")
+    p.add_argument('--output', help="commission_records CSV")
+    p.add_argument('--lines', help="commission_order_lines CSV")
+
+    p = sub.add_parser('retro', help="simulate_retro.php for one month of stamped orders, per scenario")
+    p.add_argument('dump', nargs='+')
+    p.add_argument('--company', type=int, required=True)
+    p.add_argument('--month', required=True, help="YYYY-MM of the stamp batches")
+    p.add_argument('--scenario', action='append', default=[], help="name=settings.json (repeatable)")
+    p.add_argument('--role-column', choices=['role', 'role_id'], default='role_id')
+    p.add_argument('--output', help="Per-user comparison CSV")
+    args = parser.parse_args()
+
+    if args.command == 'calculate':
+        calculate(args.dump, args.company, args.period, parse_scenarios(args.scenario), args.output, args.lines,
+                  args.rate, args.role_column)
+    else:
+        retro(args.dump, args.company, args.month, parse_scenarios(args.scenario), args.output, args.role_column)
@@ -0,0 +1,214 @@
+"""Transparent gzip/bz2/xz/zstd files, picked by extension.
+
+``open_file`` is a drop-in for ``open``: ``customers.sql.gz`` or
+``orders-raw_2025.csv.zst`` are read and written as plain text streams, any
+other path goes straight to ``open``. zstd needs the optional ``zstandard``
+package. The codec runs in a background thread (zlib, bz2, lzma and zstd
+release the GIL), so compressing an export overlaps with producing its rows
+and decompressing a dump overlaps with parsing it.
+"""
+import bz2
+import gzip
+import io
+import lzma
+import os
+import queue
+import threading
+
+CODECS = {'.gz': 'gzip', '.bz2': 'bz2', '.xz': 'xz', '.zst': 'zstd'}
+LEVELS = {'gzip': 6, 'bz2': 9, 'xz': 6, 'zstd': 3}
+
+CHUNK_SIZE = 1 << 20
+QUEUE_CHUNKS = 8
+
+
+def codec_for(path):
+    """'gzip', 'bz2', 'xz', 'zstd' or None for an uncompressed path."""
+    return CODECS.get(os.path.splitext(str(path))[1].lower())
+
+
+def split_ext(path):
+    """splitext that keeps the compression suffix with the real one: a.sql.gz -> ('a', '.sql.gz')."""
+    root, ext = os.path.splitext(path)
+    if ext.lower() in CODECS:
+        root, inner = os.path.splitext(root)
+        ext = inner + ext
+    return root, ext
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("Reading/writing .zst files needs the zstandard package (pip install zstandard)")
+    return zstandard
+
+
+def _open_codec(path, codec, mode, level=None):
+    """Binary file object for the compressed stream: mode is 'r', 'w', 'a' or 'x'."""
+    if level is None:
+        level = LEVELS[codec]
+    if codec == 'gzip':
+        if mode == 'r':
+            return gzip.open(path, 'rb')
+        return gzip.open(path, mode + 'b', compresslevel=level)
+    if codec == 'bz2':
+        if mode == 'r':
+            return bz2.open(path, 'rb')
+        return bz2.open(path, mode + 'b', compresslevel=level)
+    if codec == 'xz':
+        if mode == 'r':
+            return lzma.open(path, 'rb')
+        return lzma.open(path, mode + 'b', preset=level)
+    zstandard = _zstandard()
+    if mode == 'r':
+        return zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True)
+    return zstandard.ZstdCompressor(level=level).stream_writer(open(path, mode + 'b'), closefd=True)
+
+
+class _BackgroundWriter(io.RawIOBase):
+    """Hands chunks to a thread that compresses them into ``sink``."""
+
+    def __init__(self, sink):
+        self._sink = sink
+        self._queue = queue.Queue(QUEUE_CHUNKS)
+        self._error = None
+        self._thread = threading.Thread(target=self._run, name='compress', daemon=True)
+        self._thread.start()
+
+    def writable(self):
+        return True
+
+    def _run(self):
+        try:
+            while True:
+                chunk = self._queue.get()
+                if chunk is None:
+                    return
+                self._sink.write(chunk)
+        except BaseException as e:
+            self._error = e
+            # Keep draining so the producer never blocks on a full queue
+            while self._queue.get() is not None:
+                pass
+
+    def write(self, b):
+        if self._error:
+            raise self._error
+        self._queue.put(bytes(b))
+        return len(b)
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            self._queue.put(None)
+            self._thread.join()
+            self._sink.close()
+        finally:
+            super().close()
+        if self._error:
+            raise self._error
+
+
+class _BackgroundReader(io.RawIOBase):
+    """Decompresses ``source`` ahead of the consumer in a thread."""
+
+    def __init__(self, source):
+        self._source = source
+        self._queue = queue.Queue(QUEUE_CHUNKS)
+        self._stop = threading.Event()
+        self._pending = b''
+        self._eof = False
+        self._thread = threading.Thread(target=self._run, name='decompress', daemon=True)
+        self._thread.start()
+
+    def readable(self):
+        return True
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _run(self):
+        try:
+            while True:
+                chunk = self._source.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                if not self._put(chunk):
+                    return
+            self._put(None)
+        except BaseException as e:
+            self._put(e)
+
+    def readinto(self, b):
+        if not self._pending:
+            if self._eof:
+                return 0
+            item = self._queue.get()
+            if item is None:
+                self._eof = True
+                return 0
+            if isinstance(item, BaseException):
+                self._eof = True
+                raise item
+            self._pending = item
+        n = min(len(b), len(self._pending))
+        b[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+    def close(self):
+        if self.closed:
+            return
+        self._stop.set()
+        self._thread.join()
+        try:
+            self._source.close()
+        finally:
+            super().close()
+
+
+def open_file(path, mode='r', encoding=None, newline=None, level=None):
+    """``open`` that compresses/decompresses by extension (.gz, .bz2, .xz, .zst).
+
+    Text modes default to UTF-8; ``level`` overrides the codec's default
+    compression level.
+    """
+    codec = codec_for(path)
+    if codec is None:
+        return open(path, mode, encoding=encoding, newline=newline)
+    kind = mode.replace('b', '').replace('t', '').replace('+', '')
+    if '+' in mode or kind not in ('r', 'w', 'a', 'x'):
+        raise ValueError(f"Unsupported mode {mode!r} for compressed file {path}")
+    if kind == 'r':
+        stream = io.BufferedReader(_BackgroundReader(_open_codec(path, codec, 'r')), CHUNK_SIZE)
+    else:
+        stream = io.BufferedWriter(_BackgroundWriter(_open_codec(path, codec, kind, level)), CHUNK_SIZE)
+    if 'b' in mode:
+        return stream
+    return io.TextIOWrapper(stream, encoding=encoding or 'utf-8', newline=newline)
+
+
+if __name__ == "__main__":
+    import argparse
+    import shutil
+    import time
+
+    parser = argparse.ArgumentParser(description="Recompress a dump/export, e.g. dump.sql -> dump.sql.zst.")
+    parser.add_argument('source')
+    parser.add_argument('target')
+    parser.add_argument('--level', type=int)
+    args = parser.parse_args()
+    started = time.time()
+    with open_file(args.source, 'rb') as src, open_file(args.target, 'wb', level=args.level) as dst:
+        shutil.copyfileobj(src, dst, CHUNK_SIZE)
+    before, after = os.path.getsize(args.source), os.path.getsize(args.target)
+    print(f"{args.source} ({before:,} bytes) -> {args.target} ({after:,} bytes, "
+          f"{before / max(after, 1):.1f}x) in {time.time() - started:.1f}s")
@@ -1,10 +1,26 @@
+import argparse
 import csv
 import os
+import re
+import sys
 from datetime import datetime
+from functools import lru_cache
+
+from compressed_io import open_file, split_ext
+from csv_reader import RecordLines
+from load_checksums import DATE, DECIMAL, INT, STR, LoadManifest, canonical_int
+from quarantine import Quarantine, quarantine_path
+from row_hashes import NEW_ROW, RowHashSidecar
 
 input_csv = r'c:\AppServ\www\CRM_ERP_V4\exemple_import\customer_company1 2 7 copy 2.csv'
 output_sql = r'c:\AppServ\www\CRM_ERP_V4\exemple_import\customers_import_v4.sql'
 
+# Tenants replaced by this import
+COMPANY_IDS = (1, 2, 7)
+
+# Exports repeat the same timestamps a lot; the cache also stays warm across
+# files when the converter runs inside import_daemon
+@lru_cache(maxsize=1 << 16)
 def format_date(date_str):
     if not date_str or date_str.lower() == 'null' or date_str.strip() == '':
         return 'NULL'
@@ -39,104 +55,328 @@ def escape_sql(val):
     safe_val = safe_val.replace("'", "''")
     return f"'{safe_val}'"
 
-def convert():
-    if not os.path.exists(input_csv):
-        print(f"Error: {input_csv} not found")
-        return
+# Column names from customers (8).sql
+COLUMNS = [
+    "customer_id", "customer_ref_id", "first_name", "last_name", "phone", 
+    "backup_phone", "email", "province", "company_id", "assigned_to", 
+    "date_assigned", "date_registered", "follow_up_date", "ownership_expires", 
+    "lifecycle_status", "behavioral_status", "grade", "total_purchases", 
+    "total_calls", "facebook_name", "line_id", "street", 
+    "subdistrict", "district", "postal_code", "recipient_first_name", 
+    "recipient_last_name", "has_sold_before", "follow_up_count", "last_follow_up_date", 
+    "last_sale_date", "is_in_waiting_basket", "waiting_basket_start_date", 
+    "followup_bonus_remaining", "is_blocked", "first_order_date", "last_order_date", 
+    "order_count", "is_new_customer", "is_repeat_customer", "bucket_type", 
+    "ai_last_updated", "ai_reason_thai", "ai_score"
+]
 
-    # Use a set for faster lookup
-    date_indices = {10, 11, 12, 13, 29, 30, 32, 35, 36, 41}
-    int_indices = {0, 8, 9, 18, 27, 28, 31, 33, 34, 37, 38, 39, 43}
-    decimal_indices = {17}
+PK_INDEX = COLUMNS.index("customer_id")
+NUMERIC_RE = re.compile(r'^-?\d+(\.\d+)?$')
+COMPANY_INDEX = COLUMNS.index("company_id")
 
-    with open(input_csv, 'r', encoding='utf-8-sig') as f, open(output_sql, 'w', encoding='utf-8') as out:
-        # Using excel dialect but being careful with quotes
-        reader = csv.reader(f, quotechar='"', doublequote=True, skipinitialspace=True)
-        
+DATE_INDICES = {10, 11, 12, 13, 29, 30, 32, 35, 36, 41}
+INT_INDICES = {0, 8, 9, 18, 27, 28, 31, 33, 34, 37, 38, 39, 43}
+DECIMAL_INDICES = {17}
+
+
+def numeric_sql(val):
+    """Unquoted SQL number, 'NULL' for empty, or None if the value is not a number."""
+    if val.lower() == 'null' or val.strip() == '':
+        return 'NULL'
+    # Clean up numeric values (remove commas, spaces)
+    clean_val = val.strip().replace(',', '')
+    if not clean_val:
+        return 'NULL'
+    # Numbers are emitted unquoted; anything else would break the batch
+    return clean_val if NUMERIC_RE.match(clean_val) else None
+
+
+def int_sql(val):
+    """numeric_sql for INT columns: a fraction is rounded half away from zero, as MySQL stores it."""
+    num = numeric_sql(val)
+    if num is None or '.' not in num:
+        return num
+    return canonical_int(num)
+
+
+def compile_row_transform(num_columns, date_indices, numeric_indices, int_indices=()):
+    """Generates ``transform(row) -> (sql values, bad column index)`` for one column layout.
+
+    The per-column type dispatch is resolved once here and unrolled into
+    straight-line code, so the hot loop does no set lookups per cell.
+    Numeric columns are checked first, in column order, so a bad row stops
+    before any escaping work. ``int_indices`` are the numeric columns
+    emitted as whole numbers.
+    """
+    lines = ["def transform(row):"]
+    for i in sorted(numeric_indices):
+        lines.append(f"    n{i} = {'int_sql' if i in int_indices else 'numeric_sql'}(row[{i}])")
+        lines.append(f"    if n{i} is None: return None, {i}")
+    values = []
+    for i in range(num_columns):
+        if i in numeric_indices:
+            values.append(f"n{i}")
+        elif i in date_indices:
+            values.append(f"format_date(row[{i}])")
+        else:
+            values.append(f"escape_sql(row[{i}])")
+    lines.append(f"    return [{', '.join(values)}], None")
+    namespace = {'numeric_sql': numeric_sql, 'int_sql': int_sql, 'format_date': format_date, 'escape_sql': escape_sql}
+    exec(compile("\n".join(lines), '<row_transform>', 'exec'), namespace)
+    return namespace['transform']
+
+
+class SqlShard:
+    """One output file with its own scoped DELETE and transaction."""
+
+    def __init__(self, path, delete_where):
+        self.path = path
+        self.delete_where = delete_where
+        self.out = open_file(path, 'w', encoding='utf-8')
+        # (insert header, ON DUPLICATE KEY clause) -> pending value tuples
+        self.batches = {}
+        self.count = 0
+
+    def write_header(self, scoped):
+        self.out.write("SET FOREIGN_KEY_CHECKS = 0;\n")
+        self.out.write("SET SQL_MODE = \"NO_AUTO_VALUE_ON_ZERO\";\n")
+        if scoped:
+            # Delete inside the shard's own transaction so a shard is all-or-nothing
+            # and only locks the rows it owns.
+            self.out.write("START TRANSACTION;\n")
+            if self.delete_where:
+                self.out.write(f"DELETE FROM `customers` WHERE {self.delete_where};\n")
+        else:
+            if self.delete_where:
+                self.out.write(f"DELETE FROM `customers` WHERE {self.delete_where};\n")
+            self.out.write("START TRANSACTION;\n")
+        self.out.write("SET time_zone = \"+00:00\";\n\n")
+
+    def add(self, values_sql, insert_header, batch_size, update_clause=''):
+        key = (insert_header, update_clause)
+        batch = self.batches.setdefault(key, [])
+        batch.append(values_sql)
+        self.count += 1
+        if len(batch) >= batch_size:
+            self._write(key, batch)
+            self.batches[key] = []
+
+    def _write(self, key, batch):
+        insert_header, update_clause = key
+        self.out.write(insert_header + ",\n".join(batch) + update_clause + ";\n\n")
+
+    def flush(self):
+        for key, batch in self.batches.items():
+            if batch:
+                self._write(key, batch)
+        self.batches = {}
+
+    def close(self):
+        self.flush()
+        self.out.write("COMMIT;\n")
+        self.out.write("SET FOREIGN_KEY_CHECKS = 1;\n")
+        self.out.close()
+
+
+def company_in_clause(company_ids):
+    return f"`company_id` IN ({', '.join(str(c) for c in company_ids)})"
+
+
+def shard_path(base_path, suffix):
+    root, ext = split_ext(base_path)
+    return f"{root}.{suffix}{ext or '.sql'}"
+
+
+class ShardRouter:
+    """Routes rows to per-company or per-customer_id-range shard files.
+
+    Company shards only delete their own tenant; pk shards split customer_id
+    into ``num_shards`` contiguous ranges up to ``max_pk`` and delete their
+    range within the imported tenants, which the primary key serves as an
+    index range scan, so concurrent sessions only lock their own id range.
+    Every company and range gets a shard even without rows, so its DELETE
+    still runs.
+    """
+
+    def __init__(self, base_path, shard_by, num_shards, company_ids, upsert=False, max_pk=0):
+        self.base_path = base_path
+        self.shard_by = shard_by
+        self.num_shards = num_shards
+        self.company_ids = company_ids
+        self.upsert = upsert
+        self.range_size = max_pk // num_shards + 1
+        self.shards = {}
+        if not upsert:
+            keys = [str(c) for c in company_ids] if shard_by == 'company' else range(num_shards)
+            for key in keys:
+                self.shards[key] = self._open(key)
+
+    def shard_for(self, row):
+        if self.shard_by == 'company':
+            key = row[COMPANY_INDEX].strip() if COMPANY_INDEX < len(row) else ''
+            key = key if key.isdigit() else 'unknown'
+        else:
+            pk = row[PK_INDEX].strip() if PK_INDEX < len(row) else ''
+            key = min(int(pk) // self.range_size, self.num_shards - 1) if pk.isdigit() else 0
+
+        shard = self.shards.get(key)
+        if shard is None:
+            shard = self._open(key)
+            self.shards[key] = shard
+        return shard
+
+    def _open(self, key):
+        if self.shard_by == 'company':
+            path = shard_path(self.base_path, f"company_{key}")
+            known = key != 'unknown' and int(key) in self.company_ids
+            delete_where = f"`company_id` = {key}" if known else None
+        else:
+            path = shard_path(self.base_path, f"shard_{key}_of_{self.num_shards}")
+            # First and last ranges are open-ended so together they cover every id
+            conditions = [company_in_clause(self.company_ids)]
+            if key > 0:
+                conditions.append(f"`customer_id` >= {key * self.range_size}")
+            if key < self.num_shards - 1:
+                conditions.append(f"`customer_id` < {(key + 1) * self.range_size}")
+            delete_where = " AND ".join(conditions)
+        shard = SqlShard(path, None if self.upsert else delete_where)
+        shard.write_header(scoped=True)
+        return shard
+
+    def close(self):
+        for shard in self.shards.values():
+            shard.close()
+
+
+def max_customer_id(source):
+    """Highest numeric customer_id in the export; sizes the pk shard ranges."""
+    max_pk = 0
+    with open_file(source, 'r', encoding='utf-8-sig') as f:
+        for row in csv.reader(f, quotechar='"', doublequote=True, skipinitialspace=True):
+            pk = row[PK_INDEX].strip() if PK_INDEX < len(row) else ''
+            if pk.isdigit() and int(pk) > max_pk:
+                max_pk = int(pk)
+    return max_pk
+
+
+def upsert_clause(columns, changed):
+    """ON DUPLICATE KEY UPDATE limited to the changed columns (all non-pk columns for new rows)."""
+    if changed is NEW_ROW:
+        changed = range(len(columns))
+    cols = [columns[i] for i in changed if i != PK_INDEX]
+    if not cols:
+        return ''
+    return "\nON DUPLICATE KEY UPDATE " + ", ".join(f"`{c}` = VALUES(`{c}`)" for c in cols)
+
+
+def convert(shard_by=None, num_shards=4, upsert=False, hash_sidecar=None, source=None, output=None):
+    """Converts ``source`` to SQL; returns False when there is nothing to convert."""
+    source = source or input_csv
+    output = output or output_sql
+    if not os.path.exists(source):
+        print(f"Error: {source} not found")
+        return False
+
+    columns = COLUMNS
+
+    # Upsert mode replaces the tenant-wide DELETE with idempotent
+    # INSERT .. ON DUPLICATE KEY UPDATE, skipping rows whose hash is unchanged.
+    sidecar = RowHashSidecar(hash_sidecar or output + '.hashes') if upsert else None
+
+    if shard_by:
+        max_pk = max_customer_id(source) if shard_by == 'pk' else 0
+        router = ShardRouter(output, shard_by, num_shards, COMPANY_IDS, upsert, max_pk)
+        single = None
+    else:
+        router = None
         # Cleanup and FK checks
-        out.write("SET FOREIGN_KEY_CHECKS = 0;\n")
-        out.write("SET SQL_MODE = \"NO_AUTO_VALUE_ON_ZERO\";\n")
-        out.write("DELETE FROM `customers` WHERE `company_id` IN (1, 2, 7);\n")
-        out.write("START TRANSACTION;\n")
-        out.write("SET time_zone = \"+00:00\";\n\n")
-
-        # Column names from customers (8).sql
-        columns = [
-            "customer_id", "customer_ref_id", "first_name", "last_name", "phone", 
-            "backup_phone", "email", "province", "company_id", "assigned_to", 
-            "date_assigned", "date_registered", "follow_up_date", "ownership_expires", 
-            "lifecycle_status", "behavioral_status", "grade", "total_purchases", 
-            "total_calls", "facebook_name", "line_id", "street", 
-            "subdistrict", "district", "postal_code", "recipient_first_name", 
-            "recipient_last_name", "has_sold_before", "follow_up_count", "last_follow_up_date", 
-            "last_sale_date", "is_in_waiting_basket", "waiting_basket_start_date", 
-            "followup_bonus_remaining", "is_blocked", "first_order_date", "last_order_date", 
-            "order_count", "is_new_customer", "is_repeat_customer", "bucket_type", 
-            "ai_last_updated", "ai_reason_thai", "ai_score"
-        ]
+        single = SqlShard(output, None if upsert else company_in_clause(COMPANY_IDS))
+        single.write_header(scoped=False)
+
+    quarantine = Quarantine(quarantine_path(output), 'convert_csv_to_sql_v4')
+    num_columns = len(columns)
+    transform = compile_row_transform(num_columns, DATE_INDICES, INT_INDICES | DECIMAL_INDICES, INT_INDICES)
+    # Expected per-batch row counts/checksums of the loaded table, checked by load_checksums.py
+    kinds = [DATE if i in DATE_INDICES else INT if i in INT_INDICES else DECIMAL if i in DECIMAL_INDICES else STR
+             for i in range(num_columns)]
+    manifest = LoadManifest(output + '.manifest.json', 'customers', 'customer_id', columns, kinds,
+                            hash_sidecar=sidecar.path if sidecar else None)
+
+    with open_file(source, 'r', encoding='utf-8-sig') as f:
+        # Using excel dialect but being careful with quotes
+        # RecordLines keeps the raw text of the current record for the rejects file
+        lines = RecordLines(f)
+        reader = csv.reader(lines, quotechar='"', doublequote=True, skipinitialspace=True)
         
         insert_header = f"INSERT INTO `customers` (`{'`, `'.join(columns)}`) VALUES "
 
         batch_size = 1000
-        values_batch = []
         count = 0
-        malformed_count = 0
 
-        for line_num, row in enumerate(reader, 1):
+        for row in reader:
             if not row: continue
+            line_num = reader.line_num
             
-            # Check column count
-            if len(row) != len(columns):
-                # If we have more than expected, it might be a parsing issue
-                # But let's try to handle it or at least log it
-                if malformed_count < 10:
-                    print(f"Warning: Row {line_num} has {len(row)} columns, expected {len(columns)}.")
-                malformed_count += 1
+            # Upfront checks instead of try/except: a wrong column count means the
+            # row was split badly and every value after the break is shifted.
+            if len(row) != num_columns:
+                quarantine.reject(line_num, 'column_count', lines.text, f"{len(row)} columns, expected {num_columns}")
+                continue
             
-            try:
-                processed_row = []
-                for i in range(len(columns)):
-                    if i < len(row):
-                        val = row[i]
-                    else:
-                        val = 'NULL'
-                    
-                    if i in date_indices:
-                        processed_row.append(format_date(val))
-                    elif i in int_indices or i in decimal_indices:
-                        if val is None or val.lower() == 'null' or val.strip() == '':
-                            processed_row.append('NULL')
-                        else:
-                            # Clean up numeric values (remove commas, spaces)
-                            clean_val = val.strip().replace(',', '')
-                            if not clean_val:
-                                processed_row.append('NULL')
-                            else:
-                                processed_row.append(clean_val)
-                    else:
-                        processed_row.append(escape_sql(val))
-
-                values_batch.append(f"({', '.join(processed_row)})")
-                count += 1
-                
-                if len(values_batch) >= batch_size:
-                    out.write(insert_header + ",\n".join(values_batch) + ";\n\n")
-                    values_batch = []
-                    if count % 10000 == 0:
-                        print(f"Processed {count} rows...")
-
-            except Exception as e:
-                print(f"Error processing row {line_num}: {e}")
+            processed_row, bad_column = transform(row)
+            if bad_column is not None:
+                quarantine.reject(line_num, 'not_a_number', lines.text, f"{columns[bad_column]}={row[bad_column]!r}")
                 continue
+            # Rows the sidecar skips below are already loaded and still expected in the table
+            manifest.add(row, processed_row, processed_row[COMPANY_INDEX])
+
+            update_clause = ''
+            if sidecar:
+                changed = sidecar.diff(row[PK_INDEX].strip(), processed_row)
+                if changed is False:
+                    continue
+                update_clause = upsert_clause(columns, changed)
+
+            shard = router.shard_for(row) if router else single
+            shard.add(f"({', '.join(processed_row)})", insert_header, batch_size, update_clause)
+            count += 1
+            
+            if count % 10000 == 0:
+                print(f"Processed {count} rows...")
+
+    if router:
+        router.close()
+        print(f"Wrote {len(router.shards)} shards ({shard_by}):")
+        for shard in router.shards.values():
+            print(f"  {shard.path}: {shard.count} rows")
+        print("Shards are independent and can be loaded concurrently, e.g. one mysql session per file.")
+    else:
+        single.close()
 
-        if values_batch:
-            out.write(insert_header + ",\n".join(values_batch) + ";\n\n")
+    if sidecar:
+        sidecar.save()
+        print(f"Upsert: {sidecar.new} new, {sidecar.changed} changed, {sidecar.unchanged} unchanged rows skipped.")
+        print(f"Row hashes pending in {sidecar.pending_path}; they replace {sidecar.path} once "
+              f"load_checksums.py verifies the load (or run: python row_hashes.py {sidecar.path})")
 
-        out.write("COMMIT;\n")
-        out.write("SET FOREIGN_KEY_CHECKS = 1;\n")
-        print(f"Done. Total rows processed: {count}")
-        if malformed_count > 0:
-            print(f"Total rows with mismatched column counts: {malformed_count}")
+    manifest.save()
+    quarantine.close()
+    print(f"Done. Total rows processed: {count}")
+    return True
 
 if __name__ == "__main__":
-    convert()
+    parser = argparse.ArgumentParser(description="Convert the customer CSV export to SQL inserts.")
+    parser.add_argument('--input', default=input_csv)
+    parser.add_argument('--output', default=output_sql)
+    parser.add_argument('--shard-by', choices=['company', 'pk'],
+                        help="Split output into independently loadable files per company or per customer_id range")
+    parser.add_argument('--shards', type=int, default=4,
+                        help="Number of shards when sharding by pk (default: 4)")
+    parser.add_argument('--upsert', action='store_true',
+                        help="Emit idempotent INSERT .. ON DUPLICATE KEY UPDATE for new/changed rows only, no DELETE")
+    parser.add_argument('--hash-sidecar',
+                        help="Row-hash file from the previous run (default: <output>.hashes)")
+    args = parser.parse_args()
+    ok = convert(shard_by=args.shard_by, num_shards=args.shards, upsert=args.upsert, hash_sidecar=args.hash_sidecar,
+                 source=args.input, output=args.output)
+    sys.exit(0 if ok else 1)
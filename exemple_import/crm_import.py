@@ -0,0 +1,327 @@
+"""Single entry point for the import toolkit.
+
+    python crm_import.py <command> [options]
+
+Only argparse is imported at startup; each command imports the modules it
+needs (and pandas/openpyxl only where a command reads through them), so
+``--help`` and small runs from PHP exec or cron start quickly.
+"""
+import argparse
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.join(HERE, '..', 'scripts')
+
+
+def cmd_parse_dump(args):
+    import csv
+    from collections import Counter
+
+    from compressed_io import open_file
+    from sql_dump import iter_insert_rows
+
+    if not args.table:
+        counts = Counter(table for table, _, _ in iter_insert_rows(args.dump))
+        for table, n in sorted(counts.items()):
+            print(f"{table}\t{n}")
+        return
+
+    out = open_file(args.output, 'w', encoding='utf-8-sig', newline='') if args.output else sys.stdout
+    try:
+        writer = csv.writer(out)
+        header_written = False
+        count = 0
+        for _, columns, row in iter_insert_rows(args.dump, [args.table]):
+            if not header_written and columns:
+                writer.writerow(columns)
+                header_written = True
+            writer.writerow(['NULL' if v is None else v for v in row])
+            count += 1
+    finally:
+        if args.output:
+            out.close()
+    if args.output:
+        print(f"Wrote {count} `{args.table}` rows to {args.output}")
+
+
+def cmd_validate_addresses(args):
+    import validate_addresses
+
+    validate_addresses.main(None if args.no_cache else args.cache, args.master, args.input, args.output)
+
+
+def cmd_bench_addresses(args):
+    from address_benchmark import run
+
+    sys.exit(0 if run(args.matchers, args.golden, args.master, args.repeat, args.json) else 1)
+
+
+def cmd_clean_names(args):
+    import transform_names
+
+    transform_names.main(args.input, args.output)
+
+
+def cmd_convert(args):
+    import convert_csv_to_sql_v4
+
+    ok = convert_csv_to_sql_v4.convert(shard_by=args.shard_by, num_shards=args.shards, upsert=args.upsert,
+                                       hash_sidecar=args.hash_sidecar, source=args.input, output=args.output)
+    sys.exit(0 if ok else 1)
+
+
+def cmd_verify(args):
+    from load_checksums import verify
+
+    if not args.sqlite and not args.database:
+        sys.exit("verify: give --sqlite or --database")
+    sys.exit(0 if verify(args.manifest, args.sqlite, args) else 1)
+
+
+def cmd_commit_hashes(args):
+    from row_hashes import commit
+
+    if not commit(args.sidecar):
+        sys.exit(f"commit-hashes: no pending row hashes for {args.sidecar}")
+    print(f"Row hashes committed to {args.sidecar}")
+
+
+def cmd_import_sales(args):
+    import import_sales_template
+
+    import_sales_template.import_sales(args.sources, args.output, args.master, args.products, args.customers,
+                                       args.users, args.orders, args.company_id, args.next_customer_id,
+                                       None if args.no_cache else args.cache)
+
+
+def cmd_ingest_ads(args):
+    from ads_ingest import ingest_ads
+
+    ingest_ads(args.sources, args.output, args.pages, args.products, args.users, args.existing, args.company_id,
+               args.user_id, args.combine)
+
+
+def cmd_reconcile(args):
+    from reconcile_statements import reconcile
+
+    statements = args.statements or args.dump
+    orders = args.orders or args.dump
+    if not statements or not orders:
+        sys.exit("reconcile: --statements and --orders (or --dump) are required")
+    reconcile(statements, orders, args.slips or args.dump, args.cod_documents or args.dump,
+              args.cod_records or args.dump, args.reconciled or args.dump, args.output, args.unmatched,
+              args.company_id, args.start_date, args.end_date)
+
+
+def cmd_snapshot(args):
+    from analytics_snapshot import build_snapshot, parse_csv_sources
+
+    if not args.dump and not args.csv:
+        sys.exit("snapshot: give --dump and/or --csv")
+    build_snapshot(args.dump, parse_csv_sources(args.csv), args.output)
+
+
+def cmd_commission(args):
+    from commission_engine import calculate, parse_scenarios, retro
+
+    scenarios = parse_scenarios(args.scenario)
+    if args.month:
+        retro(args.dump, args.company, args.month, scenarios, args.output)
+    elif args.period:
+        calculate(args.dump, args.company, args.period, scenarios, args.output, args.lines, args.rate,
+                  args.role_column)
+    else:
+        sys.exit("commission: give --period (calculate) or --month (retro over stamp batches)")
+
+
+def cmd_lookup(args):
+    from row_index import layout_columns, open_index, write_rows
+
+    columns = layout_columns(args.layout) if args.layout else None
+    key = f"{args.column}:{args.normalize}" if args.normalize else args.column
+    with open_index(args.csv, [key], has_header=not args.layout, columns=columns) as index:
+        rows = index.get(args.column, args.value)
+        write_rows(index, rows)
+    if not rows:
+        sys.exit(1)
+
+
+def cmd_generate_mock(args):
+    sys.path.insert(0, SCRIPTS_DIR)
+    import generate_mock_customers
+
+    generate_mock_customers.main(args.count, args.assigned_to, args.company_id, args.output)
+
+
+def cmd_inspect(args):
+    import json
+
+    from infer_schema import infer_mapping, read_sample
+
+    if args.mapping:
+        config = infer_mapping(args.path, args.table, sheet=args.sheet)
+        print(json.dumps(config, ensure_ascii=False, indent=2))
+        return
+    rows = read_sample(args.path, args.rows, args.sheet)
+    if not rows:
+        print(f"{args.path} is empty")
+        return
+    print("Headers:")
+    for i, col in enumerate(rows[0]):
+        print(f"- [{i}] {col}")
+    for n, row in enumerate(rows[1:args.rows + 1], 1):
+        print(f"\nRow {n}:")
+        print(dict(zip(rows[0], row)))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='crm_import', description="CRM import toolkit.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('parse-dump', help="List tables of a SQL dump, or export one table's rows as CSV")
+    p.add_argument('dump')
+    p.add_argument('--table', help="Table to export (default: list tables with row counts)")
+    p.add_argument('--output', help="CSV path (default: stdout)")
+    p.set_defaults(func=cmd_parse_dump)
+
+    p = sub.add_parser('validate-addresses', help="Validate customer addresses against the gazetteer")
+    p.add_argument('--input', required=True)
+    p.add_argument('--output', required=True)
+    p.add_argument('--master', default=os.path.join(HERE, 'primacom_mini_erp.sql'),
+                   help="Dump with the address_* tables")
+    p.add_argument('--cache', default=os.path.join(HERE, 'address_cache.sqlite'))
+    p.add_argument('--no-cache', action='store_true')
+    p.set_defaults(func=cmd_validate_addresses)
+
+    p = sub.add_parser('bench-addresses', help="Address-matcher precision/recall and lookups/s on the golden set")
+    p.add_argument('matchers', nargs='*', default=['validate_addresses'],
+                   help="validate_addresses or migrate_and_validate, optionally =path/to/other/version.py")
+    p.add_argument('--golden', default=os.path.join(HERE, 'address_golden.csv'))
+    p.add_argument('--master', default=os.path.join(HERE, 'primacom_mini_erp.sql'),
+                   help="Dump with the address_* tables")
+    p.add_argument('--repeat', type=int, default=3)
+    p.add_argument('--json', help="Write the full report here")
+    p.set_defaults(func=cmd_bench_addresses)
+
+    p = sub.add_parser('clean-names', help="Strip name prefixes and split first/last name")
+    p.add_argument('--input', required=True)
+    p.add_argument('--output', required=True)
+    p.set_defaults(func=cmd_clean_names)
+
+    p = sub.add_parser('convert', help="Convert the 44-column customer CSV to SQL inserts")
+    p.add_argument('--input', required=True)
+    p.add_argument('--output', required=True)
+    p.add_argument('--shard-by', choices=['company', 'pk'])
+    p.add_argument('--shards', type=int, default=4)
+    p.add_argument('--upsert', action='store_true')
+    p.add_argument('--hash-sidecar')
+    p.set_defaults(func=cmd_convert)
+
+    p = sub.add_parser('verify', help="Check a loaded table against a converter's checksum manifest")
+    p.add_argument('manifest', help="<output>.manifest.json")
+    p.add_argument('--sqlite', help="SQLite database file")
+    p.add_argument('--database', help="MariaDB/MySQL database")
+    p.add_argument('--host', default='127.0.0.1')
+    p.add_argument('--port', type=int, default=3306)
+    p.add_argument('--user', default='root')
+    p.add_argument('--password', default=os.environ.get('MYSQL_PWD', ''))
+    p.add_argument('--mysql', default='mysql', help="mysql client binary")
+    p.set_defaults(func=cmd_verify)
+
+    p = sub.add_parser('commit-hashes', help="Commit an upsert run's row hashes once its SQL is loaded")
+    p.add_argument('sidecar', help="<output>.hashes")
+    p.set_defaults(func=cmd_commit_hashes)
+
+    p = sub.add_parser('import-sales', help="Convert sales_template uploads to batched order inserts")
+    p.add_argument('sources', nargs='+')
+    p.add_argument('--output', required=True)
+    p.add_argument('--master', default=os.path.join(HERE, 'primacom_mini_erp.sql'),
+                   help="Dump with the address_* tables")
+    p.add_argument('--products', help="Dump with the `products` table")
+    p.add_argument('--customers', help="Dump with the `customers` table")
+    p.add_argument('--users', help="Dump with the `users` table")
+    p.add_argument('--orders', help="Dump with the `orders` table; orders already there are skipped")
+    p.add_argument('--company-id', type=int, default=1)
+    p.add_argument('--next-customer-id', type=int)
+    p.add_argument('--cache', default=os.path.join(HERE, 'address_cache.sqlite'))
+    p.add_argument('--no-cache', action='store_true')
+    p.set_defaults(func=cmd_import_sales)
+
+    p = sub.add_parser('ingest-ads', help="Convert ad-platform spend exports to batched ads log upserts")
+    p.add_argument('sources', nargs='+')
+    p.add_argument('--output', required=True)
+    p.add_argument('--pages', default=os.path.join(HERE, 'primacom_mini_erp.sql'), help="Dump with the `pages` table")
+    p.add_argument('--products', help="Dump with the `products` table")
+    p.add_argument('--users', help="Dump with the `users` table")
+    p.add_argument('--existing', help="Dump with the ads log tables; unchanged rows are skipped")
+    p.add_argument('--company-id', type=int, default=1)
+    p.add_argument('--user-id', type=int, help="Recorder for rows without a user column")
+    p.add_argument('--combine', choices=['last', 'sum'], default='last')
+    p.set_defaults(func=cmd_ingest_ads)
+
+    p = sub.add_parser('reconcile', help="Auto-match bank statement lines to transfer orders and COD documents")
+    p.add_argument('--dump', help="SQL dump holding every input table")
+    p.add_argument('--statements')
+    p.add_argument('--orders')
+    p.add_argument('--slips')
+    p.add_argument('--cod-documents')
+    p.add_argument('--cod-records')
+    p.add_argument('--reconciled')
+    p.add_argument('--company-id', type=int)
+    p.add_argument('--start-date')
+    p.add_argument('--end-date')
+    p.add_argument('--output', required=True)
+    p.add_argument('--unmatched')
+    p.set_defaults(func=cmd_reconcile)
+
+    p = sub.add_parser('snapshot', help="Build a local SQLite reporting snapshot with daily rollups")
+    p.add_argument('--dump', action='append', default=[], help="SQL dump (repeatable)")
+    p.add_argument('--csv', action='append', default=[], help="table=path CSV export with a column header")
+    p.add_argument('--output', default=os.path.join(HERE, 'analytics_snapshot.sqlite'))
+    p.set_defaults(func=cmd_snapshot)
+
+    p = sub.add_parser('commission', help="Commission records and rule-set what-ifs from a SQL dump")
+    p.add_argument('dump', nargs='+')
+    p.add_argument('--company', type=int, required=True)
+    p.add_argument('--period', help="YYYY-MM commission period, as calculate_commission.php")
+    p.add_argument('--month', help="YYYY-MM of stamp batches to re-price, as simulate_retro.php")
+    p.add_argument('--scenario', action='append', default=[], help="name=settings.json (repeatable)")
+    p.add_argument('--rate', type=float, default=5.0)
+    p.add_argument('--role-column', choices=['role', 'role_id'], default='role')
+    p.add_argument('--output')
+    p.add_argument('--lines')
+    p.set_defaults(func=cmd_commission)
+
+    p = sub.add_parser('lookup', help="Rows of a large CSV by key, through a byte-offset sidecar index")
+    p.add_argument('csv')
+    p.add_argument('column', help="Key column (header name, or a customers layout name with --layout)")
+    p.add_argument('value')
+    p.add_argument('--normalize', choices=['strip', 'phone', 'lower'], help="Key normalizer (default: strip)")
+    p.add_argument('--layout', choices=['customers'], help="Column names of a headerless file")
+    p.set_defaults(func=cmd_lookup)
+
+    p = sub.add_parser('generate-mock', help="Generate mock customers as a SQL insert")
+    p.add_argument('--output', required=True)
+    p.add_argument('--count', type=int, default=10000)
+    p.add_argument('--assigned-to', type=int, default=1655)
+    p.add_argument('--company-id', type=int, default=1)
+    p.set_defaults(func=cmd_generate_mock)
+
+    p = sub.add_parser('inspect', help="Show headers and sample rows of a CSV/XLSX export")
+    p.add_argument('path')
+    p.add_argument('--rows', type=int, default=1, help="Sample rows to show")
+    p.add_argument('--sheet', help="XLSX sheet name")
+    p.add_argument('--mapping', action='store_true', help="Propose a customers/orders column mapping instead")
+    p.add_argument('--table', choices=['customers', 'orders'], help="Target table for --mapping")
+    p.set_defaults(func=cmd_inspect)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import csv
+from operator import itemgetter
+
+from compressed_io import open_file
+
+
+def _getter(indices):
+    # itemgetter with a single index returns the bare value, not a tuple
+    if len(indices) == 1:
+        i = indices[0]
+        return lambda fields: (fields[i],)
+    return itemgetter(*indices)
+
+
+def parse_line(text):
+    """Full csv-module parse of one logical record (may contain quoted newlines)."""
+    return next(csv.reader([text]), [])
+
+
+class ProjectedReader:
+    """Reads selected columns of a wide CSV without decoding the rest.
+
+    Lines without quotes are split only up to the last wanted column, so the
+    tail of a 44-column row stays one unsplit string; lines containing a quote
+    fall back to the csv module, joined with their continuation lines when a
+    quoted field spans lines. ``f`` must be opened with ``newline=''``.
+
+    ``line_num`` follows csv.reader: the physical line the current record
+    ends on. Rows too short for the projection, or whose field count differs
+    from ``width`` when given, are passed to
+    ``on_malformed(line_num, fields, text)`` with the raw record text instead
+    of being yielded. ``header_text`` keeps the header record as read.
+    """
+
+    def __init__(self, f, has_header=True, width=None, on_malformed=None):
+        self.f = f
+        self.width = width
+        self.on_malformed = on_malformed
+        self.line_num = 0
+        self.header = None
+        self.header_text = None
+        self._records = self._iter_records()
+        if has_header:
+            first = next(self._records, None)
+            self.header = [h.strip() for h in parse_line(first)] if first is not None else []
+            self.header_text = first
+
+    def column_index(self, column):
+        if isinstance(column, int):
+            return column
+        try:
+            return self.header.index(column)
+        except (AttributeError, ValueError):
+            raise KeyError(f"Column {column!r} not in header") from None
+
+    def _continue_record(self, line):
+        """Joins continuation lines while a quoted field is still open."""
+        parts = [line]
+        for more in self.f:
+            self.line_num += 1
+            parts.append(more)
+            if more.count('"') % 2:
+                break
+        return ''.join(parts)
+
+    def records(self):
+        """Yields the raw text of each remaining non-blank record; ``line_num`` is the line it ends on."""
+        return self._records
+
+    def _iter_records(self):
+        for line in self.f:
+            self.line_num += 1
+            if line.count('"') % 2:
+                line = self._continue_record(line)
+            line = line.rstrip('\r\n')
+            if line:
+                yield line
+
+    def select(self, columns):
+        """Yields a tuple of the requested columns (names or indices) per row."""
+        indices = [self.column_index(c) for c in columns]
+        last = max(indices)
+        get = _getter(indices)
+        width = self.width
+        on_malformed = self.on_malformed
+
+        # Inlined record loop: this is the hot path, one iteration per physical line
+        for line in self.f:
+            self.line_num += 1
+            if '"' in line:
+                if line.count('"') % 2:
+                    line = self._continue_record(line)
+                fields = parse_line(line)
+                n = len(fields)
+            else:
+                line = line.rstrip('\r\n')
+                if not line:
+                    continue
+                fields = line.split(',', last + 1)
+                n = line.count(',') + 1 if width else len(fields)
+            if n <= last or (width and n != width):
+                if on_malformed and fields:
+                    text = line.rstrip('\r\n')
+                    on_malformed(self.line_num, parse_line(text), text)
+                continue
+            yield get(fields)
+
+
+class RecordLines:
+    """Line iterator for csv.reader that keeps the raw lines of the current record.
+
+    A record ends on a line that leaves the quote count even, as in
+    ProjectedReader, so ``text`` is the record the reader last returned.
+    """
+
+    def __init__(self, f):
+        self.f = iter(f)
+        self.lines = []
+        self._open = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = next(self.f)
+        if self._open:
+            self.lines.append(line)
+        else:
+            self.lines = [line]
+        if line.count('"') % 2:
+            self._open = not self._open
+        return line
+
+    @property
+    def text(self):
+        return ''.join(self.lines).rstrip('\r\n')
+
+
+def iter_columns(path, columns, has_header=True, width=None, on_malformed=None, encoding='utf-8-sig'):
+    """Convenience wrapper: yields projected tuples from the CSV at ``path``."""
+    with open_file(path, 'r', encoding=encoding, newline='') as f:
+        yield from ProjectedReader(f, has_header, width, on_malformed).select(columns)
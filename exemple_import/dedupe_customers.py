@@ -0,0 +1,219 @@
+import argparse
+import csv
+import heapq
+import itertools
+import os
+import tempfile
+from datetime import datetime
+
+from compressed_io import open_file
+from csv_reader import RecordLines
+from phone_utils import normalize_thai_phone
+from quarantine import Quarantine, quarantine_path
+
+INPUT_CSV = r'c:\AppServ\www\CRM_ERP_V4\exemple_import\customer_company1 2 7 copy 2.csv'
+OUTPUT_CSV = r'c:\AppServ\www\CRM_ERP_V4\exemple_import\customers_deduped.csv'
+MERGE_MAP_CSV = r'c:\AppServ\www\CRM_ERP_V4\exemple_import\customers_merge_map.csv'
+
+# Column positions in the 44-column customer layout (see convert_csv_to_sql_v4.COLUMNS)
+NUM_COLUMNS = 44
+IDX_CUSTOMER_ID = 0
+IDX_PHONE = 4
+IDX_COMPANY_ID = 8
+IDX_DATE_REGISTERED = 11
+IDX_TOTAL_PURCHASES = 17
+
+# Above this size the input is deduplicated through an external sort
+EXTERNAL_SORT_BYTES = 512 * 1024 * 1024
+CHUNK_ROWS = 200000
+
+
+def sortable_date(val):
+    """Normalizes the export date formats to a sortable 'YYYY-MM-DD HH:MM:SS' string."""
+    val = (val or '').strip()
+    if not val or val.lower() == 'null':
+        return ''
+    for fmt in ('%d/%m/%Y %H:%M', '%d/%m/%Y', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(val.split('.')[0], fmt).strftime('%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            continue
+    return ''
+
+
+def to_float(val):
+    try:
+        return float((val or '').replace(',', '').strip() or 0)
+    except ValueError:
+        return 0.0
+
+
+def to_int(val):
+    val = (val or '').strip()
+    return int(val) if val.isdigit() else 0
+
+
+# Survivor rules: larger rank wins, ties go to the lower customer_id
+SURVIVOR_RULES = {
+    'latest_registered': lambda row: (sortable_date(row[IDX_DATE_REGISTERED]), -to_int(row[IDX_CUSTOMER_ID])),
+    'most_purchases': lambda row: (to_float(row[IDX_TOTAL_PURCHASES]), -to_int(row[IDX_CUSTOMER_ID])),
+    'oldest_id': lambda row: (-to_int(row[IDX_CUSTOMER_ID]),),
+}
+
+
+def dedupe_key(row):
+    """(company_id, normalized phone), or None for rows that cannot be matched."""
+    phone = normalize_thai_phone(row[IDX_PHONE])
+    if not phone:
+        return None
+    return (row[IDX_COMPANY_ID].strip(), phone)
+
+
+def iter_rows(f, quarantine=None):
+    """Yields the non-empty 44-column rows of ``f``; others go to ``quarantine``."""
+    lines = RecordLines(f)
+    reader = csv.reader(lines, quotechar='"', doublequote=True, skipinitialspace=True)
+    for row in reader:
+        if not row:
+            continue
+        if len(row) != NUM_COLUMNS:
+            if quarantine:
+                quarantine.reject(reader.line_num, 'column_count', lines.text,
+                                  f"{len(row)} columns, expected {NUM_COLUMNS}")
+            continue
+        yield row
+
+
+def resolve_group(key, rows, rank, merge_writer):
+    survivor = max(rows, key=rank)
+    for row in rows:
+        if row is not survivor:
+            merge_writer.writerow([key[0], key[1], survivor[IDX_CUSTOMER_ID], row[IDX_CUSTOMER_ID]])
+    return survivor
+
+
+def dedupe_in_memory(input_csv, writer, merge_writer, rank, quarantine=None):
+    """Hash index on (company_id, phone) holding each survivor's rank and row number.
+
+    A second pass over the input writes the survivors and unmatched rows, so
+    memory holds no full rows.
+    """
+    survivors = {}  # key -> (rank, row number, customer_id)
+    merged = {}
+    passthrough = set()
+    with open_file(input_csv, 'r', encoding='utf-8-sig', newline='') as f:
+        for n, row in enumerate(iter_rows(f, quarantine)):
+            key = dedupe_key(row)
+            if key is None:
+                passthrough.add(n)
+                continue
+            entry = (rank(row), n, row[IDX_CUSTOMER_ID])
+            current = survivors.get(key)
+            if current is None:
+                survivors[key] = entry
+            elif entry[0] > current[0]:
+                merged.setdefault(key, []).append(current[2])
+                survivors[key] = entry
+            else:
+                merged.setdefault(key, []).append(entry[2])
+
+    keep = set(passthrough)
+    for key, (_, n, survivor_id) in survivors.items():
+        keep.add(n)
+        for loser_id in merged.get(key, ()):
+            merge_writer.writerow([key[0], key[1], survivor_id, loser_id])
+    with open_file(input_csv, 'r', encoding='utf-8-sig', newline='') as f:
+        for n, row in enumerate(iter_rows(f)):
+            if n in keep:
+                writer.writerow(row)
+    return len(keep), sum(len(v) for v in merged.values())
+
+
+def _spill(chunk, tmp_dir):
+    chunk.sort(key=lambda item: item[0])
+    fd, path = tempfile.mkstemp(suffix='.csv', dir=tmp_dir)
+    with os.fdopen(fd, 'w', encoding='utf-8', newline='') as f:
+        w = csv.writer(f)
+        for (company, phone), row in chunk:
+            w.writerow([company, phone] + row)
+    return path
+
+
+def _iter_run(path):
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        for rec in csv.reader(f):
+            yield (rec[0], rec[1]), rec[2:]
+
+
+def dedupe_external(rows, writer, merge_writer, rank, chunk_rows=CHUNK_ROWS, tmp_dir=None):
+    """External sort by key in bounded-size runs, then a k-way merge grouping equal keys."""
+    runs = []
+    chunk = []
+    passthrough = 0
+    try:
+        for row in rows:
+            key = dedupe_key(row)
+            if key is None:
+                writer.writerow(row)
+                passthrough += 1
+                continue
+            chunk.append((key, row))
+            if len(chunk) >= chunk_rows:
+                runs.append(_spill(chunk, tmp_dir))
+                chunk = []
+        if chunk:
+            runs.append(_spill(chunk, tmp_dir))
+        print(f"Sorted {len(runs)} runs, merging...")
+
+        kept = merged = 0
+        merged_stream = heapq.merge(*(_iter_run(p) for p in runs), key=lambda item: item[0])
+        for key, group in itertools.groupby(merged_stream, key=lambda item: item[0]):
+            rows = [row for _, row in group]
+            writer.writerow(resolve_group(key, rows, rank, merge_writer))
+            kept += 1
+            merged += len(rows) - 1
+        return kept + passthrough, merged
+    finally:
+        for path in runs:
+            os.remove(path)
+
+
+def dedupe(input_csv=INPUT_CSV, output_csv=OUTPUT_CSV, merge_map_csv=MERGE_MAP_CSV,
+           survivor='latest_registered', external=None):
+    if not os.path.exists(input_csv):
+        print(f"Error: {input_csv} not found")
+        return
+    if external is None:
+        external = os.path.getsize(input_csv) > EXTERNAL_SORT_BYTES
+    rank = SURVIVOR_RULES[survivor]
+
+    quarantine = Quarantine(quarantine_path(output_csv), 'dedupe_customers')
+    with open_file(output_csv, 'w', encoding='utf-8', newline='') as out, \
+         open_file(merge_map_csv, 'w', encoding='utf-8', newline='') as merge_out:
+        writer = csv.writer(out)
+        merge_writer = csv.writer(merge_out)
+        merge_writer.writerow(['company_id', 'phone', 'survivor_customer_id', 'merged_customer_id'])
+
+        print(f"Deduplicating {input_csv} ({'external sort' if external else 'in memory'}, survivor: {survivor})...")
+        if external:
+            with open_file(input_csv, 'r', encoding='utf-8-sig', newline='') as f:
+                kept, merged = dedupe_external(iter_rows(f, quarantine), writer, merge_writer, rank)
+        else:
+            kept, merged = dedupe_in_memory(input_csv, writer, merge_writer, rank, quarantine)
+    quarantine.close()
+
+    print(f"Done. Kept {kept} customers, merged {merged} duplicates.")
+    print(f"Deduplicated rows: {output_csv}")
+    print(f"Merge map: {merge_map_csv}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Deduplicate customers on (company_id, normalized phone).")
+    parser.add_argument('--input', default=INPUT_CSV)
+    parser.add_argument('--output', default=OUTPUT_CSV)
+    parser.add_argument('--merge-map', default=MERGE_MAP_CSV)
+    parser.add_argument('--survivor', choices=sorted(SURVIVOR_RULES), default='latest_registered')
+    parser.add_argument('--external', action='store_true', default=None,
+                        help="Force the external-sort path (automatic above 512 MB)")
+    args = parser.parse_args()
+    dedupe(args.input, args.output, args.merge_map, args.survivor, args.external)
@@ -0,0 +1,122 @@
+import argparse
+import os
+
+from compressed_io import open_file
+from convert_csv_to_sql_v4 import escape_sql
+from csv_reader import iter_columns
+
+# Defaults match the validate_addresses.py input/output pair
+SOURCE_CSV = r'c:\AppServ\www\CRM_ERP_V4\exemple_import\customers_ready_updated.csv'
+VALIDATED_CSV = r'c:\AppServ\www\CRM_ERP_V4\exemple_import\customers_ready_validated.csv'
+OUTPUT_SQL = r'c:\AppServ\www\CRM_ERP_V4\exemple_import\customers_address_updates.sql'
+
+KEY_COLUMN = 'customer_id'
+ADDRESS_COLUMNS = ['subdistrict', 'district', 'province', 'postal_code']
+
+
+def load_source_addresses(path, key_column, address_columns):
+    """Reads only the key and address fields of the source CSV."""
+    source = {}
+    for key, *values in iter_columns(path, [key_column] + address_columns):
+        key = key.strip()
+        if key:
+            source[key] = tuple(v.strip() for v in values)
+    return source
+
+
+def iter_changed_rows(source, validated_path, key_column, address_columns):
+    """Yields (key, new_values) for validated rows whose address differs from the source."""
+    for key, *values in iter_columns(validated_path, [key_column] + address_columns):
+        key = key.strip()
+        if not key.isdigit():
+            continue
+        new_values = tuple(v.strip() for v in values)
+        if source.get(key) != new_values:
+            yield key, new_values
+
+
+def join_update(batch, address_columns):
+    # Derived table of UNION ALL SELECTs works on every MariaDB/MySQL version,
+    # unlike named-column VALUES constructors.
+    selects = []
+    for i, (key, values) in enumerate(batch):
+        if i == 0:
+            cols = ", ".join(f"{escape_sql(v)} AS `{c}`" for c, v in zip(address_columns, values))
+            selects.append(f"SELECT {key} AS `{KEY_COLUMN}`, {cols}")
+        else:
+            cols = ", ".join(escape_sql(v) for v in values)
+            selects.append(f"SELECT {key}, {cols}")
+    derived = "\n  UNION ALL ".join(selects)
+    assignments = ", ".join(f"c.`{col}` = v.`{col}`" for col in address_columns)
+    return (f"UPDATE `customers` c JOIN (\n  {derived}\n) v ON v.`{KEY_COLUMN}` = c.`{KEY_COLUMN}`\n"
+            f"SET {assignments};\n\n")
+
+
+def case_update(batch, address_columns):
+    assignments = []
+    for idx, col in enumerate(address_columns):
+        whens = " ".join(f"WHEN {key} THEN {escape_sql(values[idx])}" for key, values in batch)
+        assignments.append(f"`{col}` = CASE `{KEY_COLUMN}` {whens} ELSE `{col}` END")
+    keys = ", ".join(key for key, _ in batch)
+    return (f"UPDATE `customers` SET\n  " + ",\n  ".join(assignments) +
+            f"\nWHERE `{KEY_COLUMN}` IN ({keys});\n\n")
+
+
+def temp_table_insert(batch, address_columns):
+    values = ",\n".join(f"({key}, {', '.join(escape_sql(v) for v in vals)})" for key, vals in batch)
+    cols = "`, `".join([KEY_COLUMN] + address_columns)
+    return f"INSERT INTO `tmp_address_fixes` (`{cols}`) VALUES\n{values};\n\n"
+
+
+def generate_updates(source_csv=SOURCE_CSV, validated_csv=VALIDATED_CSV, output_sql=OUTPUT_SQL,
+                     mode='join', batch_size=1000):
+    for path in (source_csv, validated_csv):
+        if not os.path.exists(path):
+            print(f"Error: {path} not found")
+            return
+
+    print(f"Reading source addresses from {source_csv}...")
+    source = load_source_addresses(source_csv, KEY_COLUMN, ADDRESS_COLUMNS)
+    print(f"Loaded {len(source)} source rows.")
+
+    count = 0
+    with open_file(output_sql, 'w', encoding='utf-8') as out:
+        out.write("SET time_zone = \"+00:00\";\n")
+        if mode == 'temp':
+            col_defs = ", ".join(f"`{c}` VARCHAR(128) NULL" for c in ADDRESS_COLUMNS)
+            out.write(f"CREATE TEMPORARY TABLE `tmp_address_fixes` (`{KEY_COLUMN}` INT NOT NULL PRIMARY KEY, "
+                      f"{col_defs}) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;\n\n")
+        out.write("START TRANSACTION;\n\n")
+
+        emit = {'join': join_update, 'case': case_update, 'temp': temp_table_insert}[mode]
+        batch = []
+        for key, values in iter_changed_rows(source, validated_csv, KEY_COLUMN, ADDRESS_COLUMNS):
+            batch.append((key, values))
+            count += 1
+            if len(batch) >= batch_size:
+                out.write(emit(batch, ADDRESS_COLUMNS))
+                batch = []
+        if batch:
+            out.write(emit(batch, ADDRESS_COLUMNS))
+
+        if mode == 'temp':
+            assignments = ", ".join(f"c.`{col}` = t.`{col}`" for col in ADDRESS_COLUMNS)
+            out.write(f"UPDATE `customers` c JOIN `tmp_address_fixes` t ON t.`{KEY_COLUMN}` = c.`{KEY_COLUMN}`\n"
+                      f"SET {assignments};\n\n")
+        out.write("COMMIT;\n")
+        if mode == 'temp':
+            out.write("DROP TEMPORARY TABLE `tmp_address_fixes`;\n")
+
+    print(f"Done. {count} changed addresses written to {output_sql} ({mode} mode).")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Emit batched UPDATEs for addresses changed by validate_addresses.py.")
+    parser.add_argument('--source', default=SOURCE_CSV, help="CSV before validation")
+    parser.add_argument('--validated', default=VALIDATED_CSV, help="CSV written by validate_addresses.py")
+    parser.add_argument('--output', default=OUTPUT_SQL)
+    parser.add_argument('--mode', choices=['join', 'case', 'temp'], default='join',
+                        help="join: UPDATE..JOIN derived table, case: CASE-keyed UPDATE, temp: temp table + one join update")
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+    generate_updates(args.source, args.validated, args.output, args.mode, args.batch_size)
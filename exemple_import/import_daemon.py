@@ -0,0 +1,304 @@
+import argparse
+import csv
+import hashlib
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from compressed_io import open_file, split_ext
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS_DIR = os.path.join(HERE, '..', 'scripts')
+
+INBOX_DIR = os.path.join(HERE, 'inbox')
+OUTPUT_DIR = os.path.join(HERE, 'inbox_output')
+LEDGER_FILE = 'ledger.tsv'
+# Gazetteer (address_* tables) for sales uploads
+MASTER_DUMP = os.path.join(HERE, 'primacom_mini_erp.sql')
+# Dump with products, customers, users and orders; sales uploads are refused without one
+REFERENCE_DUMP = None
+COMPANY_ID = 1
+ADDRESS_CACHE = os.path.join(HERE, 'address_cache.sqlite')
+POLL_SECONDS = 2.0
+WORKERS = 2
+
+# Partially copied/uploaded files are left alone until renamed
+TEMP_SUFFIXES = ('.tmp', '.part', '.crdownload', '.filepart')
+
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def detect_kind(path):
+    """Identifies an export by its first row; None if unknown."""
+    try:
+        with open_file(path, 'r', encoding='utf-8-sig', newline='') as f:
+            first = next(csv.reader(f), None)
+    except (UnicodeDecodeError, csv.Error):
+        return None
+    if not first:
+        return None
+    header = [h.strip() for h in first]
+    if 'วันที่ขาย' in header and 'รหัสสินค้า' in header:
+        return 'sales_template'
+    if 'เลขคำสั่งซื้อ' in header and 'วันที่สั่งซื้อ' in header:
+        return 'orders_export'
+    # Headerless exports: recognized by width and a numeric id in front
+    if len(first) == 44 and header[0].isdigit():
+        return 'customer_export'
+    if len(first) == 17 and header[0].isdigit() and header[12].lower() in ('active', 'inactive', 'suspended'):
+        return 'user_export'
+    return None
+
+
+class Ledger:
+    """Append-only record of processed files keyed by content hash."""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    digest, kind, status, name, processed_at, outputs = line.rstrip('\n').split('\t')
+                    if status == 'done':
+                        self.done[digest] = name
+
+    def record(self, digest, kind, status, name, outputs=()):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(f"{digest}\t{kind}\t{status}\t{name}\t{datetime.now():%Y-%m-%d %H:%M:%S}\t{';'.join(outputs)}\n")
+        if status == 'done':
+            self.done[digest] = name
+
+
+# --- Pipelines (run in worker processes) ---------------------------------
+
+def run_customer_export(path, out_base):
+    from convert_csv_to_sql_v4 import convert
+    output = out_base + '.sql'
+    convert(source=path, output=output)
+    return [output]
+
+
+def run_orders_export(path, out_base):
+    from order_aggregates import build_aggregates
+    from quarantine import Quarantine, quarantine_path
+    output = out_base + '.aggregates.csv'
+    quarantine = Quarantine(quarantine_path(output), 'order_aggregates')
+    build_aggregates([path], quarantine).write_csv(output)
+    quarantine.close()
+    return [output]
+
+
+def run_user_export(path, out_base):
+    from fix_import_csv import fix_csv
+    output = out_base + '.fixed.csv'
+    fix_csv(path, output)
+    return [output]
+
+
+# Gazetteer and reference indexes of the sales worker, loaded once by warm_sales
+_SALES = {}
+
+
+def run_sales_template(path, out_base):
+    from import_sales_template import import_sales
+    output = out_base + '.sql'
+    import_sales([path], output, sql_file=_SALES['master_dump'], company_id=_SALES['reference'].company_id,
+                 cache_path=ADDRESS_CACHE, master_data=_SALES['master_data'], reference=_SALES['reference'])
+    return [output]
+
+
+PIPELINES = {
+    'customer_export': run_customer_export,
+    'orders_export': run_orders_export,
+    'user_export': run_user_export,
+    'sales_template': run_sales_template,
+}
+
+
+def warm_up():
+    """Worker initializer: import the pipelines once so every job starts warm."""
+    sys.path.insert(0, HERE)
+    sys.path.insert(1, SCRIPTS_DIR)
+    import convert_csv_to_sql_v4  # noqa: F401
+    import fix_import_csv  # noqa: F401
+    import import_sales_template  # noqa: F401
+    import order_aggregates  # noqa: F401
+
+
+def warm_sales(master_dump, reference_dump, company_id):
+    """Initializer of the sales worker: gazetteer and reference indexes stay resident for every job.
+
+    There is a single sales worker so customer ids and order ids assigned by
+    one job are known to the next.
+    """
+    warm_up()
+    from import_sales_template import load_reference
+    from validate_addresses import load_master_data
+    _SALES['master_dump'] = master_dump
+    _SALES['master_data'] = load_master_data(master_dump)
+    _SALES['reference'] = load_reference(reference_dump, company_id)
+
+
+def sales_ready():
+    reference = _SALES['reference']
+    return (f"{len(_SALES['master_data'])} subdistricts, {len(reference.products)} products, "
+            f"{len(reference.customers)} customers, {len(reference.users)} user codes, "
+            f"{len(reference.order_ids)} orders")
+
+
+def run_job(kind, path, out_base):
+    started = time.time()
+    outputs = PIPELINES[kind](path, out_base)
+    # Pipelines that bail out early (e.g. input vanished) print and return without writing
+    missing = [o for o in outputs if not os.path.exists(o)]
+    if missing:
+        raise RuntimeError(f"no output written: {', '.join(os.path.basename(o) for o in missing)}")
+    return outputs, time.time() - started
+
+
+# --- Daemon ----------------------------------------------------------------
+
+class ImportDaemon:
+    def __init__(self, inbox=INBOX_DIR, output_dir=OUTPUT_DIR, workers=WORKERS, poll_seconds=POLL_SECONDS,
+                 master_dump=MASTER_DUMP, reference_dump=REFERENCE_DUMP, company_id=COMPANY_ID):
+        self.inbox = inbox
+        self.output_dir = output_dir
+        self.poll_seconds = poll_seconds
+        for sub in ('processed', 'failed', 'unrecognized'):
+            os.makedirs(os.path.join(inbox, sub), exist_ok=True)
+        os.makedirs(output_dir, exist_ok=True)
+        self.ledger = Ledger(os.path.join(inbox, LEDGER_FILE))
+        self.pool = ProcessPoolExecutor(max_workers=workers, initializer=warm_up)
+        self.sales_pool = None
+        if reference_dump:
+            print(f"Loading sales reference data from {reference_dump}...")
+            self.sales_pool = ProcessPoolExecutor(max_workers=1, initializer=warm_sales,
+                                                  initargs=(master_dump, reference_dump, company_id))
+            print(f"  {self.sales_pool.submit(sales_ready).result()}")
+        self.sizes = {}     # name -> (size, mtime) at the previous poll
+        self.running = {}   # future -> (name, digest, kind)
+        self.waiting = set()  # duplicates of a running job, left in the inbox until it finishes
+
+    def stable_files(self):
+        """Files whose size and mtime did not change since the previous poll."""
+        current = {}
+        for entry in os.scandir(self.inbox):
+            if not entry.is_file() or entry.name == LEDGER_FILE or entry.name.startswith('.'):
+                continue
+            if entry.name.lower().endswith(TEMP_SUFFIXES):
+                continue
+            st = entry.stat()
+            current[entry.name] = (st.st_size, st.st_mtime)
+        busy = {name for name, _, _ in self.running.values()}
+        ready = [name for name, sig in current.items() if self.sizes.get(name) == sig and name not in busy]
+        self.sizes = current
+        return sorted(ready)
+
+    def move(self, name, sub):
+        target = os.path.join(self.inbox, sub, name)
+        if os.path.exists(target):
+            root, ext = split_ext(name)
+            target = os.path.join(self.inbox, sub, f"{root}.{int(time.time())}{ext}")
+        shutil.move(os.path.join(self.inbox, name), target)
+
+    def dispatch(self, name):
+        path = os.path.join(self.inbox, name)
+        digest = file_hash(path)
+        if digest in self.ledger.done:
+            print(f"[skip] {name}: same content as {self.ledger.done[digest]}")
+            self.waiting.discard(name)
+            self.move(name, 'processed')
+            return
+        in_flight = next((n for n, d, _ in self.running.values() if d == digest), None)
+        if in_flight:
+            # Left in the inbox: skipped once the original is done, imported if it fails
+            if name not in self.waiting:
+                print(f"[wait] {name}: same content as {in_flight} (in progress)")
+                self.waiting.add(name)
+            return
+        self.waiting.discard(name)
+        kind = detect_kind(path)
+        if kind not in PIPELINES:
+            print(f"[unrecognized] {name}" + (f": no pipeline for {kind}" if kind else ""))
+            self.move(name, 'unrecognized')
+            return
+        pool = self.pool
+        if kind == 'sales_template':
+            if self.sales_pool is None:
+                print(f"[failed] {name}: sales uploads need --reference (dump with products, customers, users, orders)")
+                self.ledger.record(digest, kind, 'failed', name)
+                self.move(name, 'failed')
+                return
+            pool = self.sales_pool
+        out_base = os.path.join(self.output_dir, f"{split_ext(name)[0]}.{digest[:8]}")
+        print(f"[start] {name} ({kind})")
+        self.running[pool.submit(run_job, kind, path, out_base)] = (name, digest, kind)
+
+    def collect(self):
+        for future in [f for f in self.running if f.done()]:
+            name, digest, kind = self.running.pop(future)
+            try:
+                outputs, seconds = future.result()
+            except Exception as e:
+                print(f"[failed] {name}: {e}")
+                self.ledger.record(digest, kind, 'failed', name)
+                self.move(name, 'failed')
+                continue
+            print(f"[done] {name} in {seconds:.1f}s -> {', '.join(os.path.basename(o) for o in outputs)}")
+            self.ledger.record(digest, kind, 'done', name, outputs)
+            self.move(name, 'processed')
+
+    def poll(self):
+        self.collect()
+        for name in self.stable_files():
+            self.dispatch(name)
+
+    def run(self, once=False):
+        print(f"Watching {self.inbox} every {self.poll_seconds}s (outputs in {self.output_dir})")
+        try:
+            if once:
+                # Two polls make every file present now count as stable
+                self.stable_files()
+                self.poll()
+                while self.running:
+                    time.sleep(0.2)
+                    self.collect()
+                    for name in sorted(self.waiting):
+                        self.dispatch(name)
+                return
+            while True:
+                self.poll()
+                time.sleep(self.poll_seconds)
+        except KeyboardInterrupt:
+            print("Stopping, waiting for running jobs...")
+        finally:
+            self.pool.shutdown(wait=True)
+            if self.sales_pool:
+                self.sales_pool.shutdown(wait=True)
+            self.collect()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Watch an inbox folder and import dropped exports.")
+    parser.add_argument('--inbox', default=INBOX_DIR)
+    parser.add_argument('--output', default=OUTPUT_DIR)
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    parser.add_argument('--interval', type=float, default=POLL_SECONDS, help="Seconds between polls")
+    parser.add_argument('--once', action='store_true', help="Process what is in the inbox now and exit (cron)")
+    parser.add_argument('--master', default=MASTER_DUMP, help="Dump with the address_* tables")
+    parser.add_argument('--reference', default=REFERENCE_DUMP,
+                        help="Dump with products, customers, users and orders (enables sales_template uploads)")
+    parser.add_argument('--company-id', type=int, default=COMPANY_ID)
+    args = parser.parse_args()
+    ImportDaemon(args.inbox, args.output, args.workers, args.interval, args.master, args.reference,
+                 args.company_id).run(args.once)
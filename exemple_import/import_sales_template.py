@@ -0,0 +1,509 @@
+import argparse
+import os
+from datetime import datetime, timedelta
+
+from address_cache import open_cache
+from compressed_io import open_file
+from convert_csv_to_sql_v4 import SqlShard, escape_sql
+from csv_reader import ProjectedReader
+from order_aggregates import parse_amount, parse_order_date
+from phone_utils import normalize_thai_phone
+from postal_resolution import classify_postal_codes
+from quarantine import Quarantine, quarantine_path
+from sql_dump import iter_insert_rows, iter_table_dicts
+from thai_text import canonical_thai
+from validate_addresses import MATCHER_VERSION, cached_match, find_best_match, load_master_data
+
+INPUT_CSV = r'c:\AppServ\www\CRM_ERP_V4\exemple_import\sales_template (2).csv'
+OUTPUT_SQL = r'c:\AppServ\www\CRM_ERP_V4\exemple_import\sales_import.sql'
+SQL_FILE = r'c:\AppServ\www\CRM_ERP_V4\exemple_import\primacom_mini_erp.sql'
+CACHE_FILE = r'c:\AppServ\www\CRM_ERP_V4\exemple_import\address_cache.sqlite'
+
+COMPANY_ID = 1
+BATCH_SIZE = 500
+OWNERSHIP_DAYS = 90
+
+# sales_template columns (same order as the upload template, located by header)
+COL_SALE_DATE = 'วันที่ขาย'
+COL_DELIVERY_DATE = 'วันที่จัดส่ง'
+COL_FIRST_NAME = 'ชื่อลูกค้า'
+COL_LAST_NAME = 'นามสกุลลูกค้า'
+COL_PHONE = 'เบอร์โทรลูกค้า'
+COL_EMAIL = 'อีเมลลูกค้า'
+COL_SUBDISTRICT = 'แขวง/ตำบลจัดส่ง'
+COL_DISTRICT = 'เขต/อำเภอจัดส่ง'
+COL_PROVINCE = 'จังหวัดจัดส่ง'
+COL_POSTAL_CODE = 'รหัสไปรษณีย์จัดส่ง'
+COL_STREET = 'ที่อยู่จัดส่ง'
+COL_SKU = 'รหัสสินค้า'
+COL_PRODUCT_NAME = 'ชื่อสินค้า'
+COL_QUANTITY = 'จำนวน'
+COL_UNIT_PRICE = 'ราคาต่อหน่วย'
+COL_DISCOUNT = 'ส่วนลด'
+COL_LINE_TOTAL = 'ยอดรวมรายการ'
+COL_SALESPERSON = 'รหัสพนักงานขาย'
+COL_CARETAKER = 'รหัสผู้ดูแล'
+COL_PAYMENT = 'วิธีชำระเงิน'
+COL_NOTES = 'หมายเหตุคำสั่งซื้อ'
+
+TEMPLATE_COLUMNS = [
+    COL_SALE_DATE, COL_DELIVERY_DATE, COL_FIRST_NAME, COL_LAST_NAME, COL_PHONE, COL_EMAIL,
+    COL_SUBDISTRICT, COL_DISTRICT, COL_PROVINCE, COL_POSTAL_CODE, COL_STREET,
+    COL_SKU, COL_PRODUCT_NAME, COL_QUANTITY, COL_UNIT_PRICE, COL_DISCOUNT, COL_LINE_TOTAL,
+    COL_SALESPERSON, COL_CARETAKER, COL_PAYMENT, COL_NOTES,
+]
+(I_SALE_DATE, I_DELIVERY_DATE, I_FIRST_NAME, I_LAST_NAME, I_PHONE, I_EMAIL,
+ I_SUBDISTRICT, I_DISTRICT, I_PROVINCE, I_POSTAL_CODE, I_STREET,
+ I_SKU, I_PRODUCT_NAME, I_QUANTITY, I_UNIT_PRICE, I_DISCOUNT, I_LINE_TOTAL,
+ I_SALESPERSON, I_CARETAKER, I_PAYMENT, I_NOTES) = range(len(TEMPLATE_COLUMNS))
+
+# Same mapping as api/import/sales.php normalize_payment_method
+PAYMENT_METHODS = {
+    'cod': 'COD', 'c.o.d': 'COD', 'cash_on_delivery': 'COD', 'เก็บเงินปลายทาง': 'COD',
+    'transfer': 'Transfer', 'bank_transfer': 'Transfer', 'โอน': 'Transfer', 'โอนเงิน': 'Transfer',
+}
+
+# Only telesales can own customers (api/import/sales.php)
+CARETAKER_ROLES = {'Telesale', 'Supervisor Telesale'}
+
+CUSTOMER_INSERT = (
+    "INSERT INTO `customers` (`customer_id`, `customer_ref_id`, `first_name`, `last_name`, `phone`, `email`, "
+    "`street`, `subdistrict`, `district`, `province`, `postal_code`, `company_id`, `assigned_to`, "
+    "`date_assigned`, `date_registered`, `ownership_expires`, `lifecycle_status`, `behavioral_status`, "
+    "`grade`, `total_purchases`) VALUES\n"
+)
+ORDER_INSERT = (
+    "INSERT INTO `orders` (`id`, `customer_id`, `company_id`, `creator_id`, `order_date`, `delivery_date`, "
+    "`recipient_first_name`, `recipient_last_name`, `street`, `subdistrict`, `district`, `province`, "
+    "`postal_code`, `total_amount`, `payment_method`, `payment_status`, `order_status`, `shipping_cost`, "
+    "`customer_type`, `notes`) VALUES\n"
+)
+ITEM_INSERT = (
+    "INSERT INTO `order_items` (`order_id`, `parent_order_id`, `creator_id`, `product_id`, `product_name`, "
+    "`quantity`, `price_per_unit`, `discount`, `net_total`, `box_number`) VALUES\n"
+)
+BOX_INSERT = (
+    "INSERT INTO `order_boxes` (`order_id`, `sub_order_id`, `box_number`, `cod_amount`, `collection_amount`, "
+    "`collected_amount`) VALUES\n"
+)
+# Existing customers are reassigned only when the caretaker changes (api/import/sales.php)
+CUSTOMER_ASSIGN = (
+    "UPDATE `customers` SET `assigned_to` = {caretaker_id}, `date_assigned` = {now}, `ownership_expires` = {expires} "
+    "WHERE `customer_id` = {customer_id} AND NOT (`assigned_to` <=> {caretaker_id});\n"
+)
+# Ref id collisions retry CUS1-, CUS2-, ... like the PHP upload
+REF_ID_RETRIES = 20
+
+
+def clean(val):
+    val = (val or '').strip()
+    return '' if val.lower() == 'null' else val
+
+
+def base_sku(sku):
+    """Template SKUs may carry a variant suffix (PROD001-2); products are keyed by the base SKU."""
+    head, sep, tail = sku.rpartition('-')
+    return head if sep and tail.isdigit() else sku
+
+
+class ReferenceData:
+    """Products, customers, users and order ids of one company, indexed from dump rows.
+
+    ``load_reference`` fills every index in a single pass over one dump; the
+    ``load_*`` helpers below read one table each from separate dumps. The
+    indexes stay valid across imports: an importer adds the customers and
+    orders it writes, so a long-running caller (import_daemon) can keep one
+    instance for all its jobs.
+    """
+
+    TABLES = ('products', 'customers', 'users', 'orders')
+
+    def __init__(self, company_id):
+        self.company_id = str(company_id)
+        self.products = {}        # lowercase SKU -> (product id, name)
+        self.customers = {}       # normalized phone -> customer_id
+        self.customer_ref_ids = set()
+        self.max_customer_id = 0  # highest customer_id seen or assigned
+        self.users = {}           # username / id as text -> (user id, role)
+        self.order_ids = set()
+        self.order_seq = {}       # sale date -> last generated order sequence
+        self.tables = set()
+
+    def add(self, table, row):
+        self.tables.add(table)
+        same_company = str(row.get('company_id')) == self.company_id
+        if table == 'products':
+            if row.get('deleted_at') or not same_company or not row.get('sku'):
+                return
+            self.products[row['sku'].strip().lower()] = (int(row['id']), row.get('name'))
+        elif table == 'customers':
+            customer_id = int(row['customer_id'])
+            self.max_customer_id = max(self.max_customer_id, customer_id)
+            self.customer_ref_ids.add(row.get('customer_ref_id'))
+            if not same_company:
+                return
+            phone = normalize_thai_phone(row.get('phone'))
+            if phone:
+                self.customers.setdefault(phone, customer_id)
+        elif table == 'users':
+            if not same_company:
+                return
+            entry = (int(row['id']), row.get('role') or '')
+            self.users[str(row['id'])] = entry
+            if row.get('username'):
+                self.users[row['username']] = entry
+        elif table == 'orders':
+            if same_company:
+                self.order_ids.add(row['id'])
+
+
+def load_reference(dump_path, company_id):
+    """ReferenceData for every table of ``dump_path`` in one pass."""
+    reference = ReferenceData(company_id)
+    for table, columns, row in iter_insert_rows(dump_path, ReferenceData.TABLES):
+        if not columns:
+            raise ValueError(f"{dump_path}: INSERT INTO `{table}` has no column list; export with complete inserts")
+        reference.add(table, dict(zip(columns, row)))
+    missing = [t for t in ReferenceData.TABLES if t not in reference.tables]
+    if missing:
+        raise ValueError(f"{dump_path} has no rows for: {', '.join(missing)}")
+    return reference
+
+
+def _load_table(dump_path, company_id, table):
+    reference = ReferenceData(company_id)
+    for row in iter_table_dicts(dump_path, table):
+        reference.add(table, row)
+    return reference
+
+
+def load_products(dump_path, company_id):
+    """Lowercase SKU -> (product id, name) for the company's live products."""
+    return _load_table(dump_path, company_id, 'products').products
+
+
+def load_customers(dump_path, company_id):
+    """(normalized phone -> customer_id, used customer_ref_ids, highest customer_id in the dump)."""
+    reference = _load_table(dump_path, company_id, 'customers')
+    return reference.customers, reference.customer_ref_ids, reference.max_customer_id
+
+
+def load_users(dump_path, company_id):
+    """Username and id (as text) -> (user id, role) for the company's users."""
+    return _load_table(dump_path, company_id, 'users').users
+
+
+def load_order_ids(dump_path, company_id):
+    return _load_table(dump_path, company_id, 'orders').order_ids
+
+
+def sql_number(val):
+    return f"{val:.2f}"
+
+
+class SalesTemplateImporter:
+    """Streams sales_template rows into batched customers/orders/order_items/order_boxes inserts.
+
+    Consecutive rows with the same phone and sale date form one order, as in
+    the PHP upload. Products, customers and users are looked up in indexes
+    built once from SQL dumps; customers missing from the index are created
+    with ids continuing after the highest dumped ``customer_id``.
+    """
+
+    def __init__(self, out, company_id, master_data, products, customers, users=None,
+                 existing_orders=(), next_customer_id=1, customer_ref_ids=(), cache=None,
+                 quarantine=None, batch_size=BATCH_SIZE, order_seq=None):
+        self.out = out
+        self.company_id = company_id
+        self.master_data = master_data
+        self.resolution = classify_postal_codes(master_data)
+        self.products = products
+        self.customers = customers
+        self.users = users
+        self.existing_orders = set(existing_orders)
+        # Sale date -> last order sequence used, shared by every file of the run
+        self.order_seq = order_seq if order_seq is not None else {}
+        self.next_customer_id = next_customer_id
+        self.customer_ref_ids = set(customer_ref_ids)
+        # customer_id -> caretaker of its latest order, applied to existing customers by finish()
+        self.assignments = {}
+        self.cache = cache
+        self.quarantine = quarantine
+        self.batch_size = batch_size
+        self.now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        self.expires = (datetime.now() + timedelta(days=OWNERSHIP_DAYS)).strftime('%Y-%m-%d %H:%M:%S')
+        self.counts = {'orders': 0, 'items': 0, 'customers_created': 0, 'customers_matched': 0,
+                       'customers_assigned': 0, 'orders_skipped': 0, 'addresses_unmatched': 0}
+
+    def _reject(self, line_num, reason, row, detail=''):
+        if self.quarantine:
+            self.quarantine.reject(line_num, reason, row, detail)
+
+    def _flag(self, line_num, reason, row, detail=''):
+        if self.quarantine:
+            self.quarantine.flag(line_num, reason, row, detail)
+
+    def resolve_user(self, code):
+        """User id for a salesperson/caretaker code, or (None, '') when unknown."""
+        if self.users is None:
+            # Without a users dump only numeric ids can be trusted
+            return (int(code), '') if code.isdigit() else (None, '')
+        return self.users.get(code, (None, ''))
+
+    def resolve_caretaker(self, code):
+        """User id of a caretaker code, or None unless the user is a telesale."""
+        caretaker_id, role = self.resolve_user(code)
+        if caretaker_id is not None and self.users is not None and role not in CARETAKER_ROLES:
+            return None
+        return caretaker_id
+
+    def new_ref_id(self, phone, customer_id):
+        """customer_ref_id as the PHP upload generates it: CUS-<phone>-<company>, then CUS1-, CUS2-, ..."""
+        ref_id = f"CUS-{phone}-{self.company_id}"
+        suffix = 1
+        while ref_id in self.customer_ref_ids:
+            if suffix > REF_ID_RETRIES:
+                # The PHP appends time(); the new customer_id is just as unique and reproducible
+                ref_id = f"CUS-{phone}-{self.company_id}-{customer_id}"
+                break
+            ref_id = f"CUS{suffix}-{phone}-{self.company_id}"
+            suffix += 1
+        self.customer_ref_ids.add(ref_id)
+        return ref_id
+
+    def resolve_address(self, row):
+        address = {'street': row[I_STREET], 'subdistrict': row[I_SUBDISTRICT], 'district': row[I_DISTRICT],
+                   'province': row[I_PROVINCE], 'postal_code': row[I_POSTAL_CODE]}
+        if self.cache:
+            return cached_match(address, self.master_data, self.cache, self.resolution)
+        return find_best_match(address, self.master_data, self.resolution)
+
+    def add_order(self, order_id, lines):
+        """``lines`` are (line_num, row) of one order; the first row carries customer and shipping data."""
+        line_num, first = lines[0]
+        if order_id in self.existing_orders:
+            self.counts['orders_skipped'] += 1
+            self._reject(line_num, 'order_exists', first, order_id)
+            return
+        phone = normalize_thai_phone(first[I_PHONE])
+        creator_id, _ = self.resolve_user(clean(first[I_SALESPERSON]))
+        if creator_id is None:
+            self.counts['orders_skipped'] += 1
+            for n, row in lines:
+                self._reject(n, 'unknown_salesperson', row, first[I_SALESPERSON])
+            return
+        order_date = parse_order_date(first[I_SALE_DATE])
+        if not order_date:
+            self.counts['orders_skipped'] += 1
+            for n, row in lines:
+                self._reject(n, 'bad_sale_date', row, first[I_SALE_DATE])
+            return
+        delivery_date = parse_order_date(first[I_DELIVERY_DATE]) or order_date
+
+        street = clean(first[I_STREET])
+        subdistrict, district = clean(first[I_SUBDISTRICT]), clean(first[I_DISTRICT])
+        province, postal_code = clean(first[I_PROVINCE]), clean(first[I_POSTAL_CODE])
+        match = self.resolve_address(first)
+        if match:
+            subdistrict, district = match['subdistrict'], match['district']
+            province, postal_code = match['province'], match['zip_code']
+        else:
+            self.counts['addresses_unmatched'] += 1
+            self._flag(line_num, 'address_unmatched', first)
+
+        first_name = canonical_thai(clean(first[I_FIRST_NAME])) or 'Customer'
+        last_name = canonical_thai(clean(first[I_LAST_NAME]))
+        caretaker_id = self.resolve_caretaker(clean(first[I_CARETAKER]))
+        customer_id = self.customers.get(phone)
+        if customer_id:
+            self.counts['customers_matched'] += 1
+            if caretaker_id:
+                self.assignments[customer_id] = caretaker_id
+        else:
+            customer_id = self.next_customer_id
+            self.next_customer_id += 1
+            ref_id = self.new_ref_id(phone, customer_id)
+            values = [
+                str(customer_id), escape_sql(ref_id), escape_sql(first_name), escape_sql(last_name) if last_name else "''",
+                escape_sql(phone), escape_sql(clean(first[I_EMAIL])), escape_sql(street),
+                escape_sql(subdistrict), escape_sql(district), escape_sql(province), escape_sql(postal_code),
+                str(self.company_id), str(caretaker_id) if caretaker_id else 'NULL',
+                escape_sql(self.now), escape_sql(self.now), escape_sql(self.expires) if caretaker_id else 'NULL',
+                "'New'", "'Cold'", "'Standard'", '0',
+            ]
+            self.out.add(f"({', '.join(values)})", CUSTOMER_INSERT, self.batch_size)
+            self.customers[phone] = customer_id
+            self.counts['customers_created'] += 1
+
+        sub_order_id = f"{order_id}-1"
+        total = 0.0
+        for n, row in lines:
+            sku = base_sku(clean(row[I_SKU]))
+            product = self.products.get(sku.lower()) if sku else None
+            if sku and product is None:
+                self._flag(n, 'unknown_product', row, sku)
+            name = clean(row[I_PRODUCT_NAME]) or (product[1] if product else None) or sku or 'Item'
+            qty = parse_amount(row[I_QUANTITY]) or 1.0
+            price = parse_amount(row[I_UNIT_PRICE])
+            discount = parse_amount(row[I_DISCOUNT])
+            line_total = parse_amount(row[I_LINE_TOTAL]) or price * qty - discount
+            total += line_total
+            values = [
+                escape_sql(sub_order_id), escape_sql(order_id), str(creator_id),
+                str(product[0]) if product else 'NULL', escape_sql(name),
+                f"{qty:g}", sql_number(price), sql_number(discount), sql_number(line_total), '1',
+            ]
+            self.out.add(f"({', '.join(values)})", ITEM_INSERT, self.batch_size)
+            self.counts['items'] += 1
+
+        payment = PAYMENT_METHODS.get(clean(first[I_PAYMENT]).lower(), 'COD')
+        values = [
+            escape_sql(order_id), str(customer_id), str(self.company_id), str(creator_id),
+            escape_sql(order_date), escape_sql(delivery_date), escape_sql(first_name), escape_sql(last_name),
+            escape_sql(street), escape_sql(subdistrict), escape_sql(district), escape_sql(province),
+            escape_sql(postal_code), sql_number(total), escape_sql(payment), "'Approved'", "'Delivered'",
+            '0', "'New Customer'", escape_sql(clean(first[I_NOTES])),
+        ]
+        self.out.add(f"({', '.join(values)})", ORDER_INSERT, self.batch_size)
+        box = [escape_sql(order_id), escape_sql(sub_order_id), '1'] + [sql_number(total)] * 3
+        self.out.add(f"({', '.join(box)})", BOX_INSERT, self.batch_size)
+        self.existing_orders.add(order_id)
+        self.counts['orders'] += 1
+
+    def finish(self):
+        """Writes the pending batches, then the caretaker reassignments of existing customers."""
+        self.out.flush()
+        for customer_id, caretaker_id in self.assignments.items():
+            self.out.out.write(CUSTOMER_ASSIGN.format(
+                customer_id=customer_id, caretaker_id=caretaker_id,
+                now=escape_sql(self.now), expires=escape_sql(self.expires)))
+            self.counts['customers_assigned'] += 1
+        self.assignments = {}
+
+    def next_order_id(self, sale_date):
+        """Auto order number in the PHP upload's format, <sale date>-<sequence>EXTERNAL.
+
+        The PHP upload numbers orders by row within one file; here the
+        sequence runs per sale date across all files of the import and skips
+        ids already in ``existing_orders`` (the dump plus everything written
+        so far), so uploads for the same day never produce the same id.
+        """
+        day = sale_date[:10].replace('-', '') or datetime.now().strftime('%Y%m%d')
+        seq = self.order_seq.get(day, 0)
+        while True:
+            seq += 1
+            order_id = f"{day}-{seq:06d}EXTERNAL"
+            if order_id not in self.existing_orders:
+                break
+        self.order_seq[day] = seq
+        return order_id
+
+    def add_csv(self, path):
+        """Imports one sales_template CSV; returns the number of data lines read."""
+        with open_file(path, 'r', encoding='utf-8-sig', newline='') as f:
+            reader = ProjectedReader(f)
+            if self.quarantine:
+                self.quarantine.set_header(reader.header_text)
+                reader.on_malformed = lambda line_num, fields, text: self.quarantine.reject(
+                    line_num, 'column_count', text, f"{len(fields)} fields")
+            missing = [c for c in TEMPLATE_COLUMNS if c not in reader.header]
+            if missing:
+                raise ValueError(f"{os.path.basename(path)} is not a sales template, missing: {', '.join(missing)}")
+            lines = 0
+            group_key, order_id, group = None, None, []
+            for row in reader.select(TEMPLATE_COLUMNS):
+                lines += 1
+                phone = normalize_thai_phone(row[I_PHONE])
+                if not phone:
+                    self._reject(reader.line_num, 'missing_phone', row)
+                    continue
+                sale_date = parse_order_date(row[I_SALE_DATE]) or ''
+                key = (phone, sale_date[:10])
+                if key != group_key:
+                    if group:
+                        self.add_order(order_id, group)
+                    group_key, order_id, group = key, self.next_order_id(sale_date), []
+                group.append((reader.line_num, row))
+            if group:
+                self.add_order(order_id, group)
+        return lines
+
+
+def import_sales(sources, output=OUTPUT_SQL, sql_file=SQL_FILE, products_dump=None, customers_dump=None,
+                 users_dump=None, orders_dump=None, company_id=COMPANY_ID, next_customer_id=None,
+                 cache_path=CACHE_FILE, batch_size=BATCH_SIZE, master_data=None, reference=None):
+    """Imports sales_template files into ``output``.
+
+    ``master_data`` and ``reference`` (a ReferenceData) may be passed in
+    already loaded; the dump arguments are then not read, and ``reference``
+    is updated with the customers and orders written.
+    """
+    if master_data is None:
+        print("Loading gazetteer...")
+        master_data = load_master_data(sql_file)
+    if reference is not None:
+        products, customers, users = reference.products, reference.customers, reference.users
+        ref_ids, max_id, existing_orders = reference.customer_ref_ids, reference.max_customer_id, reference.order_ids
+        has_customers = True
+    else:
+        products = load_products(products_dump, company_id) if products_dump else {}
+        customers, ref_ids, max_id = load_customers(customers_dump, company_id) if customers_dump else ({}, set(), 0)
+        users = load_users(users_dump, company_id) if users_dump else None
+        existing_orders = load_order_ids(orders_dump, company_id) if orders_dump else set()
+        has_customers = bool(customers_dump)
+        print(f"Indexed {len(master_data)} subdistricts, {len(products)} products, {len(customers)} customers"
+              + (f", {len(users)} user codes" if users is not None else "")
+              + (f", {len(existing_orders)} existing orders" if orders_dump else ""))
+    if next_customer_id is None:
+        if not has_customers:
+            # Without the customers table new ids would start at 1 and overwrite real customers
+            raise ValueError("import_sales needs --customers or an explicit --next-customer-id")
+        next_customer_id = max_id + 1
+
+    cache = open_cache(cache_path, sql_file, 'sales_template', MATCHER_VERSION)
+    quarantine = Quarantine(quarantine_path(output), 'sales_template')
+    shard = SqlShard(output, None)
+    shard.write_header(scoped=False)
+    importer = SalesTemplateImporter(shard, company_id, master_data, products, customers, users, existing_orders,
+                                     next_customer_id, ref_ids, cache, quarantine, batch_size,
+                                     reference.order_seq if reference is not None else None)
+    try:
+        for path in sources:
+            lines = importer.add_csv(path)
+            print(f"Read {lines} lines from {os.path.basename(path)}")
+        importer.finish()
+    finally:
+        shard.close()
+        if cache:
+            cache.close()
+        quarantine.close()
+        if reference is not None:
+            reference.max_customer_id = max(reference.max_customer_id, importer.next_customer_id - 1)
+            reference.customer_ref_ids.update(importer.customer_ref_ids)
+            reference.order_ids.update(importer.existing_orders)
+    c = importer.counts
+    print(f"Wrote {c['orders']} orders ({c['items']} items) to {output}: "
+          f"{c['customers_created']} new customers, {c['customers_matched']} existing "
+          f"({c['customers_assigned']} reassigned to their caretaker), "
+          f"{c['orders_skipped']} orders skipped, {c['addresses_unmatched']} unmatched addresses.")
+    return c
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert sales_template uploads to batched order inserts.")
+    parser.add_argument('sources', nargs='*', default=[INPUT_CSV], help="sales_template CSV files")
+    parser.add_argument('--output', default=OUTPUT_SQL)
+    parser.add_argument('--master', default=SQL_FILE, help="Dump with the address_* tables")
+    parser.add_argument('--products', help="Dump with the `products` table (SKU lookup)")
+    parser.add_argument('--customers', help="Dump with the `customers` table (phone lookup)")
+    parser.add_argument('--users', help="Dump with the `users` table (salesperson/caretaker codes)")
+    parser.add_argument('--orders', help="Dump with the `orders` table; orders already there are skipped")
+    parser.add_argument('--company-id', type=int, default=COMPANY_ID)
+    parser.add_argument('--next-customer-id', type=int,
+                        help="First customer_id for new customers (default: after the highest in --customers)")
+    parser.add_argument('--cache', default=CACHE_FILE, help="Persistent address cache (SQLite)")
+    parser.add_argument('--no-cache', action='store_true')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+    import_sales(args.sources, args.output, args.master, args.products, args.customers, args.users, args.orders,
+                 args.company_id, args.next_customer_id, None if args.no_cache else args.cache, args.batch_size)
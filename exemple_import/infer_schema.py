@@ -0,0 +1,340 @@
+import argparse
+import csv
+import json
+import os
+import re
+from collections import Counter
+from datetime import datetime
+from difflib import SequenceMatcher
+
+from compressed_io import open_file
+from phone_utils import normalize_thai_phone
+
+PRISMA_SCHEMA = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'prisma', 'schema.prisma')
+SAMPLE_ROWS = 500
+
+# Date formats seen in exports; years above 2400 are Buddhist era
+DATE_FORMATS = ['%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y', '%Y-%m-%d %H:%M:%S', '%Y-%m-%d',
+                '%Y/%m/%d %H:%M:%S', '%m/%d/%Y %H:%M']
+
+RE_INT = re.compile(r'^-?\d+$')
+RE_DECIMAL = re.compile(r'^-?\d+\.\d+$')
+RE_POSTAL = re.compile(r'^[1-9]\d{4}$')
+RE_EMAIL = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+RE_THAI_NAME = re.compile(r'^[฀-๿.]+(?: [฀-๿.]+){0,2}$')
+
+# Thai header fragments used by our exports -> schema field. Longer fragments are tried
+# first; None marks headers that must not fall back to a shorter fragment
+# ('ยอดรวมรายการ' is a line total, not the order's total_amount).
+HEADER_SYNONYMS = {
+    'เลขคำสั่งซื้อ': 'id', 'วันที่สั่งซื้อ': 'order_date', 'วันที่ขาย': 'order_date',
+    'วันที่จัดส่ง': 'delivery_date', 'ชื่อลูกค้า': 'full_name', 'นามสกุลลูกค้า': 'last_name',
+    'เบอร์โทร': 'phone', 'อีเมล': 'email', 'ที่อยู่': 'street', 'ตำบล': 'subdistrict', 'แขวง': 'subdistrict',
+    'อำเภอ': 'district', 'จังหวัด': 'province', 'รหัสไปรษณีย์': 'postal_code',
+    'ช่องทางการชำระ': 'payment_method', 'วิธีชำระเงิน': 'payment_method', 'สถานะออเดอร์': 'order_status',
+    'สถานะการชำระ': 'payment_status', 'ยอดรวม': 'total_amount', 'ยอดรวมรายการ': None, 'ส่วนลด': 'bill_discount',
+    'ช่องทางสั่งซื้อ': 'sales_channel', 'หมายเหตุ': 'notes', 'รหัสลูกค้า': 'customer_ref_id',
+    'เกรด': 'grade', 'เฟซบุ๊ก': 'facebook_name', 'ไลน์': 'line_id',
+}
+SYNONYMS_LONGEST_FIRST = sorted(HEADER_SYNONYMS.items(), key=lambda s: len(s[0]), reverse=True)
+
+# Exports hold the customer's full name in one column; the importer splits it
+# (transform_names.clean_and_split_name) into these fields
+FULL_NAME_FIELD = 'full_name'
+FULL_NAME_SPLIT = ('first_name', 'last_name')
+
+RE_HEADER_TOKEN = re.compile(r'[\s/()\[\]_:.,-]+')
+
+# Inferred value type -> prisma scalar types it can fill
+TYPE_COMPAT = {
+    'integer': {'Int', 'Decimal', 'String', 'Boolean'},
+    'decimal': {'Decimal'},
+    'date': {'DateTime'},
+    'phone': {'String'},
+    'postal_code': {'String'},
+    'email': {'String'},
+    'thai_name': {'String'},
+    'text': {'String'},
+}
+
+
+def detect_date_format(val):
+    for fmt in DATE_FORMATS:
+        try:
+            dt = datetime.strptime(val, fmt)
+        except ValueError:
+            continue
+        return fmt + (' (BE)' if dt.year > 2400 else '')
+    return None
+
+
+def classify_value(val):
+    """Returns (type, date format or None) for one non-empty cell."""
+    v = val.strip()
+    if RE_POSTAL.match(v):
+        return 'postal_code', None
+    digits = v.replace('-', '').replace(' ', '')
+    if v.startswith(('0', '+66')) and digits.lstrip('+').isdigit() and len(normalize_thai_phone(v)) in (9, 10):
+        return 'phone', None
+    if RE_INT.match(v):
+        return 'integer', None
+    num = v.replace('฿', '').replace(',', '')
+    if RE_DECIMAL.match(num) or (num != v and RE_INT.match(num)):
+        return 'decimal', None
+    fmt = detect_date_format(v)
+    if fmt:
+        return 'date', fmt
+    if RE_EMAIL.match(v):
+        return 'email', None
+    if RE_THAI_NAME.match(v) and len(v) <= 40:
+        return 'thai_name', None
+    return 'text', None
+
+
+class ColumnProfile:
+    def __init__(self, index, header):
+        self.index = index
+        self.header = header
+        self.types = Counter()
+        self.date_formats = Counter()
+        self.empty = 0
+        self.samples = []
+
+    def add(self, val):
+        if val is None or not str(val).strip() or str(val).strip().lower() in ('null', '-'):
+            self.empty += 1
+            return
+        val = str(val)
+        t, fmt = classify_value(val)
+        self.types[t] += 1
+        if fmt:
+            self.date_formats[fmt] += 1
+        if len(self.samples) < 3:
+            self.samples.append(val)
+
+    def inferred_type(self):
+        total = sum(self.types.values())
+        if not total:
+            return 'empty'
+        t, n = self.types.most_common(1)[0]
+        # Mixed numeric columns are decimals; phone/postal/name need a clear majority
+        if t == 'integer' and self.types['decimal']:
+            return 'decimal'
+        if n / total >= 0.8:
+            return t
+        if t in ('thai_name', 'text') or self.types['text']:
+            return 'text'
+        return t
+
+
+SCALAR_TYPES = {'Int', 'Decimal', 'DateTime', 'String', 'Boolean'}
+
+
+def load_prisma_models(path, models=('customers', 'orders')):
+    """Parses scalar and enum fields of the given models: model -> [(field, prisma type)].
+
+    Enums are treated as String; relation fields are skipped.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        lines = f.read().splitlines()
+    enums = {m.group(1) for m in (re.match(r'^enum (\w+) \{', l) for l in lines) if m}
+
+    fields = {m: [] for m in models}
+    current = None
+    for line in lines:
+        m = re.match(r'^model (\w+) \{', line)
+        if m:
+            current = m.group(1) if m.group(1) in fields else None
+            continue
+        if current is None:
+            continue
+        if line.startswith('}'):
+            current = None
+            continue
+        parts = line.split()
+        if len(parts) < 2 or parts[0].startswith(('@@', '//')):
+            continue
+        ftype = parts[1].rstrip('?')
+        if ftype in SCALAR_TYPES:
+            fields[current].append((parts[0], ftype))
+        elif ftype in enums:
+            fields[current].append((parts[0], 'String'))
+    return fields
+
+
+def header_synonym(header):
+    """Returns (field, whole) for the longest synonym in ``header``, or None.
+
+    ``whole`` is True when the synonym is the header or one of its tokens; a
+    synonym found only inside a longer word is a weaker hint.
+    """
+    tokens = set(RE_HEADER_TOKEN.split(header))
+    for fragment, target in SYNONYMS_LONGEST_FIRST:
+        if fragment == header or fragment in tokens:
+            return target, True
+    for fragment, target in SYNONYMS_LONGEST_FIRST:
+        if fragment in header:
+            return target, False
+    return None
+
+
+def name_score(header, field):
+    if not header:
+        return 0.0
+    h = header.strip().lower()
+    synonym = header_synonym(h)
+    if synonym:
+        target, whole = synonym
+        if target != field:
+            return 0.0
+        return 1.0 if whole else 0.85
+    norm = re.sub(r'[^a-z0-9]', '', h)
+    return SequenceMatcher(None, norm, field.replace('_', '')).ratio() if norm else 0.0
+
+
+def shape_score(col_type, field, prisma_type):
+    if col_type == 'empty':
+        return 0.0
+    if prisma_type not in TYPE_COMPAT.get(col_type, set()):
+        return 0.0
+    if col_type == 'phone':
+        return 1.0 if 'phone' in field else 0.2
+    if col_type == 'postal_code':
+        return 1.0 if field == 'postal_code' else 0.2
+    if col_type == 'email':
+        return 1.0 if field == 'email' else 0.2
+    if col_type == 'thai_name':
+        return 0.8 if field.endswith('name') or field in ('subdistrict', 'district', 'province') else 0.5
+    return 0.7
+
+
+def read_sample(path, sample_rows, sheet=None):
+    """Returns (rows) for the first ``sample_rows`` + 1 rows of a CSV or XLSX."""
+    rows = []
+    if path.lower().endswith(('.xlsx', '.xlsm')):
+        import openpyxl
+        wb = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        ws = wb[sheet] if sheet else wb.active
+        for row in ws.iter_rows(values_only=True):
+            rows.append(['' if v is None else str(v) for v in row])
+            if len(rows) > sample_rows:
+                break
+        wb.close()
+        return rows
+    with open_file(path, 'r', encoding='utf-8-sig', newline='') as f:
+        for row in csv.reader(f):
+            rows.append(row)
+            if len(rows) > sample_rows:
+                break
+    return rows
+
+
+def looks_like_header(first, rest):
+    """A header row has no numbers/dates/phones and differs in shape from the data below it."""
+    if not first or not rest:
+        return False
+    typed = sum(1 for v in first if v.strip() and classify_value(v)[0] in ('integer', 'decimal', 'date', 'phone', 'postal_code'))
+    return typed == 0 and any(v.strip() for v in first)
+
+
+def infer_mapping(path, table=None, sample_rows=SAMPLE_ROWS, schema_path=PRISMA_SCHEMA, sheet=None, min_score=0.55):
+    rows = read_sample(path, sample_rows, sheet)
+    if not rows:
+        raise ValueError(f"{path} is empty")
+    has_header = looks_like_header(rows[0], rows[1:])
+    header = rows[0] if has_header else []
+    data = rows[1:] if has_header else rows
+    width = max(len(r) for r in rows)
+
+    profiles = [ColumnProfile(i, header[i].strip() if i < len(header) else '') for i in range(width)]
+    for row in data:
+        for i, val in enumerate(row):
+            profiles[i].add(val)
+
+    models = load_prisma_models(schema_path)
+    candidates = [table] if table else list(models)
+
+    best = None
+    for model in candidates:
+        fields = models[model]
+        if all(f in dict(fields) for f in FULL_NAME_SPLIT):
+            fields = fields + [(FULL_NAME_FIELD, 'String')]
+        scored = []
+        for p in profiles:
+            col_type = p.inferred_type()
+            for field, ptype in fields:
+                ns = name_score(p.header, field)
+                ss = shape_score(col_type, field, ptype)
+                if has_header:
+                    score = 0.6 * ns + 0.4 * ss if ss or ns == 1.0 else 0.0
+                else:
+                    # Without headers only distinctive shapes are trusted
+                    score = ss if col_type in ('phone', 'postal_code', 'email') else 0.0
+                if score >= min_score:
+                    scored.append((score, p.index, field))
+        scored.sort(reverse=True)
+        used_cols, used_fields, mapping = set(), set(), {}
+        for score, idx, field in scored:
+            if idx in used_cols or field in used_fields:
+                continue
+            used_cols.add(idx)
+            used_fields.add(field)
+            mapping[idx] = (field, round(score, 2))
+        if FULL_NAME_FIELD in used_fields and used_fields & set(FULL_NAME_SPLIT):
+            # A separate first or last name column means the "name" column holds only the other part
+            idx = next(i for i, (f, _) in mapping.items() if f == FULL_NAME_FIELD)
+            rest = [f for f in FULL_NAME_SPLIT if f not in used_fields]
+            if rest:
+                mapping[idx] = (rest[0], mapping[idx][1])
+            else:
+                del mapping[idx]
+        total = sum(s for _, s in mapping.values())
+        if best is None or total > best[1]:
+            best = (model, total, mapping)
+
+    model, _, mapping = best
+    columns = []
+    for p in profiles:
+        col_type = p.inferred_type()
+        field, score = mapping.get(p.index, (None, 0.0))
+        columns.append({
+            'index': p.index,
+            'header': p.header,
+            'type': col_type,
+            'date_format': p.date_formats.most_common(1)[0][0] if col_type == 'date' and p.date_formats else None,
+            'empty_ratio': round(p.empty / max(len(data), 1), 2),
+            'field': field,
+            'split_into': list(FULL_NAME_SPLIT) if field == FULL_NAME_FIELD else None,
+            'score': score,
+            'samples': p.samples,
+        })
+    mapped = {c['field'] for c in columns}
+    if FULL_NAME_FIELD in mapped:
+        mapped.update(FULL_NAME_SPLIT)
+    return {
+        'source': os.path.basename(path),
+        'table': model,
+        'has_header': has_header,
+        'sampled_rows': len(data),
+        'columns': columns,
+        'unmapped_fields': [f for f, _ in models[model] if f not in mapped],
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profile a CSV/XLSX export and propose a column mapping.")
+    parser.add_argument('path')
+    parser.add_argument('--table', choices=['customers', 'orders'], help="Target table (default: best fit)")
+    parser.add_argument('--sample', type=int, default=SAMPLE_ROWS, help="Rows to sample")
+    parser.add_argument('--sheet', help="XLSX sheet name")
+    parser.add_argument('--schema', default=PRISMA_SCHEMA)
+    parser.add_argument('--output', help="Write the mapping config JSON here (default: stdout)")
+    args = parser.parse_args()
+    config = infer_mapping(args.path, args.table, args.sample, args.schema, args.sheet)
+    text = json.dumps(config, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        print(f"Mapping for {config['table']} written to {args.output}")
+    else:
+        print(text)
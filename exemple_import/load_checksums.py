@@ -0,0 +1,255 @@
+"""Per-batch row counts and checksums for generated .sql files, and their check on the target DB.
+
+The converter records, for every primary-key range of BUCKET_SIZE ids, how
+many rows it emitted and the sum of CRC32 over a canonical text form of each
+row. Sums are order-independent, so the target DB can recompute them with a
+single grouped query instead of a row-by-row diff:
+
+    python load_checksums.py customers_import_v4.sql.manifest.json --sqlite crm.sqlite
+    python load_checksums.py customers_import_v4.sql.manifest.json --database crm --user root
+
+A manifest of an upsert run names its pending row-hash file, which is
+committed once every batch matches.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import zlib
+from decimal import ROUND_HALF_UP, Decimal
+
+from row_hashes import commit
+
+BUCKET_SIZE = 1000
+
+# Column kinds: how a value is rendered before hashing, identically in Python and SQL
+STR, DATE, INT, DECIMAL = 'str', 'date', 'int', 'decimal'
+
+NULL_MARK = 'NULL'
+SEPARATOR = '\x1f'
+
+_RE_INT = re.compile(r'^-?\d+$')
+_ONE = Decimal(1)
+
+
+def canonical_int(lit):
+    # MySQL stores a fractional literal in an INT column rounded half away from zero (12.5 -> 13)
+    if _RE_INT.match(lit):
+        return str(int(lit))
+    return str(int(Decimal(lit).quantize(_ONE, ROUND_HALF_UP)))
+
+
+def canonical_cents(lit):
+    # Exact decimal arithmetic, rounded like MySQL's ROUND() on DECIMAL values (not banker's rounding)
+    return str(int((Decimal(lit) * 100).quantize(_ONE, ROUND_HALF_UP)))
+
+
+def compile_row_canonical(kinds):
+    """Generates ``canonical(row, values) -> str`` for one column layout.
+
+    ``row`` holds the source cells and ``values`` the SQL literals emitted for
+    them. Strings hash the source cell, so an escaping bug shows up as a
+    mismatch; dates hash the emitted literal, numbers their integer text and
+    decimals their value in cents.
+    """
+    parts = []
+    for i, kind in enumerate(kinds):
+        if kind == STR:
+            parts.append(f"(NULL_MARK if values[{i}] == 'NULL' else row[{i}])")
+        elif kind == DATE:
+            # NULL is emitted unquoted, so slicing it off would break the mark
+            parts.append(f"(values[{i}] if values[{i}] == 'NULL' else values[{i}][1:-1])")
+        elif kind == INT:
+            # 'NULL' and plain digits are already in canonical form
+            parts.append(f"(values[{i}] if values[{i}].isdigit() or values[{i}] == 'NULL' "
+                         f"else canonical_int(values[{i}]))")
+        else:
+            parts.append(f"(NULL_MARK if values[{i}] == 'NULL' else canonical_cents(values[{i}]))")
+    source = f"def canonical(row, values):\n    return SEPARATOR.join(({', '.join(parts)},))\n"
+    namespace = {'NULL_MARK': NULL_MARK, 'SEPARATOR': SEPARATOR,
+                 'canonical_int': canonical_int, 'canonical_cents': canonical_cents}
+    exec(compile(source, '<row_canonical>', 'exec'), namespace)
+    return namespace['canonical']
+
+
+class LoadManifest:
+    """Row count and CRC32 sum per primary-key bucket of one generated table load."""
+
+    def __init__(self, path, table, pk, columns, kinds, bucket_size=BUCKET_SIZE, hash_sidecar=None):
+        self.path = path
+        self.hash_sidecar = hash_sidecar
+        self.table = table
+        self.pk = pk
+        self.pk_index = columns.index(pk)
+        self.columns = columns
+        self.kinds = kinds
+        self.bucket_size = bucket_size
+        self.buckets = {}
+        self.scope_values = set()
+        self.scope_null = False
+        self.unkeyed = 0
+        self._canonical = compile_row_canonical(kinds)
+
+    def add(self, row, values, scope_value=None):
+        """Records one emitted row; ``scope_value`` is its company_id literal."""
+        pk = values[self.pk_index]
+        if not pk.isdigit():
+            # Auto-increment ids are only known after the load
+            self.unkeyed += 1
+            return
+        key = int(pk) // self.bucket_size
+        text = self._canonical(row, values)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = [0, 0]
+        bucket[0] += 1
+        bucket[1] += zlib.crc32(text.encode('utf-8'))
+        if scope_value is not None:
+            if scope_value == 'NULL':
+                self.scope_null = True
+            else:
+                self.scope_values.add(int(scope_value))
+
+    def scope(self, scope_column='company_id'):
+        clauses = []
+        if self.scope_values:
+            clauses.append(f"`{scope_column}` IN ({', '.join(str(v) for v in sorted(self.scope_values))})")
+        if self.scope_null:
+            clauses.append(f"`{scope_column}` IS NULL")
+        return ' OR '.join(clauses) if clauses else None
+
+    def save(self):
+        data = {
+            'table': self.table,
+            'pk': self.pk,
+            'bucket_size': self.bucket_size,
+            'scope': self.scope(),
+            'columns': [[c, k] for c, k in zip(self.columns, self.kinds)],
+            'rows': sum(b[0] for b in self.buckets.values()),
+            'batches': {str(k): self.buckets[k] for k in sorted(self.buckets)},
+        }
+        if self.hash_sidecar:
+            data['hash_sidecar'] = os.path.abspath(self.hash_sidecar)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2)
+        print(f"Checksum manifest: {data['rows']} rows in {len(self.buckets)} batches -> {self.path}")
+        if self.unkeyed:
+            print(f"  {self.unkeyed} rows without {self.pk} are not covered")
+
+
+# --- Verification on the target DB -------------------------------------------
+
+def column_sql(name, kind, dialect):
+    col = f"`{name}`" if dialect == 'mysql' else f'"{name}"'
+    if kind == STR:
+        expr = col
+    elif kind == DATE:
+        expr = f"DATE_FORMAT({col}, '%Y-%m-%d %H:%i:%s')" if dialect == 'mysql' else col
+    elif kind == INT:
+        expr = f"CAST({col} AS CHAR)" if dialect == 'mysql' else f"CAST({col} AS TEXT)"
+    else:
+        # DECIMAL arithmetic, so ROUND() goes half away from zero like canonical_cents;
+        # SQLite keeps decimals as REAL and gets canonical_cents itself (see sqlite_checksums)
+        expr = (f"CAST(CAST(ROUND(CAST({col} AS DECIMAL(20, 4)) * 100) AS SIGNED) AS CHAR)" if dialect == 'mysql'
+                else f"CENTS({col})")
+    return f"COALESCE({expr}, '{NULL_MARK}')"
+
+
+def checksum_query(manifest, dialect):
+    """One grouped query: (bucket, row count, CRC32 sum) per primary-key range."""
+    exprs = [column_sql(name, kind, dialect) for name, kind in manifest['columns']]
+    pk = f"`{manifest['pk']}`" if dialect == 'mysql' else f'"{manifest["pk"]}"'
+    if dialect == 'mysql':
+        row_text = f"CONCAT_WS(CHAR(31), {', '.join(exprs)})"
+        bucket = f"{pk} DIV {manifest['bucket_size']}"
+        table = f"`{manifest['table']}`"
+    else:
+        row_text = " || char(31) || ".join(exprs)
+        bucket = f"{pk} / {manifest['bucket_size']}"
+        table = f'"{manifest["table"]}"'
+    where = f" WHERE {manifest['scope']}" if manifest.get('scope') else ''
+    if where and dialect != 'mysql':
+        where = where.replace('`', '"')
+    return (f"SELECT {bucket} AS bucket, COUNT(*), SUM(CRC32({row_text})) "
+            f"FROM {table}{where} GROUP BY bucket ORDER BY bucket")
+
+
+def sqlite_checksums(manifest, path):
+    import sqlite3
+
+    conn = sqlite3.connect(path)
+    conn.create_function('CRC32', 1, lambda s: zlib.crc32(s.encode('utf-8')), deterministic=True)
+    conn.create_function('CENTS', 1, lambda v: None if v is None else canonical_cents(str(v)), deterministic=True)
+    try:
+        return {int(b): [n, int(s or 0)] for b, n, s in conn.execute(checksum_query(manifest, 'sqlite'))}
+    finally:
+        conn.close()
+
+
+def mysql_checksums(manifest, args):
+    cmd = [args.mysql, '--host', args.host, '--port', str(args.port), '--user', args.user,
+           '--default-character-set=utf8mb4', '--batch', '--skip-column-names', args.database,
+           '-e', checksum_query(manifest, 'mysql')]
+    env = dict(os.environ)
+    if args.password:
+        env['MYSQL_PWD'] = args.password
+    result = subprocess.run(cmd, capture_output=True, env=env)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.decode('utf-8', 'replace').strip())
+    out = {}
+    for line in result.stdout.decode('utf-8').splitlines():
+        b, n, s = line.split('\t')
+        out[int(b)] = [int(n), int(s) if s != 'NULL' else 0]
+    return out
+
+
+def compare(manifest, actual):
+    """Yields (bucket, expected [rows, sum], actual [rows, sum]) for every mismatching batch."""
+    expected = {int(b): v for b, v in manifest['batches'].items()}
+    for bucket in sorted(set(expected) | set(actual)):
+        e = expected.get(bucket, [0, 0])
+        a = actual.get(bucket, [0, 0])
+        if e != a:
+            yield bucket, e, a
+
+
+def verify(manifest_path, sqlite_path=None, mysql_args=None):
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if sqlite_path:
+        actual = sqlite_checksums(manifest, sqlite_path)
+    else:
+        actual = mysql_checksums(manifest, mysql_args)
+    size = manifest['bucket_size']
+    bad = list(compare(manifest, actual))
+    for bucket, e, a in bad:
+        lo, hi = bucket * size, (bucket + 1) * size - 1
+        detail = f"rows {a[0]}/{e[0]}" if a[0] != e[0] else "content differs"
+        print(f"  MISMATCH {manifest['pk']} {lo}-{hi}: {detail}")
+    total = len(set(manifest['batches']) | {str(b) for b in actual})
+    print(f"{manifest['table']}: {total - len(bad)}/{total} batches match"
+          + (f", {len(bad)} mismatching" if bad else ""))
+    sidecar = manifest.get('hash_sidecar')
+    if sidecar:
+        if bad:
+            print(f"Row hashes left pending; the next upsert run re-emits every row changed since {sidecar}")
+        elif commit(sidecar):
+            print(f"Row hashes committed to {sidecar}")
+    return not bad
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check a loaded table against the converter's checksum manifest.")
+    parser.add_argument('manifest', help="<output>.manifest.json written by the converter")
+    parser.add_argument('--sqlite', help="SQLite database file")
+    parser.add_argument('--database', help="MariaDB/MySQL database")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=3306)
+    parser.add_argument('--user', default='root')
+    parser.add_argument('--password', default=os.environ.get('MYSQL_PWD', ''))
+    parser.add_argument('--mysql', default='mysql', help="mysql client binary")
+    args = parser.parse_args()
+    if not args.sqlite and not args.database:
+        parser.error("give --sqlite or --database")
+    raise SystemExit(0 if verify(args.manifest, args.sqlite, args) else 1)
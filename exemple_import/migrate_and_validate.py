@@ -1,12 +1,37 @@
 import csv
 import re
 import sys
-import pandas as pd
+
+from address_cache import MISS, normalize_key, open_cache
+from compressed_io import open_file, split_ext
+from csv_reader import RecordLines
+from order_aggregates import build_aggregates, expand_sources
+from quarantine import Quarantine, quarantine_path
+from recalculate_grades import assign_grades, load_grade_config, order_filter, sum_purchases
+from thai_text import canonical_thai, canonicalize_columns
 
 # Define input and output file paths
 INPUT_FILE = 'customers (old).csv'
 OUTPUT_FILE = 'customers_final_validated.csv'
 MASTER_DATA_FILE = 'primacom_mini_erp.sql'
+CACHE_FILE = 'address_cache.sqlite'
+# Order exports / orders dumps used to fill order_count and order dates
+ORDER_SOURCES = ['orders-raw_*.csv']
+# Company the orders-raw exports belong to; their customers are matched by phone within it
+ORDER_COMPANY_ID = 1
+# Grade config (dump, or get_grades_config.php JSON per company as 'grades_{company_id}.json');
+# None keeps the legacy customer_grade
+GRADE_CONFIG_FILE = None
+# Bump when find_best_match_with_strategy changes; cached matches are then recomputed
+MATCHER_VERSION = 2
+
+# Legacy export columns read by main(); the rest of the export is never parsed
+SOURCE_COLUMNS = [
+    'customer_id', 'customer_code', 'company_id', 'first_name', 'phone', 'email', 'address',
+    'district', 'province', 'postal_code', 'assigned_at', 'created_at', 'next_followup_at',
+    'customer_time_expiry', 'last_contact_at', 'customer_status', 'temperature_status',
+    'customer_grade', 'total_purchase_amount', 'assigned_to', 'is_blocked', 'basket_type'
+]
 
 # Target columns (44 columns)
 TARGET_COLUMNS = [
@@ -31,6 +56,10 @@ PREFIXES = [
     "ร้าน", "บจก.", "บมจ.", "หจก.", "หสน."
 ]
 
+def notna(val):
+    """pd.notna for a single value, without importing pandas: None and NaN are missing."""
+    return val is not None and val == val
+
 def load_master_data(sql_file):
     """Loads master address data from SQL DUMP file."""
     master_list = []
@@ -42,7 +71,7 @@ def load_master_data(sql_file):
     print(f"Reading SQL file: {sql_file}")
     
     try:
-        with open(sql_file, 'r', encoding='utf-8') as f:
+        with open_file(sql_file, 'r', encoding='utf-8') as f:
             content = f.read()
             
         # Parse based on 'INSERT INTO `table`' blocks
@@ -132,14 +161,16 @@ def load_master_data(sql_file):
                     'province': provinces[p_id],
                     'postal_code': sub['zip']
                 })
-    
-    return master_list
+
+    # Gazetteer names and input fields go through the same canonical form (as in validate_addresses)
+    return canonicalize_columns(master_list, ['subdistrict', 'district', 'province'])
 
 def clean_name(name):
     if not isinstance(name, str):
         return "", ""
     
-    clean = name.strip()
+    # Keep dots so abbreviated titles (น.ส.) still match PREFIXES
+    clean = canonical_thai(name, strip_dots=False)
     clean = re.sub(r'\(.*?\)', '', clean)
     clean = re.sub(r'\*\*.*', '', clean)
     
@@ -157,35 +188,51 @@ def clean_name(name):
     else:
         return "", ""
 
-def find_best_match(postal_code, subdistrict_in, district_in, province_in, master_data):
-    postal_code = str(postal_code).split('.')[0] if pd.notna(postal_code) else ""
-    subdistrict_in = str(subdistrict_in).strip() if pd.notna(subdistrict_in) else ""
-    district_in = str(district_in).strip() if pd.notna(district_in) else ""
-    province_in = str(province_in).strip() if pd.notna(province_in) else ""
+def find_best_match_with_strategy(postal_code, subdistrict_in, district_in, province_in, master_data):
+    """Returns ((subdistrict, district, province, postal_code), strategy name)."""
+    postal_code = canonical_thai(str(postal_code), strip_dots=False).split('.')[0].strip() if notna(postal_code) else ""
+    subdistrict_in = canonical_thai(str(subdistrict_in)) if notna(subdistrict_in) else ""
+    district_in = canonical_thai(str(district_in)) if notna(district_in) else ""
+    province_in = canonical_thai(str(province_in)) if notna(province_in) else ""
     
     matches = [m for m in master_data if str(m['postal_code']) == postal_code]
     
     if not matches:
         name_matches = [m for m in master_data if m['province'] == province_in and m['district'] == district_in]
         if name_matches:
-             return name_matches[0]['subdistrict'], name_matches[0]['district'], name_matches[0]['province'], name_matches[0]['postal_code']
-        return subdistrict_in, district_in, province_in, postal_code
+             return (name_matches[0]['subdistrict'], name_matches[0]['district'], name_matches[0]['province'], name_matches[0]['postal_code']), 'name_district_province'
+        return (subdistrict_in, district_in, province_in, postal_code), 'no_match'
 
     def clean_geo(txt):
         return txt.replace('ต.', '').replace('อ.', '').replace('จ.', '').replace('แขวง', '').replace('เขต', '').replace('ตำบล', '').replace('อำเภอ', '').replace('จังหวัด', '').strip()
 
-    clean_sub = clean_geo(subdistrict_in)
-    clean_dist = clean_geo(district_in)
+    clean_sub = canonical_thai(clean_geo(subdistrict_in))
+    clean_dist = canonical_thai(clean_geo(district_in))
     
-    for m in matches:
-        if clean_sub == m['subdistrict']:
-            return m['subdistrict'], m['district'], m['province'], m['postal_code']
+    sub_matches = [m for m in matches if clean_sub == m['subdistrict']]
+    if sub_matches:
+        # One zip can hold same-named subdistricts of different districts
+        m = next((m for m in sub_matches if m['district'] == clean_dist), sub_matches[0])
+        return (m['subdistrict'], m['district'], m['province'], m['postal_code']), 'zip_exact_subdistrict'
             
     for m in matches:
         if clean_dist == m['district']:
-            return subdistrict_in, m['district'], m['province'], m['postal_code']
+            return (subdistrict_in, m['district'], m['province'], m['postal_code']), 'zip_district'
+
+    return (subdistrict_in, district_in, matches[0]['province'], postal_code), 'zip_province_only'
+
+def find_best_match(postal_code, subdistrict_in, district_in, province_in, master_data):
+    return find_best_match_with_strategy(postal_code, subdistrict_in, district_in, province_in, master_data)[0]
 
-    return subdistrict_in, district_in, matches[0]['province'], postal_code
+def cached_match(postal_code, subdistrict_in, district_in, province_in, master_data, cache):
+    """find_best_match backed by the persistent address cache."""
+    key = normalize_key(*(v if notna(v) else '' for v in (postal_code, subdistrict_in, district_in, province_in)))
+    entry = cache.get(key)
+    if entry is not MISS:
+        return tuple(entry[0]), entry[1]
+    result, strategy = find_best_match_with_strategy(postal_code, subdistrict_in, district_in, province_in, master_data)
+    cache.put(key, list(result), strategy)
+    return result, strategy
 
 def extract_address_from_street(street_text):
     if not isinstance(street_text, str):
@@ -213,7 +260,7 @@ def extract_address_from_street(street_text):
 from datetime import datetime, timedelta
 
 def convert_date(val):
-    if not val or pd.isna(val) or str(val).lower() == 'null' or str(val) == '':
+    if not val or not notna(val) or str(val).lower() == 'null' or str(val) == '':
         return ''
     
     val_str = str(val).strip()
@@ -265,17 +312,35 @@ def map_lifecycle_status(status):
     
     return s.capitalize()
 
-def main():
+def iter_source_rows(path, quarantine=None):
+    """Yields (line number, raw record text, row) with the SOURCE_COLUMNS of each record; empty cells are None."""
+    with open_file(path, 'r', encoding='utf-8-sig', newline='') as f:
+        lines = RecordLines(f)
+        reader = csv.DictReader(lines)
+        if quarantine and reader.fieldnames:
+            quarantine.set_header(lines.text)
+        for rec in reader:
+            yield reader.line_num, lines.text, {c: rec.get(c) or None for c in SOURCE_COLUMNS}
+
+def main(cache_path=CACHE_FILE, order_sources=ORDER_SOURCES, input_file=INPUT_FILE, output_file=OUTPUT_FILE,
+         master_file=MASTER_DATA_FILE, order_company_id=ORDER_COMPANY_ID):
+    if GRADE_CONFIG_FILE and GRADE_CONFIG_FILE.lower().endswith('.json') and '{company_id}' not in GRADE_CONFIG_FILE:
+        raise ValueError(f"{GRADE_CONFIG_FILE} holds one company's grades; give a path with {{company_id}}")
+
     print("Loading master data...")
-    master_data = load_master_data(MASTER_DATA_FILE)
+    master_data = load_master_data(master_file)
     print(f"Loaded {len(master_data)} master address records.")
+    cache = open_cache(cache_path, master_file, 'migrate_and_validate', MATCHER_VERSION)
+
+    print("Aggregating order history...")
+    order_aggs = build_aggregates(expand_sources(order_sources or []), company_id=order_company_id)
     
     print("Reading old CSV...")
-    df = pd.read_csv(INPUT_FILE, encoding='utf-8-sig', dtype=str)
-    
     results = []
     
-    for idx, row in df.iterrows():
+    quarantine = Quarantine(quarantine_path(output_file), 'migrate_and_validate')
+
+    for line_num, record, row in iter_source_rows(input_file, quarantine):
         new_row = {col: '' for col in TARGET_COLUMNS}
         
         new_row['customer_id'] = row.get('customer_id', '')
@@ -294,11 +359,17 @@ def main():
         p_sub, p_dist, p_prov, p_zip = extract_address_from_street(orig_addr)
         
         input_sub = p_sub
-        input_dist = row.get('district', '') if pd.notna(row.get('district')) else p_dist
-        input_prov = row.get('province', '') if pd.notna(row.get('province')) else p_prov
-        input_zip = row.get('postal_code', '') if pd.notna(row.get('postal_code')) else p_zip
+        input_dist = row.get('district', '') if notna(row.get('district')) else p_dist
+        input_prov = row.get('province', '') if notna(row.get('province')) else p_prov
+        input_zip = row.get('postal_code', '') if notna(row.get('postal_code')) else p_zip
         
-        v_sub, v_dist, v_prov, v_zip = find_best_match(input_zip, input_sub, input_dist, input_prov, master_data)
+        if cache:
+            matched, strategy = cached_match(input_zip, input_sub, input_dist, input_prov, master_data, cache)
+        else:
+            matched, strategy = find_best_match_with_strategy(input_zip, input_sub, input_dist, input_prov, master_data)
+        v_sub, v_dist, v_prov, v_zip = matched
+        if strategy == 'no_match':
+            quarantine.flag(line_num, 'address_unmatched', record)
         
         new_row['street'] = orig_addr 
         new_row['subdistrict'] = v_sub
@@ -315,14 +386,15 @@ def main():
         raw_status = row.get('customer_status', '')
         new_row['lifecycle_status'] = map_lifecycle_status(raw_status)
         
-        new_row['behavioral_status'] = row.get('temperature_status', '').capitalize() if pd.notna(row.get('temperature_status')) else ''
+        new_row['behavioral_status'] = row.get('temperature_status', '').capitalize() if notna(row.get('temperature_status')) else ''
         new_row['grade'] = row.get('customer_grade', '')
         
-        total_p = row.get('total_purchase_amount', '0')
+        total_p = row.get('total_purchase_amount') or '0'
         try:
             total_p_float = float(total_p)
-        except:
+        except (TypeError, ValueError):
             total_p_float = 0.0
+            quarantine.flag(line_num, 'bad_total_purchase_amount', record, repr(total_p))
             
         new_row['total_purchases'] = str(total_p_float)
         new_row['assigned_to'] = row.get('assigned_to', '')
@@ -332,8 +404,24 @@ def main():
         new_row['order_count'] = '0'
         new_row['bucket_type'] = row.get('basket_type', '')
         
+        # Order history by customer id (orders dump), else by phone within the company (exports)
+        agg = order_aggs.for_customer(row.get('customer_id'))
+        if not agg and notna(row.get('phone')):
+            agg = order_aggs.for_phone(row.get('company_id'), row.get('phone'))
+        if agg:
+            order_count, order_total, first_order, last_order = agg
+            new_row['order_count'] = str(order_count)
+            new_row['first_order_date'] = first_order or ''
+            new_row['last_order_date'] = last_order or ''
+            new_row['last_sale_date'] = last_order or ''
+            if total_p_float == 0.0:
+                total_p_float = order_total
+                new_row['total_purchases'] = str(total_p_float)
+            new_row['has_sold_before'] = '1'
+            new_row['is_repeat_customer'] = '1' if order_count > 1 else '0'
+            new_row['is_new_customer'] = '0' if order_count > 1 else '1'
         # Determine New/Repeat/Sold
-        if total_p_float > 0:
+        elif total_p_float > 0:
             new_row['has_sold_before'] = '1'
             new_row['is_repeat_customer'] = '1'
             new_row['is_new_customer'] = '0'
@@ -344,8 +432,34 @@ def main():
             
         results.append(new_row)
         
-    print(f"Writing {len(results)} rows to {OUTPUT_FILE}...")
-    with open(OUTPUT_FILE, 'w', encoding='utf-8-sig', newline='') as f:
+    if cache:
+        cache.close()
+    quarantine.close()
+
+    if GRADE_CONFIG_FILE:
+        print("Recalculating grades...")
+        order_dumps = [p for p in expand_sources(order_sources or []) if split_ext(p)[1].lower().startswith('.sql')]
+        for company_id in sorted({r['company_id'] for r in results}, key=str):
+            rows = [r for r in results if r['company_id'] == company_id]
+            grades, settings = load_grade_config(GRADE_CONFIG_FILE, company_id)
+            if (settings.get('calc_mode') or 'all') == 'all':
+                totals = [float(r['total_purchases']) for r in rows]
+            elif order_dumps:
+                # Windowed modes sum the orders themselves, as recalculate_all_grades.php
+                by_customer = {}
+                for dump in order_dumps:
+                    for cid, amount in sum_purchases(dump, company_id, order_filter(settings)).items():
+                        by_customer[cid] = by_customer.get(cid, 0.0) + amount
+                totals = [by_customer.get(r['customer_id'], 0.0) for r in rows]
+            else:
+                print(f"  company {company_id}: calc_mode={settings['calc_mode']} needs an orders dump "
+                      f"in the order sources, legacy grades kept")
+                continue
+            for r, grade in zip(rows, assign_grades(totals, grades)):
+                r['grade'] = grade
+
+    print(f"Writing {len(results)} rows to {output_file}...")
+    with open_file(output_file, 'w', encoding='utf-8-sig', newline='') as f:
         writer = csv.DictWriter(f, fieldnames=TARGET_COLUMNS)
         # writer.writeheader() # Header removed as per user request
         writer.writerows(results)
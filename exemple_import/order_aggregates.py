@@ -0,0 +1,206 @@
+import argparse
+import csv
+import glob
+import os
+from datetime import datetime
+
+from compressed_io import open_file, split_ext
+from csv_reader import ProjectedReader
+from phone_utils import normalize_thai_phone
+from quarantine import Quarantine, quarantine_path
+from sql_dump import iter_table_dicts
+
+ORDER_FILES = 'orders-raw_*.csv'
+OUTPUT_FILE = 'customer_order_aggregates.csv'
+# Company the orders-raw exports belong to (orders dumps carry their own company_id)
+COMPANY_ID = 1
+
+# orders-raw_* exports come in several column layouts; locate fields by header
+COL_ORDER_DATE = 'วันที่สั่งซื้อ'
+COL_ORDER_NO = 'เลขคำสั่งซื้อ'
+COL_PHONE = 'เบอร์โทรลูกค้า'
+COL_STATUS = 'สถานะออเดอร์'
+COL_TOTALS = ('ยอดรวมรายการ', 'ยอดรวม')
+
+CANCELLED_STATUSES = {'cancelled', 'canceled', 'ยกเลิก', 'returned', 'ตีกลับ'}
+
+AGGREGATE_COLUMNS = ['company_id', 'key_type', 'customer_key', 'order_count', 'total_amount', 'first_order_date', 'last_order_date']
+
+
+def parse_order_date(val):
+    """Parses export dates (d/m/Y in Buddhist or Gregorian era) and dump datetimes."""
+    if not val:
+        return None
+    val = val.strip()
+    if not val or val.lower() == 'null':
+        return None
+    try:
+        if '/' in val:
+            date_part = val.split(' ')[0]
+            d, m, y = date_part.split('/')
+            y = int(y)
+            if y > 2400:
+                y -= 543
+            return datetime(y, int(m), int(d)).strftime('%Y-%m-%d %H:%M:%S')
+        if len(val) == 10:
+            return val + ' 00:00:00'
+        return val[:19]
+    except ValueError:
+        return None
+
+
+def parse_amount(val):
+    if not val:
+        return 0.0
+    try:
+        return float(val.replace('฿', '').replace(',', '').strip() or 0)
+    except ValueError:
+        return 0.0
+
+
+class OrderAggregator:
+    """Streaming group-by of orders per customer.
+
+    Orders dumps are grouped by customer_id and exports, which only carry the
+    phone, by (company_id, phone); the two are kept in separate maps. Exports
+    of overlapping date ranges repeat the same orders, so each customer
+    remembers which source its order numbers came from and lines of an order
+    seen in an earlier source are skipped. Memory holds one small record per
+    customer plus its order numbers.
+    """
+
+    def __init__(self, quarantine=None, company_id=COMPANY_ID):
+        self.quarantine = quarantine
+        # Exports have no company column; their orders belong to this company
+        self.company_id = str(company_id)
+        # key -> [order_count, total_amount, first_order_date, last_order_date, {order_no: source}]
+        self.by_customer = {}
+        self.by_phone = {}
+        self.duplicate_lines = 0
+
+    def add(self, groups, key, order_no, order_date, amount, source):
+        g = groups.get(key)
+        if g is None:
+            g = groups[key] = [0, 0.0, order_date, order_date, {}]
+        new_order = True
+        if order_no:
+            owner = g[4].get(order_no)
+            if owner is None:
+                g[4][order_no] = source
+            elif owner != source:
+                self.duplicate_lines += 1
+                return False
+            else:
+                new_order = False
+        if new_order:
+            g[0] += 1
+        g[1] += amount
+        if order_date:
+            if not g[2] or order_date < g[2]:
+                g[2] = order_date
+            if not g[3] or order_date > g[3]:
+                g[3] = order_date
+        return True
+
+    def add_export_csv(self, path):
+        with open_file(path, 'r', encoding='utf-8-sig', newline='') as f:
+            reader = ProjectedReader(f)
+            header = reader.header
+            if not header:
+                return 0
+            if self.quarantine:
+                self.quarantine.set_header(reader.header_text)
+                reader.on_malformed = lambda line_num, row, text: self.quarantine.reject(
+                    line_num, 'column_count', text,
+                    f"{os.path.basename(path)}: {len(row)} columns, expected {len(header)}")
+            total_column = next((c for c in COL_TOTALS if c in header), None)
+            if total_column is None:
+                raise ValueError(f"{os.path.basename(path)} has no order total column ({' or '.join(COL_TOTALS)})")
+            columns = [COL_ORDER_DATE, COL_ORDER_NO, COL_PHONE, total_column]
+            has_status = COL_STATUS in header
+            if has_status:
+                columns.append(COL_STATUS)
+
+            lines = 0
+            for values in reader.select(columns):
+                if has_status and values[4].strip().lower() in CANCELLED_STATUSES:
+                    continue
+                phone = normalize_thai_phone(values[2])
+                if not phone:
+                    continue
+                if self.add(self.by_phone, (self.company_id, phone), values[1].strip(),
+                            parse_order_date(values[0]), parse_amount(values[3]), path):
+                    lines += 1
+            return lines
+
+    def add_orders_dump(self, path):
+        lines = 0
+        for order in iter_table_dicts(path, 'orders'):
+            if (order.get('order_status') or '').lower() in CANCELLED_STATUSES:
+                continue
+            key = order.get('customer_id')
+            if not key:
+                continue
+            if self.add(self.by_customer, str(key), order.get('id'), parse_order_date(order.get('order_date')),
+                        parse_amount(order.get('total_amount')), path):
+                lines += 1
+        return lines
+
+    def for_customer(self, customer_id):
+        """Returns (order_count, total_amount, first_order_date, last_order_date) or None."""
+        g = self.by_customer.get(str(customer_id))
+        return tuple(g[:4]) if g else None
+
+    def for_phone(self, company_id, phone):
+        """Same as for_customer, for export orders of ``company_id`` placed with ``phone``."""
+        g = self.by_phone.get((str(company_id), normalize_thai_phone(phone)))
+        return tuple(g[:4]) if g else None
+
+    def write_csv(self, path):
+        with open_file(path, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(AGGREGATE_COLUMNS)
+            for key, g in self.by_customer.items():
+                writer.writerow(['', 'customer_id', key, g[0], f"{g[1]:.2f}", g[2] or '', g[3] or ''])
+            for (company_id, phone), g in self.by_phone.items():
+                writer.writerow([company_id, 'phone', phone, g[0], f"{g[1]:.2f}", g[2] or '', g[3] or ''])
+
+
+def build_aggregates(sources, quarantine=None, company_id=COMPANY_ID):
+    """Aggregates every orders-raw CSV or orders SQL dump in ``sources``.
+
+    ``company_id`` is the company the orders-raw exports belong to.
+    """
+    agg = OrderAggregator(quarantine, company_id)
+    for path in sources:
+        if split_ext(path)[1].lower().startswith('.sql'):
+            lines = agg.add_orders_dump(path)
+        else:
+            lines = agg.add_export_csv(path)
+        print(f"Aggregated {lines} order lines from {os.path.basename(path)}")
+    if agg.duplicate_lines:
+        print(f"Skipped {agg.duplicate_lines} lines of orders already read from an earlier source.")
+    print(f"{len(agg.by_customer) + len(agg.by_phone)} distinct customers with orders.")
+    return agg
+
+
+def expand_sources(patterns):
+    sources = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern))
+        sources.extend(matches if matches else [pattern])
+    return [p for p in sources if os.path.exists(p)]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-customer order count, sum and first/last order date.")
+    parser.add_argument('sources', nargs='*', default=[ORDER_FILES],
+                        help="orders-raw_*.csv exports and/or orders SQL dumps (globs allowed)")
+    parser.add_argument('--output', default=OUTPUT_FILE)
+    parser.add_argument('--company-id', type=int, default=COMPANY_ID, help="Company of the orders-raw exports")
+    args = parser.parse_args()
+    quarantine = Quarantine(quarantine_path(args.output), 'order_aggregates')
+    aggregates = build_aggregates(expand_sources(args.sources), quarantine, args.company_id)
+    aggregates.write_csv(args.output)
+    quarantine.close()
+    print(f"Wrote {args.output}")
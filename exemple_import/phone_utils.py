@@ -0,0 +1,22 @@
+import re
+
+_RE_NON_DIGIT = re.compile(r'\D')
+
+
+def normalize_thai_phone(phone):
+    """Normalizes a Thai phone number to its 0-prefixed national digits.
+
+    ``+66 81-234-5678``, ``66812345678``, ``081 234 5678`` and ``812345678``
+    all become ``0812345678``. Placeholders such as ``-`` return ''.
+    """
+    if not phone:
+        return ''
+    digits = _RE_NON_DIGIT.sub('', str(phone))
+    if not digits:
+        return ''
+    if digits.startswith('66') and len(digits) in (10, 11):
+        digits = '0' + digits[2:]
+    elif not digits.startswith('0') and len(digits) in (8, 9):
+        # Leading zero lost to a numeric spreadsheet column
+        digits = '0' + digits
+    return digits
@@ -0,0 +1,115 @@
+import argparse
+import json
+import os
+
+from thai_text import canonical_thai
+
+ADDRESS_DB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api', 'Address_DB')
+OUTPUT_FILE = os.path.join(ADDRESS_DB_DIR, 'postal_code_resolution.json')
+
+# Resolution classes of a postal code
+UNIQUE = 'unique'                    # the zip alone determines the subdistrict
+DISTRICT_UNIQUE = 'district_unique'  # the zip determines district and province
+AMBIGUOUS = 'ambiguous'              # several districts share the zip
+
+
+def classify_postal_codes(entries):
+    """Groups gazetteer entries by zip: zip -> (class, candidate entries).
+
+    ``entries`` are dicts with subdistrict/district/province/zip_code as
+    returned by validate_addresses.load_master_data. Candidates keep the
+    gazetteer order; entries repeating a (subdistrict, district, province)
+    already seen for the zip are dropped.
+    """
+    by_zip = {}
+    seen = set()
+    for e in entries:
+        zip_code = str(e['zip_code'])
+        names = (zip_code, e['subdistrict'], e['district'], e['province'])
+        if names in seen:
+            continue
+        seen.add(names)
+        by_zip.setdefault(zip_code, []).append(e)
+
+    resolution = {}
+    for zip_code, candidates in by_zip.items():
+        if len(candidates) == 1:
+            cls = UNIQUE
+        elif len({(c['district'], c['province']) for c in candidates}) == 1:
+            cls = DISTRICT_UNIQUE
+        else:
+            cls = AMBIGUOUS
+        resolution[zip_code] = (cls, candidates)
+    return resolution
+
+
+def load_gazetteer_json(address_db_dir=ADDRESS_DB_DIR):
+    """Entries with ids from sub_districts/districts/provinces.json (deleted rows skipped)."""
+    def load(name):
+        with open(os.path.join(address_db_dir, name), 'r', encoding='utf-8') as f:
+            return [r for r in json.load(f) if not r.get('deleted_at')]
+
+    provinces = {p['id']: p for p in load('provinces.json')}
+    districts = {d['id']: d for d in load('districts.json')}
+    entries = []
+    for s in load('sub_districts.json'):
+        d = districts.get(s['district_id'])
+        p = provinces.get(d['province_id']) if d else None
+        if not p or not s.get('zip_code'):
+            continue
+        entries.append({
+            'id': s['id'],
+            'subdistrict': canonical_thai(s['name_th']),
+            'district_id': d['id'],
+            'district': canonical_thai(d['name_th']),
+            'province_id': p['id'],
+            'province': canonical_thai(p['name_th']),
+            'zip_code': str(s['zip_code']),
+        })
+    return entries
+
+
+def resolution_json(resolution):
+    """Frontend shape: zip -> class plus only the names needed to pick a candidate."""
+    out = {}
+    for zip_code, (cls, candidates) in sorted(resolution.items()):
+        first = candidates[0]
+        if cls == UNIQUE:
+            out[zip_code] = {'class': cls, 'sub_district_id': first['id'], 'subdistrict': first['subdistrict'],
+                             'district_id': first['district_id'], 'district': first['district'],
+                             'province_id': first['province_id'], 'province': first['province']}
+        elif cls == DISTRICT_UNIQUE:
+            out[zip_code] = {'class': cls, 'district_id': first['district_id'], 'district': first['district'],
+                             'province_id': first['province_id'], 'province': first['province'],
+                             'candidates': [{'sub_district_id': c['id'], 'subdistrict': c['subdistrict']}
+                                            for c in candidates]}
+        else:
+            provinces = {c['province_id'] for c in candidates}
+            out[zip_code] = {'class': cls, 'distinguish_by': 'province' if len(provinces) > 1 else 'district',
+                             'candidates': [{'sub_district_id': c['id'], 'subdistrict': c['subdistrict'],
+                                             'district_id': c['district_id'], 'district': c['district'],
+                                             'province_id': c['province_id'], 'province': c['province']}
+                                            for c in candidates]}
+    return out
+
+
+def build(address_db_dir=ADDRESS_DB_DIR, output=OUTPUT_FILE):
+    resolution = classify_postal_codes(load_gazetteer_json(address_db_dir))
+    counts = {cls: 0 for cls in (UNIQUE, DISTRICT_UNIQUE, AMBIGUOUS)}
+    for cls, _ in resolution.values():
+        counts[cls] += 1
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({'source': 'sub_districts.json', 'counts': counts, 'postal_codes': resolution_json(resolution)},
+                  f, ensure_ascii=False, indent=2)
+        f.write('\n')
+    print(f"Wrote {len(resolution)} postal codes to {output}:")
+    for cls, n in counts.items():
+        print(f"  {cls}: {n}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the postal-code resolution table from the gazetteer JSON.")
+    parser.add_argument('--address-db', default=ADDRESS_DB_DIR, help="Directory with sub_districts/districts/provinces.json")
+    parser.add_argument('--output', default=OUTPUT_FILE)
+    args = parser.parse_args()
+    build(args.address_db, args.output)
@@ -0,0 +1,128 @@
+import argparse
+import csv
+import io
+import json
+import os
+from collections import Counter
+
+from compressed_io import open_file, split_ext
+
+QUARANTINE_COLUMNS = ['stage', 'line_num', 'reason', 'detail', 'action', 'original_line']
+
+
+def quarantine_path(output_path):
+    """Default rejects file next to a tool's output: customers.sql -> customers.rejects.csv"""
+    return split_ext(output_path)[0] + '.rejects.csv'
+
+
+class Quarantine:
+    """Collects rejected rows with their line number, stage and reason.
+
+    Rows are written as they arrive to ``<name>.rejects.csv`` and per-reason
+    counters go to ``<name>.rejects.counts.json`` on close. ``action`` records
+    whether the caller dropped the row or kept it in its output. Callers that
+    hold the raw record pass its text as ``row``; other rows are rebuilt with
+    csv.writer. Files of a previous run are removed up front, so a clean run
+    leaves none behind. Callers reading a CSV with a header pass it to
+    ``set_header`` so extract_lines can write it above the re-fed lines.
+    """
+
+    def __init__(self, path, stage):
+        self.path = path
+        self.stage = stage
+        for stale in (path, self.counts_path):
+            if os.path.exists(stale):
+                os.remove(stale)
+        self.counts = Counter()
+        self.header = None
+        self._mixed_headers = False
+        self._out = None
+        self._writer = None
+        self._line_buf = io.StringIO()
+        self._line_writer = csv.writer(self._line_buf, lineterminator='')
+
+    def _original_line(self, row):
+        if isinstance(row, str):
+            return row
+        if isinstance(row, dict):
+            row = list(row.values())
+        self._line_buf.seek(0)
+        self._line_buf.truncate()
+        self._line_writer.writerow(['' if v is None else v for v in row])
+        return self._line_buf.getvalue()
+
+    def set_header(self, header):
+        """Records the source header (raw text or list of names); sources with different headers record none."""
+        if header is None:
+            return
+        line = self._original_line(header)
+        if self.header is None:
+            self.header = line
+        elif line != self.header:
+            self._mixed_headers = True
+
+    def reject(self, line_num, reason, row, detail='', action='dropped'):
+        if self._writer is None:
+            self._out = open_file(self.path, 'w', encoding='utf-8-sig', newline='')
+            self._writer = csv.writer(self._out)
+            self._writer.writerow(QUARANTINE_COLUMNS)
+        self.counts[reason] += 1
+        self._writer.writerow([self.stage, line_num, reason, detail, action, self._original_line(row)])
+
+    def flag(self, line_num, reason, row, detail=''):
+        """Records a row the caller keeps in its output but that needs review."""
+        self.reject(line_num, reason, row, detail, action='kept')
+
+    @property
+    def counts_path(self):
+        return split_ext(self.path)[0] + '.counts.json'
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+    def close(self):
+        if self._out is None:
+            return
+        self._out.close()
+        with open(self.counts_path, 'w', encoding='utf-8') as f:
+            json.dump({'stage': self.stage, 'total': self.total, 'reasons': dict(self.counts),
+                       'header': None if self._mixed_headers else self.header}, f, ensure_ascii=False, indent=2)
+        print(f"Quarantined {self.total} rows to {self.path}:")
+        for reason, n in self.counts.most_common():
+            print(f"  {reason}: {n}")
+
+
+def extract_lines(rejects_csv, output_csv, reasons=None, stage=None):
+    """Writes the original lines of quarantined rows back out so they can be fixed and re-fed.
+
+    The source header, when the counts file recorded one, comes first.
+    """
+    count = 0
+    header = None
+    counts_path = split_ext(rejects_csv)[0] + '.counts.json'
+    if os.path.exists(counts_path):
+        with open(counts_path, 'r', encoding='utf-8') as f:
+            header = json.load(f).get('header')
+    with open_file(rejects_csv, 'r', encoding='utf-8-sig', newline='') as f, \
+         open_file(output_csv, 'w', encoding='utf-8', newline='') as out:
+        if header:
+            out.write(header + '\n')
+        for rec in csv.DictReader(f):
+            if reasons and rec['reason'] not in reasons:
+                continue
+            if stage and rec['stage'] != stage:
+                continue
+            out.write(rec['original_line'] + '\n')
+            count += 1
+    print(f"Extracted {count} quarantined lines to {output_csv}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract quarantined rows for fixing and re-feeding.")
+    parser.add_argument('rejects', help="*.rejects.csv written by a converter or validator")
+    parser.add_argument('output', help="CSV of original lines to fix and re-feed")
+    parser.add_argument('--reason', action='append', help="Only these reasons (repeatable)")
+    parser.add_argument('--stage', help="Only rows rejected by this stage")
+    args = parser.parse_args()
+    extract_lines(args.rejects, args.output, args.reason, args.stage)
@@ -0,0 +1,211 @@
+import argparse
+import csv
+import json
+import os
+from array import array
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+
+from compressed_io import open_file, split_ext
+from sql_dump import iter_insert_rows, iter_table_dicts
+
+CUSTOMERS_SOURCE = 'customers (8).sql'
+ORDERS_SOURCE = 'orders (4).sql'
+OUTPUT_SQL = 'customers_grade_updates.sql'
+
+# Same fallback ladder as calculate_customer_grade() in api/Services/CustomerStatsHelper.php
+DEFAULT_GRADES = [('A+', 100000.0), ('A', 80000.0), ('B', 50000.0), ('C', 30000.0), ('D', 0.0)]
+DEFAULT_SETTINGS = {'calc_mode': 'all', 'time_range_type': 'fixed', 'fixed_start_date': None,
+                    'fixed_end_date': None, 'relative_days': 365}
+
+# Column order of the headerless customer CSVs written by migrate_and_validate.py
+CUSTOMER_CSV_COLUMNS = {'customer_id': 0, 'company_id': 8, 'grade': 16}
+
+
+def load_grade_config(path, company_id):
+    """Reads grade thresholds and settings for one company.
+
+    Accepts the JSON returned by api/Customers/get_grades_config.php or a SQL
+    dump containing customer_grades_config / customer_grades_settings. The
+    JSON only holds its caller's company, so several companies are read from
+    a path template such as ``grades_{company_id}.json``; companies without a
+    file get the defaults, as in PHP.
+    Returns (grades sorted by min amount descending, settings).
+    """
+    grades = []
+    settings = dict(DEFAULT_SETTINGS)
+    if not path:
+        return DEFAULT_GRADES, settings
+
+    if path.lower().endswith('.json'):
+        if '{company_id}' in path:
+            path = path.replace('{company_id}', str(company_id))
+            if not os.path.exists(path):
+                return DEFAULT_GRADES, settings
+        with open(path, 'r', encoding='utf-8') as f:
+            payload = json.load(f)
+        for g in payload.get('data', []):
+            grades.append((g['grade_name'], float(g['min_order_amount'])))
+        settings.update(payload.get('settings') or {})
+    else:
+        for table, columns, row in iter_insert_rows(path, ['customer_grades_config', 'customer_grades_settings']):
+            if not columns:
+                continue
+            rec = dict(zip(columns, row))
+            if str(rec.get('company_id')) != str(company_id):
+                continue
+            if table == 'customer_grades_config':
+                grades.append((rec['grade_name'], float(rec['min_order_amount'] or 0)))
+            else:
+                settings.update({k: v for k, v in rec.items() if k in DEFAULT_SETTINGS})
+
+    if not grades:
+        grades = DEFAULT_GRADES
+    grades.sort(key=lambda g: g[1], reverse=True)
+    return grades, settings
+
+
+def order_filter(settings, as_of=None):
+    """Builds the order predicate recalculate_all_grades.php expresses in SQL.
+
+    ``order_status != 'Cancelled'`` is never true for NULL in SQL, so orders
+    without a status are left out as well.
+    """
+    mode = settings.get('calc_mode') or 'all'
+    if mode == 'all':
+        return lambda o: o.get('order_status') not in (None, 'Cancelled')
+
+    if (settings.get('time_range_type') or 'fixed') == 'fixed':
+        start = settings.get('fixed_start_date') or '1970-01-01'
+        end = (settings['fixed_end_date'] + ' 23:59:59') if settings.get('fixed_end_date') else '2099-12-31 23:59:59'
+    else:
+        today = as_of or date.today()
+        start = (today - timedelta(days=int(settings.get('relative_days') or 365))).strftime('%Y-%m-%d')
+        end = '9999-12-31 23:59:59'
+
+    if mode == 'delivery_date':
+        return lambda o: o.get('order_status') == 'Delivered' and start <= (o.get('delivery_date') or '') <= end
+    return lambda o: (o.get('order_status') not in (None, 'Cancelled')
+                      and start <= (o.get('order_date') or '') <= end)
+
+
+def iter_customers(path):
+    """Yields (customer_id, company_id, current grade) from a customers dump or CSV."""
+    if split_ext(path)[1].lower().startswith('.sql'):
+        for rec in iter_table_dicts(path, 'customers'):
+            yield rec['customer_id'], rec.get('company_id'), rec.get('grade')
+        return
+    with open_file(path, 'r', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        idx = CUSTOMER_CSV_COLUMNS
+        for row in reader:
+            if not row or row[0] in ('id', 'customer_id'):
+                continue
+            yield row[idx['customer_id']], row[idx['company_id']], row[idx['grade']]
+
+
+def sum_purchases(orders_path, company_id, accept):
+    """customer_id -> SUM(total_amount) over accepted orders of one company."""
+    totals = {}
+    for o in iter_table_dicts(orders_path, 'orders'):
+        if str(o.get('company_id')) != str(company_id) or not o.get('customer_id') or not accept(o):
+            continue
+        cid = o['customer_id']
+        totals[cid] = totals.get(cid, 0.0) + float(o.get('total_amount') or 0)
+    return totals
+
+
+def assign_grades(totals, grades):
+    """Grades a column of totals in one pass over sorted thresholds."""
+    ascending = sorted(grades, key=lambda g: g[1])
+    thresholds = [g[1] for g in ascending]
+    names = [g[0] for g in ascending]
+    lowest = names[0]
+    out = []
+    for t in totals:
+        i = bisect_right(thresholds, t) - 1
+        out.append(names[i] if i >= 0 else lowest)
+    return out
+
+
+def write_updates(out, changes, mode, batch_size):
+    """changes: grade -> list of customer ids. One UPDATE per grade per batch."""
+    if mode == 'temp':
+        out.write("CREATE TEMPORARY TABLE `tmp_customer_grades` (`customer_id` INT NOT NULL PRIMARY KEY, "
+                  "`grade` VARCHAR(255) NOT NULL) ENGINE=InnoDB;\n\n")
+    out.write("START TRANSACTION;\n\n")
+    for grade, ids in changes.items():
+        safe_grade = grade.replace('\\', '\\\\').replace("'", "''")
+        for i in range(0, len(ids), batch_size):
+            chunk = ids[i:i + batch_size]
+            if mode == 'temp':
+                values = ",".join(f"({cid},'{safe_grade}')" for cid in chunk)
+                out.write(f"INSERT INTO `tmp_customer_grades` (`customer_id`, `grade`) VALUES {values};\n")
+            else:
+                out.write(f"UPDATE `customers` SET `grade` = '{safe_grade}' WHERE `customer_id` IN ({','.join(chunk)});\n")
+    if mode == 'temp':
+        out.write("\nUPDATE `customers` c JOIN `tmp_customer_grades` t ON t.`customer_id` = c.`customer_id` "
+                  "SET c.`grade` = t.`grade`;\n")
+    out.write("\nCOMMIT;\n")
+    if mode == 'temp':
+        out.write("DROP TEMPORARY TABLE `tmp_customer_grades`;\n")
+
+
+def recalculate(company_id, customers_path=CUSTOMERS_SOURCE, orders_path=ORDERS_SOURCE, config_path=None,
+                output_sql=OUTPUT_SQL, mode='in', batch_size=5000, as_of=None, only_changed=True):
+    for path in (customers_path, orders_path):
+        if not os.path.exists(path):
+            print(f"Error: {path} not found")
+            return
+
+    grades, settings = load_grade_config(config_path, company_id)
+    print(f"Grades: {', '.join(f'{n}>={m:g}' for n, m in grades)} (calc_mode={settings.get('calc_mode')})")
+
+    print(f"Summing purchases from {orders_path}...")
+    totals_by_customer = sum_purchases(orders_path, company_id, order_filter(settings, as_of))
+
+    # Columnar layout: parallel arrays of ids, totals and current grades
+    ids = []
+    current = []
+    totals = array('d')
+    for cid, cid_company, grade in iter_customers(customers_path):
+        if str(cid_company) != str(company_id) or not str(cid).isdigit():
+            continue
+        ids.append(cid)
+        current.append(grade)
+        totals.append(totals_by_customer.get(cid, 0.0))
+    print(f"Grading {len(ids)} customers of company {company_id}...")
+
+    new_grades = assign_grades(totals, grades)
+
+    changes = {}
+    for cid, old, new in zip(ids, current, new_grades):
+        if only_changed and old == new:
+            continue
+        changes.setdefault(new, []).append(cid)
+    changed = sum(len(v) for v in changes.values())
+
+    with open_file(output_sql, 'w', encoding='utf-8') as out:
+        write_updates(out, changes, mode, batch_size)
+
+    for name, _ in grades:
+        print(f"  {name}: {new_grades.count(name)} customers")
+    print(f"Done. {changed} grade changes written to {output_sql}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline bulk customer grade recalculation.")
+    parser.add_argument('company_id', type=int)
+    parser.add_argument('--customers', default=CUSTOMERS_SOURCE, help="customers SQL dump or migrated customer CSV")
+    parser.add_argument('--orders', default=ORDERS_SOURCE, help="orders SQL dump")
+    parser.add_argument('--config', help="get_grades_config.php JSON or a dump with customer_grades_config")
+    parser.add_argument('--output', default=OUTPUT_SQL)
+    parser.add_argument('--mode', choices=['in', 'temp'], default='in',
+                        help="in: one UPDATE per grade per batch, temp: staged temp table + one join update")
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--as-of', help="Reference date (YYYY-MM-DD) for relative time ranges")
+    parser.add_argument('--all', action='store_true', help="Emit every customer, not only changed grades")
+    args = parser.parse_args()
+    as_of = datetime.strptime(args.as_of, '%Y-%m-%d').date() if args.as_of else None
+    recalculate(args.company_id, args.customers, args.orders, args.config, args.output,
+                args.mode, args.batch_size, as_of, not args.all)
@@ -0,0 +1,415 @@
+import argparse
+import csv
+import re
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+
+from compressed_io import open_file, split_ext
+from sql_dump import iter_table_dicts
+
+STATEMENTS_OUTPUT = 'statement_matches.csv'
+
+# Auto-match rules of FinanceApprovalPage autoMatchRows: same bank, same amount, within a minute
+AUTO_MATCH_SECONDS = 60
+# cod_documents count as matched at the "exact" level of buildStatementCandidates
+COD_AMOUNT_TOLERANCE = 1.00
+COD_MATCH_SECONDS = 300
+# Suggestion window for rows left to the finance team (CANDIDATE_TIME_SEC / CANDIDATE_AMOUNT_DIFF)
+SUGGEST_SECONDS = 1800
+SUGGEST_AMOUNT_DIFF = 500
+
+CLOSED_ORDER_STATUSES = {'Cancelled', 'Returned'}
+
+MATCH_COLUMNS = ['statement_log_id', 'order_id', 'reconcile_type', 'statement_amount', 'confirmed_amount',
+                 'auto_matched', 'confirmed_payment_method', 'match_rule', 'cod_document_id', 'time_diff']
+UNMATCHED_COLUMNS = ['statement_log_id', 'transfer_at', 'amount', 'bank_account_id', 'description',
+                     'suggested_order_id', 'suggested_score', 'amount_diff', 'time_diff']
+
+# Order numbers and COD document numbers quoted in transfer descriptions
+_RE_REFERENCE = re.compile(r'[A-Za-z0-9][A-Za-z0-9-]{5,}')
+_RE_SUB_ORDER = re.compile(r'-\d+$')
+
+
+def load_rows(path, table):
+    """Rows of ``table`` from a SQL dump, or of a CSV export with the table's column names."""
+    if split_ext(path)[1].lower().startswith('.sql'):
+        return list(iter_table_dicts(path, table))
+    with open_file(path, 'r', encoding='utf-8-sig', newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def present(val):
+    return val is not None and val != '' and str(val).upper() != 'NULL'
+
+
+def to_cents(val):
+    return int(round(float(val) * 100)) if present(val) else None
+
+
+def to_seconds(val):
+    if not present(val):
+        return None
+    try:
+        return datetime.fromisoformat(str(val)[:19]).timestamp()
+    except ValueError:
+        return None
+
+
+def to_int(val):
+    return int(val) if present(val) else None
+
+
+class Candidate:
+    """Something a statement line can pay: an order slip, an order as a whole, or a COD document."""
+    __slots__ = ('kind', 'key', 'order_id', 'cents', 'ts', 'bank')
+
+    def __init__(self, kind, key, order_id, cents, ts, bank):
+        self.kind = kind
+        self.key = key
+        self.order_id = order_id
+        self.cents = cents
+        self.ts = ts
+        self.bank = bank
+
+
+class ExactIndex:
+    """(bank, amount in satang) -> candidates sorted by time, for the same-amount time window."""
+
+    def __init__(self, candidates):
+        groups = {}
+        for c in candidates:
+            if c.bank is not None and c.cents is not None and c.ts is not None:
+                groups.setdefault((c.bank, c.cents), []).append(c)
+        self.groups = {}
+        for key, group in groups.items():
+            group.sort(key=lambda c: c.ts)
+            self.groups[key] = ([c.ts for c in group], group)
+
+    def nearest(self, bank, cents, ts, seconds, used, open_amounts=None):
+        """Closest unused candidate in time; with ``open_amounts`` its order must still owe ``cents``."""
+        entry = self.groups.get((bank, cents))
+        if entry is None:
+            return None
+        times, group = entry
+        best = None
+        for i in range(bisect_left(times, ts - seconds), bisect_right(times, ts + seconds)):
+            c = group[i]
+            if c.key in used:
+                continue
+            if open_amounts is not None and open_amounts.get(c.order_id, 0) < cents - 1:
+                continue
+            if best is None or abs(c.ts - ts) < abs(best.ts - ts):
+                best = c
+        return best
+
+
+class ToleranceIndex:
+    """bank -> candidates sorted by amount, for amount windows of +-tolerance."""
+
+    def __init__(self, candidates):
+        groups = {}
+        for c in candidates:
+            if c.bank is not None and c.cents is not None and c.ts is not None:
+                groups.setdefault(c.bank, []).append(c)
+        self.groups = {}
+        for bank, group in groups.items():
+            group.sort(key=lambda c: c.cents)
+            self.groups[bank] = ([c.cents for c in group], group)
+
+    def best(self, bank, cents, ts, tolerance_cents, seconds, used):
+        entry = self.groups.get(bank)
+        if entry is None:
+            return None
+        amounts, group = entry
+        best, best_score = None, None
+        for i in range(bisect_left(amounts, cents - tolerance_cents), bisect_right(amounts, cents + tolerance_cents)):
+            c = group[i]
+            time_diff = abs(c.ts - ts)
+            if c.key in used or time_diff > seconds:
+                continue
+            score = abs(c.cents - cents) + time_diff
+            if best is None or score < best_score:
+                best, best_score = c, score
+        return best
+
+
+class DayBuckets:
+    """Calendar day -> candidates sorted by amount, for suggestions on unmatched lines."""
+
+    def __init__(self, candidates):
+        buckets = {}
+        for c in candidates:
+            if c.cents is not None and c.ts is not None:
+                buckets.setdefault(int(c.ts // 86400), []).append(c)
+        self.buckets = {}
+        for day, group in buckets.items():
+            group.sort(key=lambda c: c.cents)
+            self.buckets[day] = ([c.cents for c in group], group)
+
+    def suggest(self, bank, cents, ts):
+        """Best candidate by the FinanceApprovalPage score, or (None, None)."""
+        best, best_score = None, None
+        window = SUGGEST_AMOUNT_DIFF * 100
+        day = int(ts // 86400)
+        for d in (day - 1, day, day + 1):
+            entry = self.buckets.get(d)
+            if entry is None:
+                continue
+            amounts, group = entry
+            for i in range(bisect_left(amounts, cents - window), bisect_right(amounts, cents + window)):
+                c = group[i]
+                time_diff = abs(c.ts - ts)
+                if time_diff > SUGGEST_SECONDS:
+                    continue
+                bank_penalty = 1 if bank is not None and c.bank is not None and bank != c.bank else 0
+                score = abs(c.cents - cents) + min(time_diff, SUGGEST_SECONDS) + bank_penalty * 10000
+                if best is None or score < best_score:
+                    best, best_score = c, score
+        return best, best_score
+
+
+def order_candidates(orders, slips_by_order, reconciled):
+    """Slip and whole-order candidates of open transfer orders, as loaded by reconcile_list.php."""
+    slip_candidates, order_cands, open_amounts = [], [], {}
+    for o in orders:
+        order_id = o['id']
+        slips = slips_by_order.get(order_id, [])
+        slip_total = sum(to_cents(s.get('amount')) or 0 for s in slips)
+        total = to_cents(o.get('total_amount')) or 0
+        if o.get('order_status') in CLOSED_ORDER_STATUSES:
+            continue
+        if o.get('payment_method') != 'Transfer' and slip_total <= 0:
+            continue
+        done = reconciled.get(order_id, 0)
+        if done >= total - 1:
+            continue
+        open_amounts[order_id] = total - done
+
+        for i, s in enumerate(slips):
+            slip_candidates.append(Candidate('slip', (order_id, i), order_id, to_cents(s.get('amount')),
+                                             to_seconds(s.get('transfer_date')), to_int(s.get('bank_account_id'))))
+        paid = to_cents(o.get('amount_paid')) or 0
+        amount = slip_total if slip_total > 0 else paid if paid > 0 else total
+        slip_dates = [s['transfer_date'] for s in slips if present(s.get('transfer_date'))]
+        slip_banks = [to_int(s.get('bank_account_id')) for s in slips if present(s.get('bank_account_id'))]
+        ts = to_seconds(max(slip_dates)) if slip_dates else to_seconds(o.get('transfer_date'))
+        bank = to_int(o.get('bank_account_id'))
+        if bank is None and slip_banks:
+            bank = max(slip_banks)
+        order_cands.append(Candidate('order', order_id, order_id, amount, ts, bank))
+    return slip_candidates, order_cands, open_amounts
+
+
+def cod_candidates(documents, company_id=None):
+    cands = []
+    for d in documents:
+        if d.get('status', 'pending') != 'pending' or present(d.get('matched_statement_log_id')):
+            continue
+        if company_id is not None and str(d.get('company_id')) != str(company_id):
+            continue
+        cands.append(Candidate('cod', ('cod', d['id']), None, to_cents(d.get('total_input_amount')),
+                               to_seconds(d.get('document_datetime')), to_int(d.get('bank_account_id'))))
+    return cands
+
+
+def allocate_cod(statement_cents, records):
+    """Splits a COD statement over its records' parent orders in proportion to cod_amount.
+
+    Mirrors cod_reconcile_save.php: records without order_id are skipped and
+    the last order absorbs the rounding difference. Returns (order_id, cents).
+    """
+    records = [r for r in records if present(r.get('order_id')) and str(r['order_id']).strip()]
+    if not records:
+        return []
+    total = sum(to_cents(r.get('cod_amount')) or 0 for r in records)
+    by_parent = {}
+    for r in records:
+        parent = _RE_SUB_ORDER.sub('', str(r['order_id']).strip())
+        share = (to_cents(r.get('cod_amount')) or 0) / total if total else 1 / len(records)
+        by_parent[parent] = by_parent.get(parent, 0) + round(statement_cents * share)
+    allocations = list(by_parent.items())
+    last_order, last_cents = allocations[-1]
+    allocations[-1] = (last_order, last_cents + statement_cents - sum(c for _, c in allocations))
+    return allocations
+
+
+class StatementMatcher:
+    """Auto-matches statement lines to open orders and COD documents in O(n log n).
+
+    Each statement line, in transfer time order, takes the first of:
+    an unused order slip with the same bank and amount within a minute, the
+    order as a whole under the same rule, a pending COD document within the
+    tolerance window, or the single open order whose number appears in the
+    description with exactly the open amount. Everything else is left with
+    the best suggestion for manual review.
+    """
+
+    def __init__(self, orders, slips=(), cod_documents=(), cod_records=(), reconcile_logs=(), company_id=None):
+        if company_id is not None:
+            orders = [o for o in orders if str(o.get('company_id')) == str(company_id)]
+        slips_by_order = {}
+        for s in slips:
+            slips_by_order.setdefault(s['order_id'], []).append(s)
+        self.reconciled_statements = set()
+        reconciled = {}
+        for log in reconcile_logs:
+            self.reconciled_statements.add(str(log['statement_log_id']))
+            if present(log.get('order_id')):
+                reconciled[log['order_id']] = reconciled.get(log['order_id'], 0) + (to_cents(log.get('confirmed_amount')) or 0)
+        self.cod_records = {}
+        for r in cod_records:
+            if present(r.get('document_id')):
+                self.cod_records.setdefault(str(r['document_id']), []).append(r)
+
+        slip_cands, order_cands, self.open_amounts = order_candidates(orders, slips_by_order, reconciled)
+        cod_cands = cod_candidates(cod_documents, company_id)
+        self.slip_index = ExactIndex(slip_cands)
+        self.order_index = ExactIndex(order_cands)
+        self.cod_index = ToleranceIndex(cod_cands)
+        self.suggestions = DayBuckets(slip_cands + order_cands)
+        self.references = {}
+        for order_id in self.open_amounts:
+            self.references.setdefault(order_id, set()).add(order_id)
+            self.references.setdefault(_RE_SUB_ORDER.sub('', order_id), set()).add(order_id)
+        self.used = set()
+        self.counts = {'slip': 0, 'order': 0, 'cod': 0, 'reference': 0, 'unmatched': 0, 'already_reconciled': 0}
+
+    def _take(self, order_id, cents):
+        """Books ``cents`` against an order: its open amount drops and the whole-order candidate is spent.
+
+        Remaining slips of the order stay available while the order still
+        owes their amount, so an order is never reconciled above its total.
+        """
+        self.open_amounts[order_id] -= cents
+        self.used.add(order_id)
+
+    def match_reference(self, description, cents):
+        for token in _RE_REFERENCE.findall(description or ''):
+            order_ids = self.references.get(token)
+            if not order_ids or len(order_ids) != 1:
+                continue
+            order_id = next(iter(order_ids))
+            if order_id not in self.used and self.open_amounts[order_id] == cents:
+                return order_id
+        return None
+
+    def match(self, statements):
+        """Yields ('matched', rows) or ('unmatched', row) per statement line."""
+        lines = []
+        for s in statements:
+            if str(s['id']) in self.reconciled_statements:
+                self.counts['already_reconciled'] += 1
+                continue
+            lines.append((to_seconds(s.get('transfer_at')) or 0, s))
+        lines.sort(key=lambda x: x[0])
+
+        for ts, s in lines:
+            cents = to_cents(s.get('amount')) or 0
+            bank = to_int(s.get('bank_account_id'))
+            amount = f"{cents / 100:.2f}"
+            c = self.slip_index.nearest(bank, cents, ts, AUTO_MATCH_SECONDS, self.used, self.open_amounts)
+            if c is None:
+                c = self.order_index.nearest(bank, cents, ts, AUTO_MATCH_SECONDS, self.used, self.open_amounts)
+            if c is not None:
+                self.used.add(c.key)
+                self._take(c.order_id, cents)
+                self.counts[c.kind] += 1
+                yield 'matched', [[s['id'], c.order_id, 'Order', amount, amount, 1, 'Transfer', c.kind, '',
+                                   f"{abs(c.ts - ts):.0f}"]]
+                continue
+            c = self.cod_index.best(bank, cents, ts, round(COD_AMOUNT_TOLERANCE * 100), COD_MATCH_SECONDS, self.used)
+            if c is not None:
+                allocations = allocate_cod(cents, self.cod_records.get(str(c.key[1]), []))
+                if allocations:
+                    self.used.add(c.key)
+                    self.counts['cod'] += 1
+                    yield 'matched', [[s['id'], order_id, 'Order', amount, f"{share / 100:.2f}", 1, 'COD', 'cod',
+                                       c.key[1], f"{abs(c.ts - ts):.0f}"] for order_id, share in allocations]
+                    continue
+            order_id = self.match_reference(s.get('description'), cents)
+            if order_id is not None:
+                self._take(order_id, cents)
+                self.counts['reference'] += 1
+                yield 'matched', [[s['id'], order_id, 'Order', amount, amount, 1, 'Transfer', 'reference', '', '']]
+                continue
+            self.counts['unmatched'] += 1
+            best, score = self.suggestions.suggest(bank, cents, ts)
+            yield 'unmatched', [s['id'], s.get('transfer_at'), amount, s.get('bank_account_id') or '',
+                                s.get('description') or '', best.order_id if best else '',
+                                f"{score:.0f}" if best else '',
+                                f"{abs(best.cents - cents) / 100:.2f}" if best else '',
+                                f"{abs(best.ts - ts):.0f}" if best else '']
+
+
+def reconcile(statements_path, orders_path, slips_path=None, cod_documents_path=None, cod_records_path=None,
+              reconcile_logs_path=None, output=STATEMENTS_OUTPUT, unmatched_output=None, company_id=None,
+              start_date=None, end_date=None):
+    started = datetime.now()
+    statements = load_rows(statements_path, 'statement_logs')
+    if start_date or end_date:
+        # Same day bounds as reconcile_list.php normalize_date
+        start = f"{start_date} 00:00:00" if start_date else ''
+        end = f"{end_date} 23:59:59" if end_date else '9999'
+        statements = [s for s in statements if start <= str(s.get('transfer_at') or '') <= end]
+    orders = load_rows(orders_path, 'orders')
+    if start_date or end_date:
+        # Orders transferred a day either side of the range are still candidates
+        lo = str(datetime.fromisoformat(start_date) - timedelta(days=1)) if start_date else ''
+        hi = str(datetime.fromisoformat(end_date) + timedelta(days=2)) if end_date else '9999'
+        orders = [o for o in orders if not present(o.get('transfer_date')) or lo <= str(o['transfer_date']) <= hi]
+    matcher = StatementMatcher(
+        orders,
+        load_rows(slips_path, 'order_slips') if slips_path else (),
+        load_rows(cod_documents_path, 'cod_documents') if cod_documents_path else (),
+        load_rows(cod_records_path, 'cod_records') if cod_records_path else (),
+        load_rows(reconcile_logs_path, 'statement_reconcile_logs') if reconcile_logs_path else (),
+        company_id,
+    )
+    print(f"Loaded {len(statements)} statement lines, {len(matcher.open_amounts)} open orders "
+          f"in {(datetime.now() - started).total_seconds():.1f}s")
+
+    if unmatched_output is None:
+        unmatched_output = split_ext(output)[0] + '.unmatched.csv'
+    with open_file(output, 'w', encoding='utf-8-sig', newline='') as f, \
+         open_file(unmatched_output, 'w', encoding='utf-8-sig', newline='') as uf:
+        matches = csv.writer(f)
+        matches.writerow(MATCH_COLUMNS)
+        unmatched = csv.writer(uf)
+        unmatched.writerow(UNMATCHED_COLUMNS)
+        for status, rows in matcher.match(statements):
+            if status == 'matched':
+                matches.writerows(rows)
+            else:
+                unmatched.writerow(rows)
+
+    c = matcher.counts
+    print(f"Auto-matched {c['slip'] + c['order'] + c['cod'] + c['reference']} lines "
+          f"(slip {c['slip']}, order {c['order']}, cod {c['cod']}, reference {c['reference']}) -> {output}")
+    print(f"Unmatched {c['unmatched']} lines -> {unmatched_output}"
+          + (f"; skipped {c['already_reconciled']} already reconciled" if c['already_reconciled'] else ""))
+    print(f"Done in {(datetime.now() - started).total_seconds():.1f}s")
+    return c
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Auto-match bank statement lines to transfer orders and COD documents.")
+    parser.add_argument('--dump', help="SQL dump holding every table below (individual options override it)")
+    parser.add_argument('--statements', help="statement_logs dump or CSV")
+    parser.add_argument('--orders', help="orders dump or CSV")
+    parser.add_argument('--slips', help="order_slips dump or CSV")
+    parser.add_argument('--cod-documents', help="cod_documents dump or CSV")
+    parser.add_argument('--cod-records', help="cod_records dump or CSV")
+    parser.add_argument('--reconciled', help="statement_reconcile_logs dump or CSV (already matched lines)")
+    parser.add_argument('--company-id', type=int)
+    parser.add_argument('--start-date', help="YYYY-MM-DD")
+    parser.add_argument('--end-date', help="YYYY-MM-DD")
+    parser.add_argument('--output', default=STATEMENTS_OUTPUT, help="auto_matched rows (statement_reconcile_logs columns)")
+    parser.add_argument('--unmatched', help="Residue with suggestions (default: <output>.unmatched.csv)")
+    args = parser.parse_args()
+    statements = args.statements or args.dump
+    orders = args.orders or args.dump
+    if not statements or not orders:
+        parser.error("--statements and --orders (or --dump) are required")
+    reconcile(statements, orders, args.slips or args.dump, args.cod_documents or args.dump,
+              args.cod_records or args.dump, args.reconciled or args.dump, args.output, args.unmatched,
+              args.company_id, args.start_date, args.end_date)
@@ -0,0 +1,89 @@
+import argparse
+import os
+import zlib
+
+NEW_ROW = None
+
+
+def _column_hashes(values):
+    return [zlib.crc32(v.encode('utf-8')) for v in values]
+
+
+class RowHashSidecar:
+    """Per-row content hashes from the previous run, kept next to the SQL output.
+
+    Each line holds ``pk<TAB>row hash<TAB>column hashes``; row hashes let
+    unchanged rows be skipped outright, column hashes tell which columns of a
+    changed row need updating.
+
+    ``save`` only writes ``<path>.pending``: the SQL it describes is not loaded
+    yet, and a load that fails or stops partway must not make the next run
+    treat its rows as unchanged. ``commit`` promotes the pending file once the
+    load is confirmed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.pending_path = pending_path(path)
+        self.previous = {}
+        self.current = {}
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    pk, row_hash, col_hashes = line.rstrip('\n').split('\t')
+                    self.previous[pk] = (row_hash, col_hashes)
+        self.unchanged = 0
+        self.changed = 0
+        self.new = 0
+
+    def diff(self, pk, values):
+        """Returns False if the row is unchanged, NEW_ROW for an unseen pk, else changed column indices."""
+        col_hashes = _column_hashes(values)
+        col_str = ','.join(format(h, 'x') for h in col_hashes)
+        row_hash = format(zlib.crc32(col_str.encode('ascii')), 'x')
+        self.current[pk] = (row_hash, col_str)
+
+        prev = self.previous.get(pk)
+        if prev is None:
+            self.new += 1
+            return NEW_ROW
+        if prev[0] == row_hash and prev[1] == col_str:
+            self.unchanged += 1
+            return False
+        prev_cols = prev[1].split(',')
+        self.changed += 1
+        if len(prev_cols) != len(col_hashes):
+            return NEW_ROW
+        return tuple(i for i, h in enumerate(col_hashes) if format(h, 'x') != prev_cols[i])
+
+    def save(self):
+        tmp_path = self.pending_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            # Rows absent from this run keep their previous state
+            for pk, (row_hash, col_str) in self.previous.items():
+                if pk not in self.current:
+                    f.write(f"{pk}\t{row_hash}\t{col_str}\n")
+            for pk, (row_hash, col_str) in self.current.items():
+                f.write(f"{pk}\t{row_hash}\t{col_str}\n")
+        os.replace(tmp_path, self.pending_path)
+
+
+def pending_path(path):
+    return path + '.pending'
+
+
+def commit(path):
+    """Makes the pending hashes of ``path`` current; False if there were none."""
+    if not os.path.exists(pending_path(path)):
+        return False
+    os.replace(pending_path(path), path)
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Commit the row hashes of an upsert run once its SQL is loaded.")
+    parser.add_argument('sidecar', help="Row-hash file (<output>.hashes)")
+    args = parser.parse_args()
+    if not commit(args.sidecar):
+        raise SystemExit(f"No pending row hashes for {args.sidecar}")
+    print(f"Row hashes committed to {args.sidecar}")
@@ -0,0 +1,396 @@
+"""Byte-offset sidecar index for random access into large CSV exports.
+
+One pass over ``export.csv`` writes ``export.csv.rowidx``: the start offset
+and first physical line of every record, plus, for each key column, the
+record numbers sorted by a 64-bit hash of the normalized key. Lookups
+memory-map both files and binary-search the hashes, so fetching a customer
+out of a 2 GB export parses only that customer's rows:
+
+    python row_index.py build orders-raw_2026-01.csv --key เลขคำสั่งซื้อ --key เบอร์โทรลูกค้า:phone
+    python row_index.py get orders-raw_2026-01.csv เบอร์โทรลูกค้า "081-234-5678"
+    python row_index.py build customers.csv --layout customers --key customer_id --key phone:phone
+    python row_index.py slice customers.csv 150000 150010
+    python row_index.py line customers.csv 48213
+
+``line`` maps a quarantine ``line_num`` (the physical line a record ends on,
+as csv.reader counts it) back to its record.
+"""
+import argparse
+import csv
+import hashlib
+import io
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_right
+
+from compressed_io import codec_for
+from csv_reader import parse_line
+from phone_utils import normalize_thai_phone
+
+MAGIC = b'ROWIDX1\n'
+SUFFIX = '.rowidx'
+
+NORMALIZERS = {
+    'strip': lambda v: v.strip(),
+    'phone': normalize_thai_phone,
+    'lower': lambda v: v.strip().lower(),
+}
+
+
+def layout_columns(layout):
+    """Column names for headerless layouts of the toolkit."""
+    if layout == 'customers':
+        from convert_csv_to_sql_v4 import COLUMNS
+        return list(COLUMNS)
+    raise KeyError(f"Unknown layout {layout!r}")
+
+
+def index_path(path):
+    return path + SUFFIX
+
+
+def key_hash(value):
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def parse_key_spec(spec):
+    """'column' or 'column:normalizer' -> (column, normalizer)."""
+    column, _, normalizer = spec.rpartition(':')
+    if not column or normalizer not in NORMALIZERS:
+        column, normalizer = spec, 'strip'
+    return column, normalizer
+
+
+def _iter_records(f):
+    """Yields (offset, first line, record bytes) of each record of a binary CSV."""
+    offset = 0
+    line_num = 0
+    pending = None
+    for line in f:
+        line_num += 1
+        if pending is None:
+            start, start_line, parts = offset, line_num, [line]
+            quotes = line.count(b'"')
+        else:
+            parts = pending
+            parts.append(line)
+            quotes += line.count(b'"')
+        offset += len(line)
+        if quotes % 2:
+            # Quoted field continues on the next line
+            pending = parts
+            continue
+        pending = None
+        yield start, start_line, parts[0] if len(parts) == 1 else b''.join(parts)
+    if pending is not None:
+        yield start, start_line, b''.join(pending)
+
+
+def build_index(path, keys=(), has_header=True, columns=None, encoding='utf-8-sig'):
+    """Scans ``path`` once and writes its ``.rowidx`` sidecar.
+
+    ``keys`` are 'column' or 'column:normalizer' specs (normalizers: strip,
+    phone, lower); columns are header names, names from ``columns`` for
+    headerless files, or 0-based positions.
+    """
+    if codec_for(path):
+        raise ValueError(f"{path}: byte offsets need an uncompressed file; decompress it first")
+    specs = [parse_key_spec(k) for k in keys]
+    st = os.stat(path)
+    offsets = array('Q')
+    lines = array('Q')
+    key_entries = [[] for _ in specs]
+    header = None
+    with open(path, 'rb') as f:
+        records = _iter_records(f)
+        if has_header:
+            first = next(records, None)
+            if first is not None:
+                header = [h.strip() for h in parse_line(first[2].decode(encoding).rstrip('\r\n'))]
+        names = header or columns or []
+        indices = []
+        for column, _ in specs:
+            if column in names:
+                indices.append(names.index(column))
+            elif column.isdigit():
+                indices.append(int(column))
+            else:
+                raise KeyError(f"Column {column!r} not in {'header' if header else 'columns'}")
+        normalizers = [NORMALIZERS[n] for _, n in specs]
+        last = max(indices) if indices else -1
+        # utf-8-sig only strips a BOM at the very start, i.e. from the first record
+        decode = encoding
+        row = 0
+        for offset, line_num, record in records:
+            text = record.rstrip(b'\r\n')
+            if not text:
+                continue
+            offsets.append(offset)
+            lines.append(line_num)
+            if indices:
+                if b'"' in text:
+                    fields = parse_line(text.decode(decode, 'replace'))
+                else:
+                    fields = text.split(b',', last + 1)
+                for k, i in enumerate(indices):
+                    if i < len(fields):
+                        value = fields[i]
+                        if isinstance(value, bytes):
+                            value = value.decode(decode, 'replace')
+                        value = normalizers[k](value)
+                        if value:
+                            # Hash in the high bits, record number below: one int sort keeps
+                            # equal keys together and their records in file order
+                            key_entries[k].append(key_hash(value) << 40 | row)
+            row += 1
+        offsets.append(st.st_size)
+
+    sections = {}
+    blobs = []
+    position = 0
+
+    def add(blob):
+        nonlocal position
+        blobs.append(blob)
+        start = position
+        position += len(blob)
+        return start
+
+    sections['offsets'] = [add(offsets.tobytes()), len(offsets)]
+    sections['lines'] = [add(lines.tobytes()), len(lines)]
+    meta_keys = {}
+    for (column, normalizer), entries in zip(specs, key_entries):
+        entries.sort()
+        pairs = array('Q')
+        for e in entries:
+            pairs.append(e >> 40)
+            pairs.append(e & 0xFFFFFFFFFF)
+        meta_keys[column] = {'normalizer': normalizer, 'section': [add(pairs.tobytes()), len(entries)]}
+    sections['keys'] = meta_keys
+
+    meta = json.dumps({
+        'source_size': st.st_size,
+        'source_mtime_ns': st.st_mtime_ns,
+        'encoding': encoding,
+        'header': header,
+        'columns': None if header else columns,
+        'rows': len(lines),
+        'sections': sections,
+    }, ensure_ascii=False).encode('utf-8')
+    # Sections start 8-byte aligned so they can be cast to uint64 in place
+    pad = -(len(MAGIC) + 4 + len(meta)) % 8
+    out_path = index_path(path)
+    tmp_path = out_path + '.tmp'
+    with open(tmp_path, 'wb') as out:
+        out.write(MAGIC)
+        out.write(struct.pack('<I', len(meta) + pad))
+        out.write(meta + b' ' * pad)
+        for blob in blobs:
+            out.write(blob)
+    os.replace(tmp_path, out_path)
+    print(f"Indexed {len(lines)} rows of {path}" + (f" by {', '.join(c for c, _ in specs)}" if specs else '')
+          + f" -> {out_path}", file=sys.stderr)
+    return out_path
+
+
+class RowIndex:
+    """Memory-mapped view of a CSV and its ``.rowidx``; rows come back as parsed lists."""
+
+    def __init__(self, path):
+        self.path = path
+        self._index_file = open(index_path(path), 'rb')
+        self._index = mmap.mmap(self._index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._index[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{index_path(path)} is not a row index")
+        meta_len = struct.unpack_from('<I', self._index, len(MAGIC))[0]
+        base = len(MAGIC) + 4
+        self.meta = json.loads(self._index[base:base + meta_len].decode('utf-8'))
+        self._base = base + meta_len
+        st = os.stat(path)
+        if st.st_size != self.meta['source_size'] or st.st_mtime_ns != self.meta['source_mtime_ns']:
+            self.close()
+            raise ValueError(f"{index_path(path)} is stale: {path} changed since it was built")
+        self._source_file = open(path, 'rb')
+        self._source = (mmap.mmap(self._source_file.fileno(), 0, access=mmap.ACCESS_READ)
+                        if st.st_size else b'')
+        self.header = self.meta['header']
+        self.columns = self.header or self.meta['columns']
+        self.encoding = self.meta['encoding']
+        sections = self.meta['sections']
+        self._offsets = self._uint64(*sections['offsets'])
+        self._lines = self._uint64(*sections['lines'])
+        self._keys = {column: (k['normalizer'], self._uint64(k['section'][0], k['section'][1] * 2))
+                      for column, k in sections['keys'].items()}
+
+    def _uint64(self, start, count):
+        start += self._base
+        return memoryview(self._index)[start:start + count * 8].cast('Q')
+
+    def __len__(self):
+        return self.meta['rows']
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for name in ('_offsets', '_lines'):
+            view = self.__dict__.pop(name, None)
+            if view is not None:
+                view.release()
+        for _, view in self.__dict__.pop('_keys', {}).values():
+            view.release()
+        for name in ('_source', '_index'):
+            m = self.__dict__.pop(name, None)
+            if isinstance(m, mmap.mmap):
+                m.close()
+        for name in ('_source_file', '_index_file'):
+            f = self.__dict__.pop(name, None)
+            if f is not None:
+                f.close()
+
+    @property
+    def keys(self):
+        return list(self._keys)
+
+    def offset(self, row):
+        """Byte offset where record ``row`` (0-based, header excluded) starts."""
+        return self._offsets[row]
+
+    def raw(self, row):
+        return self._source[self._offsets[row]:self._offsets[row + 1]].decode(self.encoding, 'replace')
+
+    def row(self, row):
+        return parse_line(self.raw(row).rstrip('\r\n'))
+
+    def slice(self, start, stop=None):
+        """Parsed records ``start`` to ``stop`` (exclusive), like list slicing."""
+        start, stop, _ = slice(start, stop).indices(len(self))
+        if start >= stop:
+            return []
+        text = self._source[self._offsets[start]:self._offsets[stop]].decode(self.encoding, 'replace')
+        return [r for r in csv.reader(io.StringIO(text, newline='')) if r]
+
+    def iter_from(self, row):
+        """Streams parsed records from ``row`` to the end, e.g. to resume a run."""
+        step = 10000
+        for start in range(row, len(self), step):
+            yield from self.slice(start, start + step)
+
+    def row_number(self, line_num):
+        """Record containing physical ``line_num`` (1-based, as csv.reader and the quarantine count)."""
+        i = bisect_right(self._lines, line_num) - 1
+        if i < 0:
+            raise KeyError(f"Line {line_num} is before the first record")
+        return i
+
+    def rows_for(self, column, value):
+        """Record numbers whose ``column`` equals ``value`` after the column's normalizer."""
+        if column not in self._keys:
+            raise KeyError(f"{column!r} is not indexed; indexed: {', '.join(self._keys) or 'none'}")
+        normalizer, pairs = self._keys[column]
+        value = NORMALIZERS[normalizer](value)
+        if not value:
+            return []
+        h = key_hash(value)
+        lo, hi = 0, len(pairs) // 2
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if pairs[mid * 2] < h:
+                lo = mid + 1
+            else:
+                hi = mid
+        found = []
+        position = self.columns.index(column) if self.columns and column in self.columns else int(column)
+        while lo < len(pairs) // 2 and pairs[lo * 2] == h:
+            row = pairs[lo * 2 + 1]
+            fields = self.row(row)
+            # A 64-bit hash can collide: confirm against the row itself
+            if position < len(fields) and NORMALIZERS[normalizer](fields[position]) == value:
+                found.append(row)
+            lo += 1
+        return found
+
+    def get(self, column, value):
+        """Parsed records whose ``column`` equals ``value``."""
+        return [self.row(r) for r in self.rows_for(column, value)]
+
+
+def open_index(path, keys=(), has_header=True, columns=None, encoding='utf-8-sig'):
+    """RowIndex for ``path``, (re)building the sidecar when missing, stale or lacking a key."""
+    wanted = [parse_key_spec(k)[0] for k in keys]
+    try:
+        index = RowIndex(path)
+    except (OSError, ValueError):
+        index = None
+    if index is not None and all(k in index.keys for k in wanted):
+        return index
+    if index is not None:
+        keys = list(keys) + [f"{c}:{index.meta['sections']['keys'][c]['normalizer']}"
+                             for c in index.keys if c not in wanted]
+        if not has_header and columns is None:
+            columns = index.meta['columns']
+        index.close()
+    build_index(path, keys, has_header, columns, encoding)
+    return RowIndex(path)
+
+
+def write_rows(index, rows, out=sys.stdout):
+    writer = csv.writer(out)
+    if index.columns:
+        writer.writerow(index.columns)
+    writer.writerows(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Byte-offset sidecar index for random access into CSV exports.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('build', help="Scan a CSV once and write <file>.rowidx")
+    p.add_argument('csv')
+    p.add_argument('--key', action='append', default=[],
+                   help="Column to index, optionally column:normalizer (" + ', '.join(NORMALIZERS) + ")")
+    p.add_argument('--no-header', action='store_true', help="First line is data")
+    p.add_argument('--layout', choices=['customers'],
+                   help="Column names of a headerless file (implies --no-header)")
+    p.add_argument('--encoding', default='utf-8-sig')
+
+    p = sub.add_parser('get', help="Rows whose indexed column equals a value")
+    p.add_argument('csv')
+    p.add_argument('column')
+    p.add_argument('value')
+
+    p = sub.add_parser('slice', help="Rows START to STOP (0-based, header excluded)")
+    p.add_argument('csv')
+    p.add_argument('start', type=int)
+    p.add_argument('stop', type=int, nargs='?')
+
+    p = sub.add_parser('line', help="Row containing a physical line number (e.g. a quarantine line_num)")
+    p.add_argument('csv')
+    p.add_argument('line_num', type=int)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        columns = layout_columns(args.layout) if args.layout else None
+        build_index(args.csv, args.key, not (args.no_header or args.layout), columns, args.encoding)
+        sys.exit(0)
+
+    with RowIndex(args.csv) as index:
+        if args.command == 'get':
+            rows = index.get(args.column, args.value)
+        elif args.command == 'slice':
+            rows = index.slice(args.start, args.start + 1 if args.stop is None else args.stop)
+        else:
+            n = index.row_number(args.line_num)
+            print(f"line {args.line_num} -> row {n} at byte {index.offset(n)}", file=sys.stderr)
+            rows = [index.row(n)]
+        write_rows(index, rows)
+        if not rows:
+            sys.exit(1)
@@ -0,0 +1,350 @@
+import argparse
+import json
+import os
+import re
+import subprocess
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from compressed_io import open_file
+from sql_dump import iter_statements, split_insert
+
+MANIFEST = 'manifest.json'
+JOBS = 4
+
+_RE_TABLE = re.compile(r"^(?:CREATE\s+TABLE(?:\s+IF\s+NOT\s+EXISTS)?|DROP\s+TABLE(?:\s+IF\s+EXISTS)?|"
+                       r"INSERT\s+(?:IGNORE\s+)?INTO|ALTER\s+TABLE)\s+`?(\w+)`?", re.I)
+_RE_TRIGGER_TABLE = re.compile(r"^CREATE\s+(?:DEFINER\s*=\s*\S+\s+)?TRIGGER\s+.*?\s+ON\s+`?(\w+)`?", re.I | re.S)
+_RE_REFERENCES = re.compile(r"REFERENCES\s+`?(\w+)`?", re.I)
+_RE_DEFERRABLE_KEY = re.compile(r"^(?:UNIQUE\s+|FULLTEXT\s+|SPATIAL\s+)?(?:KEY|INDEX)\s", re.I)
+
+# mysqldump wraps data in these; the split files manage their own session
+_SKIPPED = ('START TRANSACTION', 'BEGIN', 'COMMIT', 'LOCK TABLES', 'UNLOCK TABLES')
+_RE_DISABLE_KEYS = re.compile(r"^/\*!\d+\s+ALTER\s+TABLE\s+`?\w+`?\s+(?:DISABLE|ENABLE)\s+KEYS", re.I)
+
+# Restore phases, in order; phases listed in PARALLEL_PHASES run with N sessions
+PHASES = ['schema', 'data', 'indexes', 'constraints', 'triggers']
+PARALLEL_PHASES = {'schema', 'data', 'indexes', 'constraints'}
+
+
+def split_create_table(statement):
+    """Moves secondary keys and foreign keys out of an inline CREATE TABLE.
+
+    Returns (create statement, index clauses, constraint clauses). The primary
+    key and CHECK constraints stay inline; phpMyAdmin dumps already add keys
+    with ALTER TABLE and come back unchanged.
+    """
+    lines = statement.split('\n')
+    if len(lines) < 3:
+        return statement, [], []
+    kept, indexes, constraints = [], [], []
+    for line in lines[1:-1]:
+        definition = line.strip().rstrip(',')
+        if _RE_DEFERRABLE_KEY.match(definition):
+            indexes.append('ADD ' + definition)
+        elif definition.upper().startswith('CONSTRAINT') and 'FOREIGN KEY' in definition.upper():
+            constraints.append('ADD ' + definition)
+        else:
+            kept.append(line.rstrip().rstrip(','))
+    if not indexes and not constraints:
+        return statement, [], []
+    return '\n'.join([lines[0], ',\n'.join(kept), lines[-1]]), indexes, constraints
+
+
+class TableFiles:
+    """The per-table output files of a split, opened on first use."""
+
+    def __init__(self, out_dir, table, session):
+        self.out_dir = out_dir
+        self.table = table
+        self.session = session
+        self.files = {}
+        self.depends_on = set()
+        self.rows = 0
+        self.statements = 0
+
+    def path(self, kind):
+        return os.path.join(self.out_dir, f"{self.table}.{kind}.sql")
+
+    def write(self, kind, text):
+        f = self.files.get(kind)
+        if f is None:
+            f = self.files[kind] = open(self.path(kind), 'w', encoding='utf-8')
+            f.write("\n".join(self.session) + "\n")
+            f.write("SET FOREIGN_KEY_CHECKS = 0;\nSET UNIQUE_CHECKS = 0;\n")
+            if kind == 'data':
+                f.write("START TRANSACTION;\n")
+            f.write("\n")
+        f.write(text)
+
+    def close(self):
+        for kind, f in self.files.items():
+            if kind == 'data':
+                f.write("COMMIT;\n")
+            f.close()
+
+    def manifest(self):
+        return {
+            'files': {kind: os.path.basename(self.path(kind)) for kind in PHASES if kind in self.files},
+            'rows': self.rows,
+            'data_bytes': os.path.getsize(self.path('data')) if 'data' in self.files else 0,
+            'depends_on': sorted(self.depends_on - {self.table}),
+        }
+
+
+class InsertBatcher:
+    """Re-batches the raw rows of consecutive INSERTs up to a target statement size."""
+
+    def __init__(self, target_bytes):
+        self.target_bytes = target_bytes
+        self.prefix = None
+        self.rows = []
+        self.size = 0
+
+    def add(self, prefix, rows, out):
+        if prefix != self.prefix:
+            self.flush(out)
+            self.prefix = prefix
+        for row in rows:
+            if self.rows and self.size + len(row) > self.target_bytes:
+                self.flush(out)
+            self.rows.append(row)
+            self.size += len(row) + 2
+
+    def flush(self, out):
+        if self.rows:
+            out.write('data', self.prefix.rstrip() + "\n" + ",\n".join(self.rows) + ";\n")
+            out.statements += 1
+        self.rows = []
+        self.size = 0
+
+
+def split(dump_path, out_dir, statement_bytes=None, encoding='utf-8'):
+    """Streams a dump once into per-table schema/data/indexes/constraints/triggers files."""
+    os.makedirs(out_dir, exist_ok=True)
+    session = []
+    tables = {}
+    batchers = {}
+    other = []
+
+    def table_files(name):
+        t = tables.get(name)
+        if t is None:
+            t = tables[name] = TableFiles(out_dir, name, session)
+        return t
+
+    with open_file(dump_path, 'r', encoding=encoding) as f:
+        for statement in iter_statements(f):
+            head = statement[:40].upper()
+            if head.startswith(_SKIPPED) or _RE_DISABLE_KEYS.match(statement):
+                continue
+            if head.startswith('SET ') or head.startswith('/*!') and ' SET ' in head:
+                # Session settings before the first table; the @OLD_ save/restore pairs are dropped
+                if '@OLD_' not in statement.upper() and not tables:
+                    session.append(statement if statement.endswith(';') else statement + ';')
+                continue
+
+            m = _RE_TRIGGER_TABLE.match(statement)
+            if m:
+                body = statement.rstrip(';')
+                table_files(m.group(1)).write('triggers', f"DELIMITER $$\n{body}\n$$\nDELIMITER ;\n\n")
+                continue
+
+            m = _RE_TABLE.match(statement)
+            if not m:
+                other.append(statement)
+                continue
+            t = table_files(m.group(1))
+            text = statement if statement.endswith(';') else statement + ';'
+
+            if head.startswith('INSERT'):
+                parts = split_insert(statement)
+                if parts is None:
+                    t.write('data', text + "\n")
+                    t.statements += 1
+                    continue
+                prefix, rows = parts
+                t.rows += len(rows)
+                if statement_bytes:
+                    batcher = batchers.setdefault(t.table, InsertBatcher(statement_bytes))
+                    batcher.add(prefix, rows, t)
+                else:
+                    t.write('data', text + "\n")
+                    t.statements += 1
+            elif head.startswith('CREATE'):
+                create, indexes, constraints = split_create_table(text)
+                t.write('schema', create + "\n\n")
+                if indexes:
+                    t.write('indexes', f"ALTER TABLE `{t.table}`\n  " + ",\n  ".join(indexes) + ";\n\n")
+                if constraints:
+                    t.write('constraints', f"ALTER TABLE `{t.table}`\n  " + ",\n  ".join(constraints) + ";\n\n")
+                t.depends_on.update(_RE_REFERENCES.findall(statement))
+            elif head.startswith('DROP'):
+                t.write('schema', text + "\n")
+            elif 'FOREIGN KEY' in statement.upper():
+                t.write('constraints', text + "\n\n")
+                t.depends_on.update(_RE_REFERENCES.findall(statement))
+            else:
+                # ADD PRIMARY KEY / ADD KEY / MODIFY .. AUTO_INCREMENT
+                t.write('indexes', text + "\n\n")
+
+    for name, batcher in batchers.items():
+        batcher.flush(tables[name])
+    for t in tables.values():
+        t.close()
+
+    manifest = {
+        'source': os.path.basename(dump_path),
+        'tables': {name: t.manifest() for name, t in tables.items()},
+        'other': None,
+    }
+    if other:
+        manifest['other'] = '_other.sql'
+        with open(os.path.join(out_dir, '_other.sql'), 'w', encoding='utf-8') as f:
+            f.write("\n".join(session) + "\n\n")
+            for statement in other:
+                f.write((statement if statement.endswith(';') else statement + ';') + "\n\n")
+    with open(os.path.join(out_dir, MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    print(f"Split {dump_path} into {len(tables)} tables under {out_dir}:")
+    for name, t in tables.items():
+        kinds = ", ".join(k for k in PHASES if k in t.files)
+        print(f"  {name}: {t.rows} rows in {t.statements} statements ({kinds})")
+    if other:
+        print(f"  {len(other)} other statements in _other.sql")
+    return manifest
+
+
+def mysql_command(args):
+    cmd = [args.mysql, '--host', args.host, '--port', str(args.port), '--user', args.user,
+           '--default-character-set=utf8mb4', args.database]
+    env = dict(os.environ)
+    if args.password:
+        # Keeps the password out of the process list
+        env['MYSQL_PWD'] = args.password
+    return cmd, env
+
+
+def run_sql_file(path, cmd, env):
+    with open(path, 'rb') as f:
+        result = subprocess.run(cmd, stdin=f, capture_output=True, env=env)
+    if result.returncode != 0:
+        raise RuntimeError(f"{os.path.basename(path)}: {result.stderr.decode('utf-8', 'replace').strip()}")
+
+
+def data_order(tables):
+    """Yields waves of tables whose referenced tables are already loaded (cycles are broken)."""
+    pending = {name: set(t['depends_on']) & set(tables) for name, t in tables.items()}
+    while pending:
+        ready = [name for name, deps in pending.items() if not deps & set(pending)]
+        if not ready:
+            ready = [min(pending, key=lambda n: len(pending[n]))]
+        yield ready
+        for name in ready:
+            del pending[name]
+
+
+def run_phase(phase, jobs_list, dump_dir, cmd, env, workers, dry_run, tables=None):
+    """Runs (table, file) jobs with up to ``workers`` mysql sessions.
+
+    With ``tables`` (the data phase) a table only starts once the tables it
+    references are loaded, unless nothing else is left to run (FK cycle).
+    """
+    if not jobs_list:
+        return True
+    print(f"{phase}: {len(jobs_list)} files, {workers} sessions")
+    if dry_run:
+        for _, filename in jobs_list:
+            print(f"  {filename}")
+        return True
+
+    started = time.time()
+    loading = {table for table, _ in jobs_list}
+    loaded = set()
+    queue = list(jobs_list)
+    running = {}
+    failed = False
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while queue or running:
+            for item in list(queue):
+                if len(running) >= workers or failed:
+                    break
+                table, filename = item
+                if tables and running and (set(tables[table]['depends_on']) & loading) - loaded - {table}:
+                    continue
+                queue.remove(item)
+                running[pool.submit(run_sql_file, os.path.join(dump_dir, filename), cmd, env)] = item
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                table, filename = running.pop(future)
+                try:
+                    future.result()
+                except RuntimeError as e:
+                    print(f"  Error: {e}")
+                    failed = True
+                    continue
+                loaded.add(table)
+                print(f"  {filename} loaded" + (f" ({tables[table]['rows']} rows)" if tables else ""))
+            if failed:
+                queue = []
+    print(f"{phase} finished in {time.time() - started:.1f}s")
+    return not failed
+
+
+def restore(dump_dir, args):
+    with open(os.path.join(dump_dir, MANIFEST), 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    tables = manifest['tables']
+    cmd, env = mysql_command(args)
+
+    for phase in PHASES:
+        workers = args.jobs if phase in PARALLEL_PHASES else 1
+        if phase == 'data':
+            # Referenced tables first, biggest files first within a wave
+            jobs_list = []
+            for wave in data_order(tables):
+                wave.sort(key=lambda n: -tables[n]['data_bytes'])
+                jobs_list.extend((n, tables[n]['files']['data']) for n in wave if 'data' in tables[n]['files'])
+            ok = run_phase(phase, jobs_list, dump_dir, cmd, env, workers, args.dry_run, tables)
+        else:
+            jobs_list = [(n, t['files'][phase]) for n, t in tables.items() if phase in t['files']]
+            ok = run_phase(phase, jobs_list, dump_dir, cmd, env, workers, args.dry_run)
+        if not ok:
+            print(f"Restore stopped in phase {phase}.")
+            return False
+    if manifest.get('other'):
+        if not run_phase('other', [(None, manifest['other'])], dump_dir, cmd, env, 1, args.dry_run):
+            return False
+    print("Restore complete.")
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Split a SQL dump per table and restore it with parallel sessions.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('split', help="Split a dump into per-table files plus manifest.json")
+    p.add_argument('dump')
+    p.add_argument('out_dir')
+    p.add_argument('--statement-bytes', type=int,
+                   help="Re-batch INSERT rows into statements of about this size (default: keep the dump's)")
+
+    p = sub.add_parser('restore', help="Restore a split dump: schema, data, indexes, constraints, triggers")
+    p.add_argument('dump_dir')
+    p.add_argument('--database', required=True)
+    p.add_argument('--host', default='127.0.0.1')
+    p.add_argument('--port', type=int, default=3306)
+    p.add_argument('--user', default='root')
+    p.add_argument('--password', default=os.environ.get('MYSQL_PWD', ''))
+    p.add_argument('--mysql', default='mysql', help="mysql client binary")
+    p.add_argument('--jobs', type=int, default=JOBS, help="Concurrent sessions (default: 4)")
+    p.add_argument('--dry-run', action='store_true', help="Print the load plan only")
+
+    args = parser.parse_args()
+    if args.command == 'split':
+        split(args.dump, args.out_dir, args.statement_bytes)
+    else:
+        restore(args.dump_dir, args)
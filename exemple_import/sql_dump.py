@@ -0,0 +1,175 @@
+import re
+
+from compressed_io import open_file
+
+# Statement boundaries: a quote toggles string state, a semicolon outside a
+# string ends the statement. Inside a string only quotes and backslashes matter.
+_RE_OUTSIDE = re.compile(r"[';]")
+_RE_INSIDE = re.compile(r"['\\]")
+
+_RE_INSERT = re.compile(r"^\s*INSERT\s+(?:IGNORE\s+)?INTO\s+`?(\w+)`?\s*(?:\(([^)]*)\))?\s*VALUES\s*", re.I | re.S)
+_RE_TOKEN = re.compile(r"'((?:[^'\\]|\\.|'')*)'|(\()|(\))|(,)|([^,()\s']+)", re.S)
+
+_UNESCAPE = {'0': '\0', 'n': '\n', 'r': '\r', 't': '\t', 'Z': '\x1a', 'b': '\b'}
+_RE_ESCAPE = re.compile(r"\\(.)|''", re.S)
+
+
+def _unescape(s):
+    if '\\' not in s and "''" not in s:
+        return s
+    return _RE_ESCAPE.sub(lambda m: _UNESCAPE.get(m.group(1), m.group(1)) if m.group(1) is not None else "'", s)
+
+
+def iter_statements(f):
+    """Yields complete SQL statements from a dump file object, one at a time.
+
+    Comment lines are skipped; strings may span lines and contain semicolons.
+    ``DELIMITER`` blocks (triggers, routines) come back as one statement
+    without the custom delimiter.
+    """
+    buf = []
+    in_quote = False
+    delimiter = ';'
+    for line in f:
+        if not in_quote and not buf:
+            stripped = line.lstrip()
+            if not stripped or stripped.startswith('--') or stripped.startswith('#'):
+                continue
+            if stripped[:10].upper() == 'DELIMITER ':
+                delimiter = stripped.split()[1]
+                continue
+        if delimiter != ';':
+            # Routine bodies contain semicolons; only the custom delimiter ends them
+            body = line.rstrip()
+            if body.endswith(delimiter):
+                buf.append(body[:-len(delimiter)])
+                statement = ''.join(buf).strip()
+                buf = []
+                if statement:
+                    yield statement
+            else:
+                buf.append(line)
+            continue
+        pos = 0
+        start = 0
+        while True:
+            if in_quote:
+                m = _RE_INSIDE.search(line, pos)
+                if not m:
+                    break
+                j = m.start()
+                if m.group() == '\\':
+                    pos = j + 2
+                elif line.startswith("''", j):
+                    pos = j + 2
+                else:
+                    in_quote = False
+                    pos = j + 1
+            else:
+                m = _RE_OUTSIDE.search(line, pos)
+                if not m:
+                    break
+                j = m.start()
+                if m.group() == ';':
+                    buf.append(line[start:j + 1])
+                    yield ''.join(buf).strip()
+                    buf = []
+                    start = pos = j + 1
+                else:
+                    in_quote = True
+                    pos = j + 1
+        rest = line[start:]
+        if buf or rest.strip():
+            buf.append(rest)
+    if buf and ''.join(buf).strip():
+        yield ''.join(buf).strip()
+
+
+def parse_insert(statement):
+    """Splits an INSERT statement into (table, columns or None, rows).
+
+    Values come back as str, or None for SQL NULL. Returns None for any other
+    kind of statement.
+    """
+    m = _RE_INSERT.match(statement)
+    if not m:
+        return None
+    table = m.group(1)
+    columns = None
+    if m.group(2):
+        columns = [c.strip().strip('`') for c in m.group(2).split(',')]
+
+    rows = []
+    row = None
+    for tok in _RE_TOKEN.finditer(statement, m.end()):
+        quoted, lparen, rparen, comma, bare = tok.groups()
+        if lparen:
+            row = []
+        elif rparen:
+            if row is not None:
+                rows.append(row)
+            row = None
+        elif quoted is not None:
+            row.append(_unescape(quoted))
+        elif bare is not None and row is not None:
+            row.append(None if bare.upper() == 'NULL' else bare)
+    return table, columns, rows
+
+
+def split_insert(statement):
+    """Splits an INSERT into its ``INSERT INTO .. VALUES`` prefix and the raw row tuples.
+
+    Row text is returned unchanged (still escaped), so rows can be re-batched
+    without a decode/encode round trip. Returns None for other statements and
+    for INSERTs with anything after the rows (e.g. ON DUPLICATE KEY UPDATE).
+    """
+    m = _RE_INSERT.match(statement)
+    if not m:
+        return None
+    rows = []
+    depth = 0
+    start = end = m.end()
+    for tok in _RE_TOKEN.finditer(statement, m.end()):
+        if tok.group(2):
+            if depth == 0:
+                start = tok.start()
+            depth += 1
+        elif tok.group(3):
+            depth -= 1
+            if depth == 0:
+                rows.append(statement[start:tok.end()])
+                end = tok.end()
+        elif depth == 0 and not tok.group(4):
+            if tok.group(5) != ';':
+                return None
+            break
+    return statement[:m.end()], rows
+
+
+def iter_insert_rows(path, tables=None, encoding='utf-8'):
+    """Streams (table, columns, row) for every INSERT row in a dump.
+
+    ``tables`` restricts output to the given table names.
+    """
+    wanted = set(tables) if tables else None
+    with open_file(path, 'r', encoding=encoding) as f:
+        for statement in iter_statements(f):
+            if not statement[:6].upper() == 'INSERT':
+                continue
+            if wanted is not None:
+                m = _RE_INSERT.match(statement)
+                if not m or m.group(1) not in wanted:
+                    continue
+            parsed = parse_insert(statement)
+            if not parsed:
+                continue
+            table, columns, rows = parsed
+            for row in rows:
+                yield table, columns, row
+
+
+def iter_table_dicts(path, table, encoding='utf-8'):
+    """Streams rows of one table as dicts keyed by column name."""
+    for _, columns, row in iter_insert_rows(path, [table], encoding):
+        if columns:
+            yield dict(zip(columns, row))
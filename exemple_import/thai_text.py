@@ -0,0 +1,53 @@
+import re
+from functools import lru_cache
+
+# Invisible characters pasted in from chat apps and spreadsheets: dropped
+_INVISIBLE = dict.fromkeys(map(ord, '\u200b\u200c\u200d\u2060\ufeff\u00ad'))
+# Space variants: turned into a plain space, then runs are collapsed
+_SPACES = dict.fromkeys(map(ord, '\u00a0\u2007\u202f\u3000\t\r\n'), ' ')
+_TRANSLATE = {**_INVISIBLE, **_SPACES}
+
+# Nikhahit + sara aa typed instead of sara am (น้ํา -> น้ำ)
+_RE_SARA_AM = re.compile('\u0e4d\u0e32')
+# Sara am typed before the tone mark (นำ้ -> น้ำ)
+_RE_AM_TONE = re.compile('\u0e33([\u0e48-\u0e4b])')
+# The same vowel or tone mark typed twice (คุุณ -> คุณ)
+_RE_DOUBLED_MARK = re.compile('([\u0e31\u0e34-\u0e3a\u0e47-\u0e4e])\\1+')
+_RE_SPACES = re.compile(' {2,}')
+
+
+@lru_cache(maxsize=1 << 17)
+def canonical_thai(text, strip_dots=True):
+    """Single spelling for Thai text that looks the same but differs in code points.
+
+    Drops zero-width characters, turns NBSP and other spaces into one plain
+    space, writes sara am as U+0E33 after its tone mark, collapses doubled
+    vowel/tone marks and, with ``strip_dots``, trailing dots (one is kept
+    after an abbreviation such as จ.ป.ร.). Columns repeat the same values a
+    lot, so results are memoized.
+    """
+    if not text:
+        return ''
+    text = str(text).translate(_TRANSLATE)
+    if '\u0e4d' in text:
+        text = _RE_SARA_AM.sub('\u0e33', text)
+    if '\u0e33' in text:
+        text = _RE_AM_TONE.sub('\\1\u0e33', text)
+    text = _RE_DOUBLED_MARK.sub('\\1', text)
+    if '  ' in text:
+        text = _RE_SPACES.sub(' ', text)
+    text = text.strip()
+    if strip_dots and text.endswith('.'):
+        core = text.rstrip('. ')
+        # Abbreviations (จ.ป.ร.) keep their final dot
+        text = core + '.' if '.' in core else core
+    return text
+
+
+def canonicalize_columns(rows, columns, strip_dots=True):
+    """Canonicalizes ``columns`` of dict rows in place, a column at a time."""
+    for col in columns:
+        values = [canonical_thai(row.get(col) or '', strip_dots) for row in rows]
+        for row, value in zip(rows, values):
+            row[col] = value
+    return rows
@@ -1,16 +1,21 @@
-import pandas as pd
 import re
 import os
 
+from thai_text import canonical_thai
+
+INPUT_CSV = r'c:\AppServ\www\CRM_ERP_V4\exemple_import\customers_ready.csv'
+OUTPUT_CSV = r'c:\AppServ\www\CRM_ERP_V4\exemple_import\customers_ready_updated.csv'
+
 def clean_and_split_name(full_name):
     if not isinstance(full_name, str):
         return full_name, "."
 
     # 1. Remove prefixes
     prefixes = [
-        "คุณ", "นาย", "นางสาว", "นาง", "น.ส.", "ด.ต.", "ร.ท.", "เจ๊ะ", "F.", "คุุณ", "ร้าน", "fคุณ", "คุณพี่"
+        "คุณ", "นาย", "นางสาว", "นาง", "น.ส.", "ด.ต.", "ร.ท.", "เจ๊ะ", "F.", "ร้าน", "fคุณ", "คุณพี่"
     ]
-    cleaned_name = full_name.strip()
+    # Canonical form first: doubled marks (คุุณ), zero-width and NBSP variants
+    cleaned_name = canonical_thai(full_name, strip_dots=False)
     for prefix in prefixes:
         if cleaned_name.startswith(prefix):
             cleaned_name = cleaned_name[len(prefix):].strip()
@@ -37,10 +42,9 @@ def clean_and_split_name(full_name):
 
     return first_name, last_name
 
-def main():
-    file_path = r'c:\AppServ\www\CRM_ERP_V4\exemple_import\customers_ready.csv'
-    output_path = r'c:\AppServ\www\CRM_ERP_V4\exemple_import\customers_ready_updated.csv'
-    
+def main(file_path=INPUT_CSV, output_path=OUTPUT_CSV):
+    import pandas as pd
+
     print(f"Reading {file_path}...")
     # Use 'utf-8-sig' to handle BOM properly if present, or fallback to 'utf-8' or 'tis-620'
     try:
@@ -1,7 +1,18 @@
+import argparse
 import csv
 import re
 import os
 
+from address_cache import MISS, normalize_key, open_cache
+from compressed_io import open_file
+from csv_reader import RecordLines
+from postal_resolution import DISTRICT_UNIQUE, UNIQUE, classify_postal_codes
+from quarantine import Quarantine, quarantine_path
+from thai_text import canonical_thai, canonicalize_columns
+
+# Bump when find_best_match_with_strategy changes; cached matches are then recomputed
+MATCHER_VERSION = 1
+
 def load_master_data(sql_file):
     provinces = {}  # id -> name_th
     districts = {}   # id -> (name_th, province_id)
@@ -12,7 +23,7 @@ def load_master_data(sql_file):
     re_subdistrict = re.compile(r"\((\d+),\s*'(\d+)',\s*'([^']+)',\s*'[^']*',\s*(\d+),")
 
     current_table = None
-    with open(sql_file, 'r', encoding='utf-8') as f:
+    with open_file(sql_file, 'r', encoding='utf-8') as f:
         for line in f:
             if 'INSERT INTO `address_provinces`' in line:
                 current_table = 'provinces'
@@ -50,11 +61,12 @@ def load_master_data(sql_file):
                 'province': p_name,
                 'zip_code': sub['zip_code']
             })
-    return master_list
+    # Gazetteer names and input fields go through the same canonical form
+    return canonicalize_columns(master_list, ['subdistrict', 'district', 'province'])
 
 def clean_name(name):
     if not name: return ""
-    res = name.strip()
+    res = canonical_thai(name, strip_dots=False)
     # Remove common prefixes and symbols from start
     while True:
         changed = False
@@ -65,15 +77,22 @@ def clean_name(name):
                 changed = True
         if not changed:
             break
-    return res
+    return canonical_thai(res)
+
+def find_best_match_with_strategy(row, master_data, resolution=None):
+    """Returns (master entry or None, name of the strategy that decided).
 
-def find_best_match(row, master_data):
+    ``resolution`` is classify_postal_codes(master_data); pass it in when
+    matching many rows so it is built once.
+    """
+    if resolution is None:
+        resolution = classify_postal_codes(master_data)
     # If subdistrict or district is empty, try to extract from street
-    street = row['street'] or ""
+    street = canonical_thai(row['street'], strip_dots=False)
     s_input = clean_name(row['subdistrict'])
     d_input = clean_name(row['district'])
     p_input = clean_name(row['province'])
-    z_input = str(row['postal_code']).split('.')[0].strip()
+    z_input = canonical_thai(str(row['postal_code']), strip_dots=False).split('.')[0].strip()
 
     if not s_input or not d_input:
         # Try to find subdistrict/district keywords in street
@@ -92,18 +111,22 @@ def find_best_match(row, master_data):
                     if not d_input: d_input = candidate
 
     # Strategy 1: Match by zip code primarily if provided
-    zip_matches = [m for m in master_data if m['zip_code'] == z_input]
-    
+    zip_class, zip_matches = resolution.get(z_input, (None, None))
+
     if zip_matches:
+        # The zip alone names the subdistrict: every step below would pick it
+        if zip_class == UNIQUE:
+            return zip_matches[0], 'zip_unique'
+
         # 1.1 Try exact name match within zip matches
         for m in zip_matches:
             if s_input == m['subdistrict']:
-                return m
+                return m, 'zip_exact_subdistrict'
         
         # 1.2 Try subdistrict name from street (specifically)
         for m in zip_matches:
             if m['subdistrict'] in street:
-                return m
+                return m, 'zip_street_subdistrict'
 
         # 1.3 Try partial name match within zip matches (longest match first)
         best_p_match = None
@@ -111,68 +134,115 @@ def find_best_match(row, master_data):
             if s_input and (s_input in m['subdistrict'] or m['subdistrict'] in s_input):
                 if not best_p_match or len(m['subdistrict']) > len(best_p_match['subdistrict']):
                     best_p_match = m
-        if best_p_match: return best_p_match
+        if best_p_match: return best_p_match, 'zip_partial_subdistrict'
+
+        # One district for the zip: the district/province steps below all pick the first entry
+        if zip_class == DISTRICT_UNIQUE:
+            return zip_matches[0], 'zip_district_unique'
 
         # 1.4 Try to match district if subdistrict failed
         for m in zip_matches:
             if d_input and (d_input in m['district'] or m['district'] in d_input):
-                return m
+                return m, 'zip_district'
         
         # 1.5 If multiple zip matches, try to match district name from street
         for m in zip_matches:
             if m['district'] in street:
-                return m
+                return m, 'zip_street_district'
                 
         # Fallback to first zip match - only if zip is unique enough
         if len(zip_matches) == 1:
-            return zip_matches[0]
+            return zip_matches[0], 'zip_unique'
         # If multiple zip matches, try to match province
         for m in zip_matches:
             if p_input and (p_input in m['province'] or m['province'] in p_input):
-                return m
-        return zip_matches[0]
+                return m, 'zip_province'
+        return zip_matches[0], 'zip_first'
 
     # Strategy 2: Match by exact names (Subdistrict + District + Province)
     for m in master_data:
         if s_input == m['subdistrict'] and d_input == m['district']:
-            return m
+            return m, 'name_subdistrict_district'
 
     # Strategy 3: Match by subdistrict name if it's unique enough (only in street or s_input)
     if s_input:
         s_matches = [m for m in master_data if s_input == m['subdistrict']]
         if len(s_matches) == 1:
-            return s_matches[0]
+            return s_matches[0], 'name_subdistrict_unique'
+
+    return None, 'no_match'
+
+def find_best_match(row, master_data, resolution=None):
+    return find_best_match_with_strategy(row, master_data, resolution)[0]
+
+def cached_match(row, master_data, cache, resolution=None):
+    """find_best_match backed by the persistent address cache."""
+    key = normalize_key(row['street'], row['subdistrict'], row['district'], row['province'], row['postal_code'])
+    entry = cache.get(key)
+    if entry is not MISS:
+        return entry[0]
+    match, strategy = find_best_match_with_strategy(row, master_data, resolution)
+    cache.put(key, match, strategy)
+    return match
 
-    return None
+CACHE_FILE = r'c:\AppServ\www\CRM_ERP_V4\exemple_import\address_cache.sqlite'
+SQL_FILE = r'c:\AppServ\www\CRM_ERP_V4\exemple_import\primacom_mini_erp.sql'
+INPUT_CSV = r'c:\AppServ\www\CRM_ERP_V4\exemple_import\customers_ready_updated.csv'
+OUTPUT_CSV = r'c:\AppServ\www\CRM_ERP_V4\exemple_import\customers_ready_validated.csv'
 
-def main():
-    sql_file = r'c:\AppServ\www\CRM_ERP_V4\exemple_import\primacom_mini_erp.sql'
-    csv_input = r'c:\AppServ\www\CRM_ERP_V4\exemple_import\customers_ready_updated.csv'
-    csv_output = r'c:\AppServ\www\CRM_ERP_V4\exemple_import\customers_ready_validated.csv'
+def main(cache_path=CACHE_FILE, sql_file=SQL_FILE, csv_input=INPUT_CSV, csv_output=OUTPUT_CSV):
 
     print("Loading master data...")
     master_data = load_master_data(sql_file)
     print(f"Loaded {len(master_data)} subdistrict entries.")
+    resolution = classify_postal_codes(master_data)
+    cache = open_cache(cache_path, sql_file, 'validate_addresses', MATCHER_VERSION)
+    quarantine = Quarantine(quarantine_path(csv_output), 'validate_addresses')
 
     updated_rows = []
-    with open(csv_input, 'r', encoding='utf-8-sig') as f:
-        reader = csv.DictReader(f)
+    with open_file(csv_input, 'r', encoding='utf-8-sig') as f:
+        lines = RecordLines(f)
+        reader = csv.DictReader(lines)
         fieldnames = reader.fieldnames
+        # Reading fieldnames consumed the header record
+        quarantine.set_header(lines.text)
         for row in reader:
-            match = find_best_match(row, master_data)
+            # Extra fields land under the None key, missing ones get None values
+            extra = row.pop(None, None)
+            if extra or None in row.values():
+                values = [v for v in row.values() if v is not None] + (extra or [])
+                quarantine.reject(reader.line_num, 'column_count', lines.text,
+                                  f"{len(values)} fields, expected {len(fieldnames)}")
+                continue
+            if cache:
+                match = cached_match(row, master_data, cache, resolution)
+            else:
+                match = find_best_match(row, master_data, resolution)
             if match:
                 row['subdistrict'] = match['subdistrict']
                 row['district'] = match['district']
                 row['province'] = match['province']
                 row['postal_code'] = match['zip_code']
+            else:
+                quarantine.flag(reader.line_num, 'address_unmatched', lines.text)
             updated_rows.append(row)
+    if cache:
+        cache.close()
+    quarantine.close()
 
     print(f"Writing validated data to {csv_output}...")
-    with open(csv_output, 'w', encoding='utf-8-sig', newline='') as f:
+    with open_file(csv_output, 'w', encoding='utf-8-sig', newline='') as f:
         writer = csv.DictWriter(f, fieldnames=fieldnames)
         writer.writeheader()
         writer.writerows(updated_rows)
     print("Done.")
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Validate customer addresses against the gazetteer.")
+    parser.add_argument('--input', default=INPUT_CSV)
+    parser.add_argument('--output', default=OUTPUT_CSV)
+    parser.add_argument('--master', default=SQL_FILE, help="Dump with the address_* tables")
+    parser.add_argument('--cache', default=CACHE_FILE, help="Persistent address cache (SQLite)")
+    parser.add_argument('--no-cache', action='store_true', help="Match every row from scratch")
+    args = parser.parse_args()
+    main(None if args.no_cache else args.cache, args.master, args.input, args.output)
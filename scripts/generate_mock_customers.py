@@ -29,10 +29,10 @@ def generate_date(start_year=2024, end_year=2025):
     random_date = start_date + datetime.timedelta(days=random_number_of_days)
     return random_date.strftime("%Y-%m-%d %H:%M:%S")
 
-def main():
-    print(f"Generating {NUM_RECORDS} mock customers...")
+def main(num_records=NUM_RECORDS, assigned_to=ASSIGNED_TO, company_id=COMPANY_ID, output_file=OUTPUT_FILE):
+    print(f"Generating {num_records} mock customers...")
     
-    with open(OUTPUT_FILE, 'w', encoding='utf-8') as f:
+    with open(output_file, 'w', encoding='utf-8') as f:
         # Columns based on db_structure.txt
         columns = [
             "`company_id`", "`customer_ref_id`", "`first_name`", "`last_name`", "`phone`", 
@@ -44,12 +44,12 @@ def main():
         f.write(f"INSERT INTO `customers` ({', '.join(columns)}) VALUES \n")
         
         values_list = []
-        for i in range(NUM_RECORDS):
+        for i in range(num_records):
             first_name = random.choice(FIRST_NAMES)
             last_name = random.choice(LAST_NAMES)
             phone = generate_phone()
             # customer_ref_id must be unique, using same pattern as previous code but mapped to correct column
-            customer_ref_id = f"CUS-MOCK-{ASSIGNED_TO}-{i+1:05d}"
+            customer_ref_id = f"CUS-MOCK-{assigned_to}-{i+1:05d}"
             street = f"{random.randint(1, 999)}/{random.randint(1, 99)} Moo {random.randint(1, 15)}"
             province = random.choice(PROVINCES)
             district = random.choice(DISTRICTS)
@@ -66,7 +66,7 @@ def main():
             date_assigned = generate_date()
             
             # Construct the value tuple
-            value = f"({COMPANY_ID}, '{customer_ref_id}', '{first_name}', '{last_name}', '{phone}', NULL, '{street}', '{subdistrict}', '{district}', '{province}', '{postal_code}', {ASSIGNED_TO}, '{date_assigned}', '{lifecycle_status}', '{behavioral_status}', '{grade}', {total_purchases}, {total_calls}, 0)"
+            value = f"({company_id}, '{customer_ref_id}', '{first_name}', '{last_name}', '{phone}', NULL, '{street}', '{subdistrict}', '{district}', '{province}', '{postal_code}', {assigned_to}, '{date_assigned}', '{lifecycle_status}', '{behavioral_status}', '{grade}', {total_purchases}, {total_calls}, 0)"
             values_list.append(value)
             
             if (i + 1) % 1000 == 0:
@@ -75,7 +75,7 @@ def main():
         f.write(",\n".join(values_list))
         f.write(";\n")
 
-    print(f"Done! File saved to {OUTPUT_FILE}")
+    print(f"Done! File saved to {output_file}")
 
 if __name__ == "__main__":
     main()
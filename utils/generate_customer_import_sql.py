@@ -93,7 +93,7 @@ def generate_sql():
                 last_name = safe_str(row[3])
                 phone = safe_str(row[4])
                 
-                # Deduplication logic could go here, but simple INSERT IGNORE or ON DUPLICATE KEY UPDATE is safer for SQL script
+                # Deduplicate beforehand with exemple_import/dedupe_customers.py (company_id + normalized phone)
                 
                 backup_phone = safe_str(row[5])
                 email = safe_str(row[6])